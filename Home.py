@@ -1,4 +1,9 @@
 import streamlit as st
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from src.geojson_tools import DATASET_CACHE, dataset_cache_stats, dataset_memory_report
 
 st.set_page_config(
     page_title="Einsatzzonen Suite",
@@ -36,3 +41,26 @@ Wähle links in der Seitenleiste das gewünschte Modul aus:
 """)
 
 st.info("💡 Tipp: Die Einstellungen werden automatisch in `general_config.json` und `step2_config.json` gespeichert.")
+
+# --- DATASET CACHE ---
+with st.expander("🗄️ Dataset-Cache & Speicher"):
+    cs = dataset_cache_stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Datensätze", cs["entries"])
+    c2.metric("Speicher", f"{cs['bytes'] / 1e6:.0f} / {cs['budget_bytes'] / 1e6:.0f} MB")
+    c3.metric("Hits", cs["hits"])
+    c4.metric("Misses", cs["misses"])
+    st.caption("Budget über die Umgebungsvariable `EINSATZZONEN_CACHE_MB` einstellbar.")
+
+    # Geteilte Datensätze (mit Anzahl offener Seiten/Sessions) und Session-eigene Kopien
+    report = dataset_memory_report()
+    if report.empty:
+        st.caption("Keine Datensätze geladen.")
+    else:
+        st.dataframe(report, hide_index=True, width="stretch",
+                     column_config={"MB": st.column_config.NumberColumn("MB", format="%.1f")})
+        st.caption(f"Summe: {report['MB'].sum():.0f} MB (bearbeitete Kopien zählen mit). Über dem Budget werden die größten "
+                   "geteilten Datensätze verdrängt und beim nächsten Zugriff neu von der Platte geladen.")
+    if st.button("🧹 Cache leeren", disabled=not cs["entries"]):
+        DATASET_CACHE.clear()
+        st.rerun()
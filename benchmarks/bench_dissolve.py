@@ -0,0 +1,86 @@
+"""
+Benchmark: generischer Dissolve (buffer(0) + gdf.dissolve) vs. dissolve_zones (Coverage-Union).
+
+Nutzung:
+    python benchmarks/bench_dissolve.py Final_Merged_Zones.geojson --by name
+    python benchmarks/bench_dissolve.py --synthetic 50000      # ohne echte Daten
+
+Für aussagekräftige Zahlen eine echte, zusammengeführte Österreich-Datei
+(Resolver-Output, ohne Dissolve) verwenden.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import box
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.geojson_tools import dissolve_zones, is_valid_coverage, load_geodataframe_raw
+
+
+def synthetic_coverage(n_cells: int, n_zones: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """Voronoi-Zellen über der Österreich-BBox, gruppiert nach nächstem Zonen-Zentrum."""
+    rng = np.random.default_rng(seed)
+    extent = box(9.5, 46.4, 17.2, 49.0)
+    pts = shapely.points(rng.uniform((9.5, 46.4), (17.2, 49.0), size=(n_cells, 2)))
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(pts), extend_to=extent))
+    cells = shapely.intersection(cells, extent)
+    centers = rng.uniform((9.5, 46.4), (17.2, 49.0), size=(n_zones, 2))
+    cxy = shapely.get_coordinates(shapely.centroid(cells))
+    labels = np.argmin(((cxy[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=1)
+    return gpd.GeoDataFrame({"name": [f"Zone_{i}" for i in labels]}, geometry=cells, crs="EPSG:4326")
+
+
+def generic_dissolve(gdf: gpd.GeoDataFrame, by: str) -> gpd.GeoDataFrame:
+    gdf = gdf.copy()
+    gdf["geometry"] = gdf.geometry.buffer(0)
+    return gdf.dissolve(by=by, as_index=False)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("path", nargs="?", help="GeoJSON mit Zonen-Polygonen")
+    ap.add_argument("--by", default="name", help="Spalte für den Dissolve")
+    ap.add_argument("--synthetic", type=int, default=0, help="Anzahl synthetischer Voronoi-Zellen")
+    ap.add_argument("--zones", type=int, default=400, help="Anzahl Zonen (nur synthetisch)")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        gdf = synthetic_coverage(args.synthetic, args.zones)
+        source = f"synthetisch ({args.synthetic} Zellen, {args.zones} Zonen)"
+    elif args.path:
+        gdf = load_geodataframe_raw(args.path)
+        source = args.path
+    else:
+        ap.error("Pfad oder --synthetic angeben")
+
+    _, t_check = timed(is_valid_coverage, gdf.geometry.values)
+    ref, t_generic = timed(generic_dissolve, gdf, args.by)
+    res, t_cov = timed(dissolve_zones, gdf, args.by)
+
+    ref = ref.set_index(args.by).sort_index()
+    res = res.set_index(args.by).sort_index()
+    diff = shapely.area(shapely.symmetric_difference(ref.geometry.values, res.geometry.values)).sum()
+
+    print(f"Quelle:              {source}")
+    print(f"Features / Gruppen:  {len(gdf)} / {len(res)}")
+    print(f"Coverage gültig:     {is_valid_coverage(gdf.geometry.values)} (Prüfung {t_check:.2f}s)")
+    print(f"buffer(0)+dissolve:  {t_generic:.2f}s")
+    print(f"dissolve_zones:      {t_cov:.2f}s  (x{t_generic / t_cov:.1f})")
+    print(f"Flächendifferenz:    {diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: Ladezeiten von load_geodataframe_raw mit und ohne Projektion / Arrow.
+
+Nutzung:
+    python benchmarks/bench_load.py Dienststellen.geojson Final_Merged_Zones.geojson --columns name alt_name
+    python benchmarks/bench_load.py --synthetic 20000     # ohne echte Daten
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.geojson_tools import ARROW_AVAILABLE, load_geodataframe_raw
+
+
+def synthetic_stations(path: str, n: int, n_cols: int = 120, seed: int = 0):
+    """Punkt-Datei mit vielen OSM-artigen Attributen (addr:*, contact:* ...)."""
+    rng = np.random.default_rng(seed)
+    data = {"name": [f"Wache {i}" for i in range(n)], "alt_name": [None] * n}
+    for c in range(n_cols):
+        data[f"tag:{c}"] = rng.choice(["ja", "nein", None, "irgendein längerer Text"], size=n)
+    pts = shapely.points(rng.uniform((9.5, 46.4), (17.2, 49.0), size=(n, 2)))
+    gpd.GeoDataFrame(data, geometry=pts, crs="EPSG:4326").to_file(path, driver="GeoJSON")
+
+
+def timed(label: str, fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"  {label:<34} {best:7.3f}s  ({len(res)} Zeilen, {len(res.columns)} Spalten)")
+
+
+def bench_file(path: str, columns):
+    size_mb = os.path.getsize(path) / 1e6
+    print(f"{os.path.basename(path)} ({size_mb:.1f} MB)")
+    timed("voll, ohne Arrow", lambda: load_geodataframe_raw(path, use_arrow=False))
+    if ARROW_AVAILABLE:
+        timed("voll, Arrow", lambda: load_geodataframe_raw(path, use_arrow=True))
+    timed(f"columns={columns}", lambda: load_geodataframe_raw(path, columns=columns))
+    timed("nur Attribute (ignore_geometry)", lambda: load_geodataframe_raw(path, ignore_geometry=True))
+    timed("rows=1 (Vorschau)", lambda: load_geodataframe_raw(path, rows=1))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("paths", nargs="*", help="GeoJSON-Dateien (z.B. Dienststellen, Zonen)")
+    ap.add_argument("--columns", nargs="+", default=["name"], help="Spalten für den projizierten Lauf")
+    ap.add_argument("--synthetic", type=int, default=0, help="Anzahl synthetischer Stationen")
+    args = ap.parse_args()
+
+    print(f"Arrow verfügbar: {ARROW_AVAILABLE}")
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stations_synthetic.geojson")
+            synthetic_stations(path, args.synthetic)
+            bench_file(path, args.columns)
+    for p in args.paths:
+        bench_file(p, args.columns)
+    if not args.paths and not args.synthetic:
+        ap.error("Pfad(e) oder --synthetic angeben")
+
+
+if __name__ == "__main__":
+    main()
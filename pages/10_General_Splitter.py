@@ -11,7 +11,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.geojson_tools import (
     select_file_dialog,
     select_folder_dialog,
-    load_geodataframe_raw,
+    DatasetRef,
+    split_to_files,
+    PROFILE_SAMPLE_ROWS,
+    profile_columns,
+    column_stats,
 )
 
 st.set_page_config(
@@ -34,25 +38,9 @@ Diese Seite:
 """
 )
 
-def analyze_columns(gdf: gpd.GeoDataFrame) -> pd.DataFrame:
-    cols_info = {}
-    for col in gdf.columns:
-        if col == "geometry":
-            continue
-        series = gdf[col]
-        dtype = str(series.dtype)
-        n_missing = int(series.isna().sum())
-        has_comma = series.dropna().astype(str).str.contains(",").any()
-        example = series.iloc[0] if len(series) > 0 else "-"
-        cols_info[col] = {
-            "dtype": dtype,
-            "non_null": int(series.notna().sum()),
-            "missing": n_missing,
-            "unique": int(series.nunique(dropna=True)),
-            "has_comma": bool(has_comma),
-            "example": example,
-        }
-    return pd.DataFrame(cols_info).T
+def analyze_columns(gdf: gpd.GeoDataFrame, sampled: bool = True) -> pd.DataFrame:
+    """Spaltenprofil (memoisiert je Datensatz); bei großen Dateien unique/has_comma geschätzt."""
+    return profile_columns(gdf, sample_rows=PROFILE_SAMPLE_ROWS if sampled else None)
 
 def is_listlike(v) -> bool:
     return isinstance(v, (list, tuple, set))
@@ -72,7 +60,9 @@ with st.sidebar:
         f = select_file_dialog()
         if f:
             try:
-                st.session_state["gen_split_gdf"] = load_geodataframe_raw(f)
+                # Nur der Verweis liegt in der Session; der Datensatz selbst ist geteilt (read-only)
+                st.session_state["gen_split_gdf"] = DatasetRef(f)
+                st.session_state["gen_split_exact"] = {}
                 st.session_state["gen_split_file"] = os.path.basename(f)
                 st.rerun()
             except Exception as e:
@@ -96,7 +86,7 @@ with st.sidebar:
         st.info("Kein Zielordner gewählt.")
 
 # --- HAUPTBEREICH ---
-gdf = st.session_state["gen_split_gdf"]
+gdf = st.session_state["gen_split_gdf"].get() if st.session_state["gen_split_gdf"] is not None else None
 
 if gdf is not None:
     st.subheader("Datenvorschau")
@@ -106,7 +96,11 @@ if gdf is not None:
     except KeyError:
         st.dataframe(gdf.head())
 
-    cols_info_df = analyze_columns(gdf)
+    exact_profile = len(gdf) <= PROFILE_SAMPLE_ROWS or st.checkbox(
+        "Exakte Spaltenanalyse", value=False,
+        help=f"Ab {PROFILE_SAMPLE_ROWS:,} Features werden 'unique' und 'has_comma' aus einer Stichprobe geschätzt."
+    )
+    cols_info_df = analyze_columns(gdf, sampled=not exact_profile)
     with st.expander("Spaltenanalyse"):
         st.dataframe(cols_info_df)
 
@@ -116,6 +110,13 @@ if gdf is not None:
 
     if target_col:
         info = cols_info_df.loc[target_col]
+        if info["unique_approx"]:
+            # Für die gewählte Spalte exakt nachrechnen (pro Datensatz + Spalte gemerkt)
+            exact_cache = st.session_state.setdefault("gen_split_exact", {})
+            cache_key = (id(gdf), target_col)
+            if cache_key not in exact_cache:
+                exact_cache[cache_key] = column_stats(gdf[target_col])
+            info = exact_cache[cache_key]
         st.write(f"**Typ:** `{info['dtype']}`")
         st.write(f"**Unique:** {info['unique']} · **Missing:** {info['missing']}")
         st.write("Beispielwert:", info["example"])
@@ -149,6 +150,10 @@ if gdf is not None:
 
         st.markdown("---")
         st.markdown("### 4. Split ausführen")
+        workers = st.number_input(
+            "Parallele Schreibvorgänge", min_value=1, max_value=16, value=min(4, os.cpu_count() or 1),
+            help="Gruppen werden parallel aufgelöst und geschrieben (max. doppelt so viele gleichzeitig im Speicher)."
+        )
 
         if st.button("🚀 Split starten", type="primary", disabled=not st.session_state["gen_out_dir"]):
             if not st.session_state["gen_out_dir"]:
@@ -186,45 +191,34 @@ if gdf is not None:
                         proc_gdf[target_col] = proc_gdf[target_col].map(normalize_scalar)
 
                     # 2) Jetzt sollte target_col nur noch skalare, hashbare Werte haben
-                    unique_vals = proc_gdf[target_col].dropna().unique()
-                    total_vals = len(unique_vals)
-
-                    if total_vals == 0:
+                    if not proc_gdf[target_col].notna().any():
                         st.warning("Keine gültigen Werte in der gewählten Spalte gefunden.")
                     else:
                         progress = st.progress(0.0)
-                        created_files = []
 
-                        for i, val in enumerate(unique_vals, start=1):
+                        def path_for(val):
                             label = str(val)
                             if label == "":
                                 label = "EMPTY"
                             safe_label = re.sub(r"[^0-9A-Za-z_\-]+", "_", label)[:80]
-                            filename = f"{base_name}__{target_col}__{safe_label}.geojson"
-                            out_path = os.path.join(out_dir, filename)
-
-                            sub = proc_gdf[proc_gdf[target_col] == val].copy()
-                            if sub.empty:
-                                continue
-
-                            final_gdf = sub.copy()
-
-                            if do_dissolve:
-                                try:
-                                    final_gdf["geometry"] = final_gdf.geometry.buffer(0)
-                                    final_gdf = final_gdf.dissolve(by=target_col, as_index=False)
-                                except Exception:
-                                    # Wenn dissolve knallt, speichern wir ohne
-                                    pass
+                            return os.path.join(out_dir, f"{base_name}__{target_col}__{safe_label}.geojson")
 
-                            final_gdf.to_file(out_path, driver="GeoJSON")
-                            created_files.append(filename)
+                        def on_group_done(done, total, val):
+                            progress.progress(done / total, text=f"{done}/{total}: {val}")
 
-                            progress.progress(i / total_vals)
+                        results = split_to_files(
+                            proc_gdf,
+                            target_col,
+                            path_for,
+                            dissolve_by=target_col if do_dissolve else None,
+                            max_workers=int(workers),
+                            progress_cb=on_group_done,
+                        )
+                        created_files = [os.path.basename(r["path"]) for r in results]
 
                         progress.progress(1.0)
                         st.balloons()
-                        st.success("Fertig!")
+                        st.success(f"Fertig! {len(created_files)} Dateien geschrieben.")
 
                         with st.expander("Ergebnis"):
                             st.write(created_files)
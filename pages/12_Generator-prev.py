@@ -14,6 +14,7 @@ from src.geojson_tools import (
     load_geodataframe_raw,
     select_file_dialog,
     select_folder_dialog,
+    repair_geoseries,
 )
 
 # --- KONFIGURATION ---
@@ -262,7 +263,7 @@ def process_step(sub, stat, cfg, status_ph, batch_ph, name):
     # 5. Dissolve
     status_ph.markdown(f"**{name}**: ✂️ Dissolve & Clip...")
     try:
-        zones = gr[['zone_label','geometry']].copy(); zones['geometry']=zones.geometry.buffer(0)
+        zones = gr[['zone_label','geometry']].copy(); zones['geometry']=repair_geoseries(zones.geometry)[0]
         zones = zones.dissolve(by='zone_label', as_index=False)
 
         valid_tags = []
@@ -275,7 +276,7 @@ def process_step(sub, stat, cfg, status_ph, batch_ph, name):
                 if 'final_label' in zones.columns and 'final_label' != 'zone_label':
                     zones = zones.drop(columns=['final_label'])
 
-        cl = sub.copy(); cl['geometry'] = cl.geometry.buffer(0)
+        cl = sub.copy(); cl['geometry'] = repair_geoseries(cl.geometry)[0]
         keep_cols = ['zone_label', 'geometry'] + valid_tags
         keep_cols = [c for c in keep_cols if c in zones.columns]
         zones_clip = gpd.overlay(zones, cl, how='intersection')[keep_cols]
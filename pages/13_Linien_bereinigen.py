@@ -1,29 +1,11 @@
-import json
-import math
+import io
 import os
 import sys
-from typing import Any, Dict, List, Tuple
+from typing import Any, List, Tuple
 
+import pandas as pd
 import streamlit as st
 
-# Optional geometry tooling
-try:
-    from shapely.geometry import LineString, MultiLineString
-    from shapely.geometry import mapping
-    from shapely.ops import transform as shapely_transform
-    from shapely.ops import unary_union
-
-    SHAPELY_AVAILABLE = True
-except Exception:
-    SHAPELY_AVAILABLE = False
-
-try:
-    from pyproj import CRS, Transformer
-
-    PYPROJ_AVAILABLE = True
-except Exception:
-    PYPROJ_AVAILABLE = False
-
 # Allow imports from src if needed
 def add_repo_to_path() -> None:
     repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -40,6 +22,15 @@ try:
 except Exception:
     GEO_TOOLS_AVAILABLE = False
 
+from src.line_cleaner import (
+    PYPROJ_AVAILABLE,
+    SHAPELY_AVAILABLE,
+    clean_feature_file,
+    clean_file_chunked,
+    clean_files_parallel,
+    default_workers,
+)
+
 st.set_page_config(page_title="Linien bereinigen (PolylineOffset Fix)", layout="wide")
 st.title("🚧 Linien bereinigen (PolylineOffset Fix)")
 st.markdown(
@@ -47,132 +38,6 @@ st.markdown(
 )
 
 
-def haversine_m(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
-    """Great-circle distance between two lon/lat points in meters."""
-    lon1, lat1 = p1
-    lon2, lat2 = p2
-    R = 6371000  # mean Earth radius in meters
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = phi2 - phi1
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    return 2 * R * math.asin(math.sqrt(a))
-
-
-def ensure_min_points(coords: List[List[float]]) -> List[List[float]]:
-    if len(coords) >= 2:
-        return coords
-    if not coords:
-        return []
-    # Duplicate first point if only one remains to avoid degenerating
-    return [coords[0], coords[-1]]
-
-
-def clean_linestring(
-    coords: List[List[float]], min_seg_m: float, keep_ends: bool = True
-) -> Tuple[List[List[float]], int, int]:
-    """Remove consecutive points closer than min_seg_m (meters). Returns cleaned coords and point counts."""
-    if not coords:
-        return [], 0, 0
-
-    kept: List[List[float]] = [coords[0]]
-    for idx, pt in enumerate(coords[1:], start=1):
-        is_last = idx == len(coords) - 1
-        dist = haversine_m((kept[-1][0], kept[-1][1]), (pt[0], pt[1]))
-        if dist >= min_seg_m or (keep_ends and is_last):
-            kept.append(pt)
-    cleaned = ensure_min_points(kept)
-    return cleaned, len(coords), len(cleaned)
-
-
-def infer_utm_crs(lon: float, lat: float) -> CRS:
-    zone = int((lon + 180) // 6) + 1
-    north = lat >= 0
-    epsg_code = 32600 + zone if north else 32700 + zone
-    return CRS.from_epsg(epsg_code)
-
-
-def simplify_geometry(geom, simplify_m: float):
-    if not SHAPELY_AVAILABLE or not PYPROJ_AVAILABLE:
-        return geom, False
-
-    if simplify_m <= 0:
-        return geom, False
-
-    try:
-        lon, lat = geom.coords[0]
-        target_crs = infer_utm_crs(lon, lat)
-        transformer_to = Transformer.from_crs("EPSG:4326", target_crs, always_xy=True)
-        transformer_back = Transformer.from_crs(target_crs, "EPSG:4326", always_xy=True)
-
-        projected = shapely_transform(transformer_to.transform, geom)
-        simplified = projected.simplify(simplify_m, preserve_topology=False)
-        restored = shapely_transform(transformer_back.transform, simplified)
-
-        if restored.geom_type == "LineString" and len(restored.coords) >= 2:
-            return restored, True
-        if restored.geom_type == "MultiLineString":
-            parts = [ls for ls in restored.geoms if len(ls.coords) >= 2]
-            if parts:
-                return MultiLineString(parts), True
-    except Exception:
-        return geom, False
-    return geom, False
-
-
-def process_geometry(
-    geometry: Dict[str, Any], min_seg_m: float, simplify_m: float, keep_ends: bool
-) -> Tuple[Dict[str, Any], Dict[str, int]]:
-    stats = {
-        "lines": 0,
-        "points_in": 0,
-        "points_out": 0,
-        "changed": 0,
-    }
-
-    gtype = geometry.get("type")
-
-    def handle_linestring(coords: List[List[float]]):
-        cleaned, pin, pout = clean_linestring(coords, min_seg_m, keep_ends)
-        stats["lines"] += 1
-        stats["points_in"] += pin
-        stats["points_out"] += pout
-        geom_obj = None
-        if SHAPELY_AVAILABLE:
-            try:
-                geom_obj = LineString(cleaned)
-            except Exception:
-                geom_obj = None
-        simplified_geom = geom_obj
-        simplified_used = False
-        if simplify_m > 0 and geom_obj is not None:
-            simplified_geom, simplified_used = simplify_geometry(geom_obj, simplify_m)
-        if simplified_used and isinstance(simplified_geom, LineString):
-            new_coords = [list(pt) for pt in simplified_geom.coords]
-            stats["points_out"] -= pout
-            stats["points_out"] += len(new_coords)
-            return new_coords, pin != len(new_coords) or pin != pout
-        return cleaned, pin != pout
-
-    if gtype == "LineString":
-        coords = geometry.get("coordinates", [])
-        new_coords, changed = handle_linestring(coords)
-        stats["changed"] += int(changed)
-        return {"type": "LineString", "coordinates": new_coords}, stats
-
-    if gtype == "MultiLineString":
-        out_lines = []
-        changed_any = False
-        for coords in geometry.get("coordinates", []):
-            new_coords, changed = handle_linestring(coords)
-            out_lines.append(new_coords)
-            changed_any = changed_any or changed
-        stats["changed"] += int(changed_any)
-        return {"type": "MultiLineString", "coordinates": out_lines}, stats
-
-    return geometry, stats
-
-
 st.sidebar.header("Eingabe")
 input_mode = st.sidebar.radio(
     "Dateiauswahl", ["Upload (Browser)", "Lokale Auswahl (Tkinter)"]
@@ -202,6 +67,10 @@ inplace_write = st.sidebar.checkbox(
     "Ausgewählte Dateien überschreiben (in-place)", value=False,
     help="Nur für lokale Auswahl. Schreibt die bereinigte GeoJSON direkt zurück."
 )
+save_copy = st.sidebar.checkbox(
+    "Kopie neben dem Original speichern", value=False, disabled=inplace_write,
+    help="Nur für lokale Auswahl. Schreibt '<name>.cleaned.geojson' in den Ordner der Quelldatei statt eines Downloads."
+)
 
 min_seg_m = st.number_input(
     "Minimale Segmentlänge (m) – Punkte mit kürzerem Abstand werden entfernt",
@@ -220,117 +89,39 @@ simplify_m = st.number_input(
 keep_ends = st.checkbox("Start- und Endpunkte beibehalten", value=True)
 merge_features = st.checkbox("Linien-Features zusammenfassen (Union)", value=False)
 
+st.sidebar.header("Parallelisierung")
+use_pool = st.sidebar.checkbox(
+    "Prozess-Pool nutzen", value=False,
+    help="Mehrere lokale Dateien werden parallel bereinigt (je Datei ein Prozess). "
+         "Bei einer einzelnen Datei/Uploads werden Feature-Blöcke parallel bereinigt."
+)
+workers = st.sidebar.number_input("Worker-Prozesse", min_value=1, max_value=32, value=default_workers(), disabled=not use_pool)
+
 if simplify_m > 0 and (not SHAPELY_AVAILABLE or not PYPROJ_AVAILABLE):
     st.warning(
         "Simplify benötigt shapely und pyproj; mindestens ein Paket fehlt. Der Schritt wird übersprungen."
     )
 
-def clean_feature_collection(data: Dict[str, Any], min_seg_m: float, simplify_m: float, keep_ends: bool):
-    cleaned_features = []
-    aggregate = {
-        "features_total": len(data.get("features", [])),
-        "lines_total": 0,
-        "points_in_total": 0,
-        "points_out_total": 0,
-        "features_changed": 0,
-    }
-
-    for feature in data.get("features", []):
-        geom = feature.get("geometry")
-        if not geom:
-            cleaned_features.append(feature)
-            continue
-        new_geom, geom_stats = process_geometry(
-            geom, min_seg_m=min_seg_m, simplify_m=simplify_m, keep_ends=keep_ends
-        )
-        aggregate["lines_total"] += geom_stats["lines"]
-        aggregate["points_in_total"] += geom_stats["points_in"]
-        aggregate["points_out_total"] += geom_stats["points_out"]
-        aggregate["features_changed"] += geom_stats["changed"]
-
-        new_feature = feature.copy()
-        new_feature["geometry"] = new_geom
-        cleaned_features.append(new_feature)
-
-    return cleaned_features, aggregate
-
-
-def maybe_union_lines(cleaned_features: List[Dict[str, Any]]):
-    final_features = cleaned_features
-    if not merge_features:
-        return final_features
-    if not SHAPELY_AVAILABLE:
-        st.warning("Shapely ist nicht verfügbar; Zusammenfassung wird übersprungen.")
-        return final_features
-
-    line_geoms = []
-    other_features = []
-    for feat in cleaned_features:
-        geom = feat.get("geometry") or {}
-        gtype = geom.get("type")
-        coords = geom.get("coordinates")
-        try:
-            if gtype == "LineString":
-                line_geoms.append(LineString(coords))
-            elif gtype == "MultiLineString":
-                line_geoms.append(MultiLineString(coords))
-            else:
-                other_features.append(feat)
-        except Exception:
-            other_features.append(feat)
-
-    if line_geoms:
-        try:
-            merged = unary_union(line_geoms)
-            if merged.is_empty:
-                st.warning("Union der Linien ist leer – übersprungen.")
-            else:
-                merged_geom = merged
-                if merged_geom.geom_type == "GeometryCollection":
-                    merged_parts = [g for g in merged_geom.geoms if g.geom_type in {"LineString", "MultiLineString"}]
-                    if merged_parts:
-                        merged_geom = unary_union(merged_parts)
-                geojson_geom = mapping(merged_geom)
-                merged_feature = {"type": "Feature", "properties": {}, "geometry": geojson_geom}
-                final_features = other_features + [merged_feature]
-        except Exception as exc:
-            st.warning(f"Union der Linien fehlgeschlagen: {exc}")
-    return final_features
-
-
-def load_geojson_from_path(path: str):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def process_payload(name: str, payload: Dict[str, Any]):
-    if payload.get("type") != "FeatureCollection" or "features" not in payload:
-        st.error(f"{name}: Datei muss eine GeoJSON FeatureCollection enthalten.")
-        return None, None
-
-    cleaned_features, aggregate = clean_feature_collection(
-        payload, min_seg_m=min_seg_m, simplify_m=simplify_m, keep_ends=keep_ends
-    )
-    final_features = maybe_union_lines(cleaned_features)
-    cleaned_geojson = {"type": "FeatureCollection", "features": final_features}
-    return cleaned_geojson, aggregate
+def show_metrics(aggregate):
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Features gesamt", aggregate["features_total"])
+    col2.metric("Linien gesamt", aggregate["lines_total"])
+    col3.metric("Punkte vorher", aggregate["points_in_total"])
+    col4.metric("Punkte nachher", aggregate["points_out_total"])
+    col5.metric("Geänderte Features", aggregate["features_changed"])
 
 
 process_clicked = st.button("Bereinigen")
 
 if process_clicked:
-    payloads: List[Tuple[str, Dict[str, Any]]] = []
+    # (Anzeigename, Quelle, Ziel) – Ziel ist ein Pfad (in-place / Kopie) oder ein Puffer für den Download
+    jobs: List[Tuple[str, Any, Any]] = []
 
     if input_mode == "Upload (Browser)":
         if not uploaded_files:
             st.error("Bitte mindestens eine GeoJSON-Datei hochladen.")
         else:
-            for uf in uploaded_files:
-                try:
-                    data = json.loads(uf.read().decode("utf-8"))
-                    payloads.append((uf.name, data))
-                except Exception as exc:
-                    st.error(f"{uf.name}: GeoJSON konnte nicht gelesen werden: {exc}")
+            jobs = [(uf.name, uf, io.BytesIO()) for uf in uploaded_files]
     else:
         if not GEO_TOOLS_AVAILABLE:
             st.error("Lokale Dateiauswahl nicht verfügbar; bitte Upload nutzen.")
@@ -338,43 +129,93 @@ if process_clicked:
             st.error("Bitte mindestens eine Datei über den Tk-Dialog auswählen.")
         else:
             for path in selected_paths:
-                try:
-                    payloads.append((os.path.basename(path), load_geojson_from_path(path)))
-                except Exception as exc:
-                    st.error(f"{path}: GeoJSON konnte nicht gelesen werden: {exc}")
-
-    if payloads:
-        st.success(f"Starte Bereinigung für {len(payloads)} Datei(en).")
-        for name, data in payloads:
-            cleaned_geojson, aggregate = process_payload(name, data)
-            if not cleaned_geojson:
+                base_path, _ = os.path.splitext(path)
+                if inplace_write:
+                    target = path
+                elif save_copy:
+                    target = f"{base_path}.cleaned.geojson"
+                else:
+                    target = io.BytesIO()
+                jobs.append((os.path.basename(path), path, target))
+
+    options = dict(min_seg_m=min_seg_m, simplify_m=simplify_m, keep_ends=keep_ends, merge_features=merge_features)
+
+    # Datei-Pool nur, wenn die Worker-Prozesse direkt auf die Platte schreiben
+    to_disk = all(isinstance(target, str) for _, _, target in jobs)
+    if jobs and use_pool and len(jobs) > 1 and to_disk:
+        # Batch: eine Datei pro Worker-Prozess, Statistik wird beim Eintreffen summiert
+        st.success(f"Starte Bereinigung für {len(jobs)} Datei(en) mit {workers} Prozessen.")
+        progress = st.progress(0.0)
+        totals_ph = st.empty()
+
+        def on_file_done(done, total, source, totals):
+            progress.progress(done / total, text=f"{done}/{total}: {os.path.basename(source)}")
+            with totals_ph.container():
+                show_metrics(totals)
+
+        results, totals = clean_files_parallel(
+            [(source, target) for _, source, target in jobs], max_workers=workers, progress_cb=on_file_done, **options
+        )
+        progress.empty()
+
+        rows = []
+        for name, source, target in jobs:
+            res = results.get(source, {})
+            stats = res.get("stats", {})
+            rows.append({
+                "Datei": name,
+                "Ziel": target,
+                "Features": stats.get("features_total"),
+                "Linien": stats.get("lines_total"),
+                "Punkte vorher": stats.get("points_in_total"),
+                "Punkte nachher": stats.get("points_out_total"),
+                "Geändert": stats.get("features_changed"),
+                "Fehler": res.get("error", ""),
+            })
+            for warning in res.get("warnings", []):
+                st.warning(f"{name}: {warning}")
+        st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+
+    elif jobs:
+        st.success(f"Starte Bereinigung für {len(jobs)} Datei(en).")
+        for name, source, target in jobs:
+            union_progress = st.empty()
+
+            def on_union_step(done, total, label):
+                union_progress.progress(done / total, text=f"Union {name}: {label}")
+
+            try:
+                if use_pool:
+                    aggregate, preview, warnings = clean_file_chunked(
+                        source, target, max_workers=workers, union_progress_cb=on_union_step, **options
+                    )
+                else:
+                    aggregate, preview, warnings = clean_feature_file(
+                        source, target, union_progress_cb=on_union_step, **options
+                    )
+            except Exception as exc:
+                st.error(f"{name}: GeoJSON konnte nicht verarbeitet werden: {exc}")
                 continue
+            finally:
+                union_progress.empty()
 
-            col1, col2, col3, col4, col5 = st.columns(5)
-            col1.metric("Features gesamt", aggregate["features_total"])
-            col2.metric("Linien gesamt", aggregate["lines_total"])
-            col3.metric("Punkte vorher", aggregate["points_in_total"])
-            col4.metric("Punkte nachher", aggregate["points_out_total"])
-            col5.metric("Geänderte Features", aggregate["features_changed"])
+            for warning in warnings:
+                st.warning(warning)
+            show_metrics(aggregate)
 
             base_name, _ = os.path.splitext(name)
             out_name = f"{base_name}.cleaned.geojson"
-            st.download_button(
-                f"{out_name} herunterladen",
-                data=json.dumps(cleaned_geojson, ensure_ascii=False, indent=2),
-                file_name=out_name,
-                mime="application/geo+json",
-            )
-
-            if inplace_write and input_mode == "Lokale Auswahl (Tkinter)":
-                try:
-                    original_path = next((p for p in selected_paths if os.path.basename(p) == name), None)
-                    if original_path:
-                        with open(original_path, "w", encoding="utf-8") as f:
-                            json.dump(cleaned_geojson, f, ensure_ascii=False, indent=2)
-                        st.info(f"{original_path} wurde überschrieben.")
-                except Exception as exc:
-                    st.warning(f"In-place-Schreiben für {name} fehlgeschlagen: {exc}")
-
-            with st.expander(f"Bereinigte GeoJSON Vorschau – {out_name}"):
-                st.json(cleaned_geojson)
+            if isinstance(target, io.BytesIO):
+                st.download_button(
+                    f"{out_name} herunterladen",
+                    data=target.getvalue(),
+                    file_name=out_name,
+                    mime="application/geo+json",
+                )
+            elif target == source:
+                st.info(f"{target} wurde überschrieben.")
+            else:
+                st.info(f"Gespeichert unter: {target}")
+
+            with st.expander(f"Vorschau (erste {len(preview)} Features) – {out_name}"):
+                st.json(preview)
@@ -1,7 +1,7 @@
-import json
+import io
 import os
 import sys
-from typing import Dict, Any, List, Tuple
+from typing import Dict, List, Tuple
 
 import streamlit as st
 
@@ -14,6 +14,8 @@ try:
 except Exception:
     GEO_TOOLS_AVAILABLE = False
 
+from src.geojson_stream import FeatureCollectionReader, FeatureCollectionWriter
+
 
 st.set_page_config(page_title="GeoJSON ID Repair", page_icon="🪪", layout="wide")
 st.title("🪪 GeoJSON IDs ergänzen")
@@ -29,23 +31,30 @@ st.session_state.setdefault("id_repair_paths", [])
 
 
 # --- HELPER ---
-def ensure_feature_ids(data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, int]]:
-    """Ensure every feature inside a FeatureCollection has an ``id`` value."""
+def collect_existing_ids(source) -> Tuple[set, Dict[str, int]]:
+    """1. Durchlauf: vorhandene IDs (als String) und Zählwerte, ohne die Datei zu laden."""
     stats = {
         "features_total": 0,
         "ids_existing": 0,
         "ids_added": 0,
     }
+    existing_ids = set()
+    for feature in FeatureCollectionReader(source):
+        if not isinstance(feature, dict):
+            raise ValueError(f"Feature {stats['features_total'] + 1} ist kein GeoJSON-Objekt.")
+        stats["features_total"] += 1
+        fid = feature.get("id")
+        if fid in (None, ""):
+            stats["ids_added"] += 1
+        else:
+            stats["ids_existing"] += 1
+            existing_ids.add(str(fid))
+    return existing_ids, stats
 
-    if not isinstance(data, dict) or data.get("type") != "FeatureCollection":
-        return data, stats
-
-    features: List[Dict[str, Any]] = data.get("features", []) or []
-    stats["features_total"] = len(features)
-
-    # Track existing IDs as strings to avoid duplicates when generating new ones
-    existing_ids = {str(f.get("id")) for f in features if f.get("id") not in (None, "")}
 
+def write_feature_ids(source, target, existing_ids: set) -> None:
+    """2. Durchlauf: Features streamen, fehlende IDs ergänzen und direkt schreiben."""
+    existing_ids = set(existing_ids)
     next_id = 1
 
     def generate_id() -> int:
@@ -57,27 +66,28 @@ def ensure_feature_ids(data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str,
         next_id += 1
         return assigned
 
-    updated_features = []
-    for feature in features:
-        fid = feature.get("id")
-        if fid in (None, ""):
-            fid = generate_id()
-            stats["ids_added"] += 1
-        else:
-            stats["ids_existing"] += 1
-        new_feat = feature.copy()
-        new_feat["id"] = fid
-        updated_features.append(new_feat)
-
-    new_data = data.copy()
-    new_data["features"] = updated_features
-    return new_data, stats
-
-
-def process_file(path: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return ensure_feature_ids(data)
+    reader = FeatureCollectionReader(source)
+    writer = FeatureCollectionWriter(target)
+    try:
+        for feature in reader:
+            if feature.get("id") in (None, ""):
+                feature["id"] = generate_id()
+            writer.write(feature)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close(reader.members)
+
+
+def ensure_feature_ids(source, target) -> Dict[str, int]:
+    """Ensure every feature inside a FeatureCollection has an ``id`` value (zwei Durchläufe, konstanter Speicher)."""
+    existing_ids, stats = collect_existing_ids(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    # Dateien ohne fehlende IDs bleiben unangetastet
+    if stats["ids_added"] or not isinstance(target, str):
+        write_feature_ids(source, target, existing_ids)
+    return stats
 
 
 # --- SIDEBAR ---
@@ -94,6 +104,7 @@ if selection_mode == "Upload (Browser)":
         "GeoJSON-Dateien hochladen", type=["geojson", "json"], accept_multiple_files=True
     )
     inplace_write = False
+    save_copy = False
     selected_paths = []
 else:
     if not GEO_TOOLS_AVAILABLE:
@@ -111,6 +122,10 @@ else:
         value=bool(selected_paths),
         help="Schreibt die aktualisierten IDs direkt in die Dateien.",
     )
+    save_copy = st.sidebar.checkbox(
+        "Kopie neben dem Original speichern", value=False, disabled=inplace_write,
+        help="Schreibt '<name>_ids.geojson' in den Ordner der Quelldatei statt eines Downloads.",
+    )
 
 
 # --- MAIN LOGIC ---
@@ -125,19 +140,33 @@ else:
         st.subheader("Upload-Verarbeitung")
         for up_file in uploaded_files:
             try:
-                data = json.loads(up_file.getvalue().decode("utf-8"))
-                new_data, stats = ensure_feature_ids(data)
-                file_label = up_file.name
-                results.append((file_label, stats, new_data, None))
+                out = io.BytesIO()
+                stats = ensure_feature_ids(up_file, out)
+                results.append((up_file.name, stats, out.getvalue(), None))
+            except ValueError as e:
+                st.error(f"{up_file.name}: keine gültige GeoJSON FeatureCollection – {e}")
             except Exception as e:
                 st.error(f"Fehler beim Lesen von {up_file.name}: {e}")
 
     if selected_paths:
         st.subheader("Lokale Dateien")
         for path in selected_paths:
+            # Ziel: Original (in-place), Kopie daneben (explizit) oder Puffer für den Download
+            if inplace_write:
+                target = path
+            elif save_copy:
+                base, ext = os.path.splitext(path)
+                target = f"{base}_ids{ext or '.geojson'}"
+            else:
+                target = io.BytesIO()
             try:
-                new_data, stats = process_file(path)
-                results.append((os.path.basename(path), stats, new_data, path))
+                stats = ensure_feature_ids(path, target)
+                if isinstance(target, str):
+                    results.append((os.path.basename(path), stats, None, target))
+                else:
+                    results.append((os.path.basename(path), stats, target.getvalue(), None))
+            except ValueError as e:
+                st.error(f"{os.path.basename(path)}: keine gültige GeoJSON FeatureCollection – {e}")
             except Exception as e:
                 st.error(f"Fehler beim Verarbeiten von {os.path.basename(path)}: {e}")
 
@@ -157,17 +186,16 @@ else:
         st.markdown("---")
         st.markdown("### Ausgabe")
 
-        for fname, stats, updated_data, path in results:
+        for fname, stats, payload, target in results:
             st.write(f"**{fname}** – {stats['ids_added']} IDs ergänzt")
-            payload = json.dumps(updated_data, ensure_ascii=False, indent=2)
 
-            if path and inplace_write:
-                try:
-                    with open(path, "w", encoding="utf-8") as f:
-                        f.write(payload)
+            if target:
+                if not stats["ids_added"]:
+                    st.info(f"{fname}: keine fehlenden IDs, Datei unverändert.")
+                elif inplace_write:
                     st.success(f"{fname} wurde überschrieben.")
-                except Exception as e:
-                    st.error(f"Konnte {fname} nicht schreiben: {e}")
+                else:
+                    st.success(f"Gespeichert unter: `{target}`")
             else:
                 st.download_button(
                     label=f"⬇️ {fname} herunterladen",
@@ -176,5 +204,5 @@ else:
                     data=payload,
                 )
 
-        if any(p for *_, p in results) and inplace_write:
+        if any(t for *_, t in results) and inplace_write:
             st.balloons()
@@ -1,5 +1,7 @@
+import concurrent.futures
 import os
 import sys
+import time
 
 import geopandas as gpd
 import streamlit as st
@@ -10,6 +12,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.geojson_tools import (
     select_files_dialog,
     load_geodataframe_raw,
+    read_field_names,
+    write_geodataframe_atomic,
 )
 
 # --- SETUP ---
@@ -42,6 +46,38 @@ presets = {
     ],
 }
 
+# --- HELPER ---
+def clean_file(path, keep_tags, in_place):
+    """Liest nur die Preset-Spalten (+ Geometrie) und schreibt atomar (Temp-Datei + Umbenennen)."""
+    start = time.perf_counter()
+    # Nur die Preset-Spalten (+ Geometrie) lesen, der Rest wird nie geparst
+    fields = read_field_names(path)
+    cols_to_delete = [c for c in fields if c not in keep_tags]
+    keep_cols = [c for c in fields if c in keep_tags]
+
+    clean_gdf = load_geodataframe_raw(path, cache=False, columns=keep_cols)
+
+    dir_name = os.path.dirname(path)
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    new_path = path if in_place else os.path.join(dir_name, f"{base_name}_clean.geojson")
+
+    size_old = os.path.getsize(path)
+    write_geodataframe_atomic(clean_gdf, new_path)
+    size_new = os.path.getsize(new_path)
+    elapsed = max(time.perf_counter() - start, 1e-6)
+
+    return {
+        "Datei": os.path.basename(path),
+        "Gelöscht": len(cols_to_delete),
+        "Features": len(clean_gdf),
+        "Alte Größe (KB)": round(size_old / 1024, 1),
+        "Neue Größe (KB)": round(size_new / 1024, 1),
+        "Dauer (s)": round(elapsed, 2),
+        "MB/s": round(size_old / (1024 * 1024) / elapsed, 1),
+        "Features/s": int(len(clean_gdf) / elapsed),
+        "Status": "OK",
+    }
+
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("Dateien")
@@ -79,6 +115,11 @@ if st.session_state["batch_cleaner_files"]:
             key="batch_cleaner_save_mode",
         )
 
+        workers = st.number_input(
+            "Parallele Dateien", min_value=1, max_value=16, value=min(4, os.cpu_count() or 1),
+            help="Dateien werden in einem Thread-Pool gelesen und geschrieben (GDAL gibt den GIL frei).",
+        )
+
     with col_left:
         st.subheader("🧾 Preset-Übersicht")
         if preset_choice == "Keine Voreinstellung":
@@ -96,49 +137,40 @@ if st.session_state["batch_cleaner_files"]:
         keep_tags = set(presets[preset_choice])
         in_place = "In-Place" in save_mode
 
-        results = []
+        files = st.session_state["batch_cleaner_files"]
+        results = {}
         progress = st.progress(0)
-
-        for idx, path in enumerate(st.session_state["batch_cleaner_files"], start=1):
-            try:
-                gdf = load_geodataframe_raw(path)
-                cols_to_delete = [
-                    c for c in gdf.columns if c != "geometry" and c not in keep_tags
-                ]
-
-                clean_gdf = gdf.drop(columns=cols_to_delete)
-
-                dir_name = os.path.dirname(path)
-                base_name = os.path.splitext(os.path.basename(path))[0]
-                new_path = os.path.join(dir_name, f"{base_name}_clean.geojson")
-                if in_place:
-                    new_path = path
-
-                size_old = os.path.getsize(path) / 1024
-                clean_gdf.to_file(new_path, driver="GeoJSON")
-                size_new = os.path.getsize(new_path) / 1024
-
-                results.append(
-                    {
+        batch_start = time.perf_counter()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=int(workers)) as pool:
+            futures = {pool.submit(clean_file, path, keep_tags, in_place): path for path in files}
+            for done, fut in enumerate(concurrent.futures.as_completed(futures), start=1):
+                path = futures[fut]
+                try:
+                    results[path] = fut.result()
+                except Exception as exc:
+                    results[path] = {
                         "Datei": os.path.basename(path),
-                        "Gelöscht": len(cols_to_delete),
-                        "Alte Größe (KB)": round(size_old, 1),
-                        "Neue Größe (KB)": round(size_new, 1),
-                        "Status": "OK",
-                    }
-                )
-            except Exception as exc:
-                results.append(
-                    {
-                        "Datei": os.path.basename(path),
-                        "Gelöscht": "-",
-                        "Alte Größe (KB)": "-",
-                        "Neue Größe (KB)": "-",
+                        "Gelöscht": None,
+                        "Features": None,
+                        "Alte Größe (KB)": None,
+                        "Neue Größe (KB)": None,
+                        "Dauer (s)": None,
+                        "MB/s": None,
+                        "Features/s": None,
                         "Status": f"Fehler: {exc}",
                     }
-                )
-
-            progress.progress(idx / len(st.session_state["batch_cleaner_files"]))
+                progress.progress(done / len(files), text=f"{done}/{len(files)}: {os.path.basename(path)}")
+
+        total_s = time.perf_counter() - batch_start
+        results = [results[path] for path in files]
+        ok = [r for r in results if r["Status"] == "OK"]
+        total_mb = sum(r["Alte Größe (KB)"] for r in ok) / 1024
+        total_features = sum(r["Features"] for r in ok)
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Dateien OK", f"{len(ok)}/{len(results)}")
+        c2.metric("Durchsatz (MB/s)", f"{total_mb / max(total_s, 1e-6):.1f}")
+        c3.metric("Features/s", f"{total_features / max(total_s, 1e-6):,.0f}")
 
         st.dataframe(results, hide_index=True, width="stretch")
         st.balloons()
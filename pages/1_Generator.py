@@ -11,14 +11,15 @@ from shapely.geometry import Polygon
 from math import radians, sin, cos, sqrt, atan2
 
 # --- SETUP: SHARED TOOLS ---
-# Nur für Config & Dialoge, NICHT für Daten-Loading
+# Für Config, Dialoge & Dissolve; Geodaten für das Routing lädt die Seite selbst (1:1)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 try:
     from src.geojson_tools import (
-        load_config, save_config, select_file_dialog, select_folder_dialog
+        load_config, save_config, select_file_dialog, select_folder_dialog, dissolve_zones,
+        load_geodataframe_raw, repair_geoseries
     )
 except ImportError:
     st.error("Fehler: 'src/geojson_tools.py' nicht gefunden.")
@@ -31,7 +32,8 @@ def load_data_local(filepath):
     """
     if not os.path.exists(filepath): return None
     try:
-        gdf = gpd.read_file(filepath)
+        # Über den Dataset-Cache (keine Geometrie-Änderung, eigene Kopie)
+        gdf = load_geodataframe_raw(filepath)
         # Entferne technisch leere Zeilen
         if 'geometry' in gdf.columns:
             gdf = gdf[gdf.geometry.notna()]
@@ -46,11 +48,11 @@ def load_data_local(filepath):
 # --- HELPER: TAG ANALYSE ---
 def get_station_tags_df(filepath):
     try:
-        gdf = load_data_local(filepath)
-        if gdf is None: return pd.DataFrame()
-        cols = [c for c in gdf.columns if c != 'geometry']
+        # Für die Zählung reichen die Attribute, Geometrie wird nicht gelesen (dtypes egal -> Arrow)
+        df = load_geodataframe_raw(filepath, ignore_geometry=True, use_arrow=True)
+        cols = [c for c in df.columns if c != 'geometry']
         sel = st.session_state.get("selected_tags", [])
-        data = [{"selected": c in sel, "name": c, "count": gdf[c].count()} for c in cols]
+        data = [{"selected": c in sel, "name": c, "count": df[c].count()} for c in cols]
         return pd.DataFrame(data).sort_values(by=["selected", "count"], ascending=[False, False])
     except: return pd.DataFrame()
 
@@ -427,9 +429,7 @@ def process_single_area(sub_area, all_stations, helicopter_stations, cfg, status
     
     # --- 5. DISSOLVE ---
     try:
-        zones = grid[['zone_label','geometry']].copy()
-        zones['geometry'] = zones.geometry.buffer(0)
-        zones = zones.dissolve(by='zone_label', as_index=False)
+        zones = dissolve_zones(grid[['zone_label','geometry']], 'zone_label')
         
         if selected_tags:
             valid = [t for t in selected_tags if t in all_stations.columns]
@@ -439,7 +439,7 @@ def process_single_area(sub_area, all_stations, helicopter_stations, cfg, status
                 zones = zones.drop(columns=['final_label'])
                 
         cl = sub_area.copy()
-        cl['geometry'] = cl.geometry.buffer(0)
+        cl['geometry'] = repair_geoseries(cl.geometry)[0]
         zones_clip = gpd.overlay(zones, cl, how='intersection')
         
         steps[4] = ("5. Auflösen & Speichern", 2)
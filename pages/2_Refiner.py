@@ -5,14 +5,17 @@ import requests
 import os
 import json
 import concurrent.futures
+import threading
 import time
 import sys
+from collections import OrderedDict
 from datetime import datetime
 
 # --- IMPORT SHARED TOOLS ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.geojson_tools import (
-    load_config, save_config, select_files_dialog, select_folder_dialog, load_geodataframe_raw
+    load_config, save_config, select_files_dialog, select_folder_dialog, load_geodataframe_raw,
+    dissolve_zones, repair_geoseries
 )
 
 st.set_page_config(page_title="Refiner (Smart)", layout="wide")
@@ -29,7 +32,8 @@ defaults = {
     "profile": "driving-emergency", 
     "use_fallback": False, 
     "out_path": os.getcwd(), 
-    "input_files": []
+    "input_files": [],
+    "resume_run": False
 }
 
 for k, v in defaults.items():
@@ -56,6 +60,93 @@ def get_station_attributes_df(gdf, selected_tags):
         return df[cols].drop_duplicates(subset='final_label')
     return None
 
+PAIR_CACHE_MAX = 200_000  # Einträge; ~310 B je Paar (Tupel-Key + OrderedDict + float) -> max. ~60 MB
+DIRECTIONS_PER_HEX = 4    # gleichzeitige /directions-Anfragen je Hex im Fallback
+
+@st.cache_resource
+def get_pair_cache():
+    """Prozessweiter LRU-Cache Wache/Hex -> Fahrzeit (überlebt Reruns)."""
+    return {"durations": OrderedDict(), "lock": threading.Lock()}
+
+def pair_key(conf, station_coords, hex_pt):
+    # Koordinaten statt Name: verschobene Wachen / neue Wachen-Datei erzeugen neue Keys
+    return (conf["url"], conf["profile"], round(station_coords[0], 6), round(station_coords[1], 6),
+            round(hex_pt[0], 6), round(hex_pt[1], 6))
+
+def cache_lookup(cache, keys):
+    """{name: dauer} für bekannte Paare; markiert Treffer als zuletzt benutzt."""
+    found = {}
+    with cache["lock"]:
+        for n, k in keys.items():
+            if k in cache["durations"]:
+                cache["durations"].move_to_end(k)
+                found[n] = cache["durations"][k]
+    return found
+
+def cache_store(cache, items):
+    with cache["lock"]:
+        for k, t in items:
+            cache["durations"][k] = t
+            cache["durations"].move_to_end(k)
+        while len(cache["durations"]) > PAIR_CACHE_MAX:
+            cache["durations"].popitem(last=False)
+
+# Eine HTTP-Session je Worker-Thread (Keep-Alive), nach dem Batch geschlossen
+_worker = threading.local()
+
+def new_session():
+    """Session mit so vielen Keep-Alive-Verbindungen wie gleichzeitige Anfragen je Hex."""
+    s = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=DIRECTIONS_PER_HEX)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+def init_worker_session(sessions, lock, directions_pool=None):
+    _worker.session = new_session()
+    _worker.directions_pool = directions_pool
+    with lock: sessions.append(_worker.session)
+
+def worker_session():
+    if getattr(_worker, "session", None) is None:
+        _worker.session = new_session()
+    return _worker.session
+
+def fetch_direction_duration(session, conf, coords, hex_pt):
+    """Minimale /directions Anfrage (ohne Geometrie & Anweisungen), liefert nur die Dauer."""
+    body = {"coordinates": [coords, hex_pt], "instructions": False, "geometry": False, "elevation": False}
+    r = session.post(f"{conf['url']}/directions/{conf['profile']}/json", json=body, timeout=5)
+    if r.status_code != 200: return None
+    # Bei Start == Ziel liefert ORS eine leere Summary
+    return r.json()['routes'][0]['summary'].get('duration', 0.0)
+
+def fetch_directions(session, cands, hex_pt, conf):
+    """
+    Fragt die Kandidaten eines Hex gleichzeitig an (höchstens DIRECTIONS_PER_HEX offen) – über den
+    gemeinsamen Directions-Pool des Batches und die Session des Workers. Rückgabe: {name: dauer}
+    """
+    out = {}
+    pool = getattr(_worker, "directions_pool", None)
+    if pool is None:
+        for n, coords in cands:
+            try: t = fetch_direction_duration(session, conf, coords, hex_pt)
+            except Exception: continue
+            if t is not None: out[n] = t
+        return out
+
+    todo = list(cands); running = {}
+    while todo or running:
+        while todo and len(running) < DIRECTIONS_PER_HEX:
+            n, coords = todo.pop(0)
+            running[pool.submit(fetch_direction_duration, session, conf, coords, hex_pt)] = n
+        finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for f in finished:
+            n = running.pop(f)
+            try: t = f.result()
+            except Exception: continue
+            if t is not None: out[n] = t
+    return out
+
 def route_hex(row, lookup, conf):
     try:
         hex_pt = [row.geometry.centroid.x, row.geometry.centroid.y]
@@ -66,32 +157,94 @@ def route_hex(row, lookup, conf):
                 cands.append((str(row[k]), lookup[str(row[k])]))
         
         if not cands: return row.get('zone_label'), row.get('duration', 9999)
-        best_n, best_t = None, float('inf')
+
+        # Bereits bekannte Paare aus dem Cache holen
+        cache = get_pair_cache()
+        keys = {n: pair_key(conf, coords, hex_pt) for n, coords in cands}
+        known = cache_lookup(cache, keys)
+        todo = [c for c in cands if c[0] not in known]
+        fetched = {}
+        session = worker_session()
         
-        if not conf["use_fallback"]:
-            locs = [hex_pt] + [c[1] for c in cands]
+        if todo and not conf["use_fallback"]:
+            locs = [hex_pt] + [c[1] for c in todo]
             try:
-                r = requests.post(f"{conf['url']}/matrix/{conf['profile']}", json={"locations":locs,"metrics":["duration"],"sources":list(range(1,len(cands)+1)),"destinations":[0]}, timeout=5)
+                r = session.post(f"{conf['url']}/matrix/{conf['profile']}", json={"locations":locs,"metrics":["duration"],"sources":list(range(1,len(todo)+1)),"destinations":[0]}, timeout=5)
                 if r.status_code==200:
                     durs = r.json()['durations']
                     for idx, dl in enumerate(durs):
-                        if dl[0] is not None and dl[0] < best_t: best_t = dl[0]; best_n = cands[idx][0]
+                        if dl[0] is not None: fetched[todo[idx][0]] = dl[0]
             except: pass
             
-        if conf["use_fallback"] or best_n is None:
-            for n, coords in cands:
-                try:
-                    u = f"{conf['url']}/directions/{conf['profile']}?start={coords[0]},{coords[1]}&end={hex_pt[0]},{hex_pt[1]}"
-                    r = requests.get(u, timeout=5)
-                    if r.status_code==200:
-                        t = r.json()['features'][0]['properties']['summary']['duration']
-                        if t < best_t: best_t = t; best_n = n
-                except: continue
-        return (best_n, best_t) if best_n else (row.get('zone_label'), row.get('duration', 9999))
+        if todo and (conf["use_fallback"] or not fetched):
+            fetched.update(fetch_directions(session, todo, hex_pt, conf))
+
+        if fetched:
+            cache_store(cache, [(keys[n], t) for n, t in fetched.items()])
+
+        times = {**known, **fetched}
+        if not times: return row.get('zone_label'), row.get('duration', 9999)
+        best_n = min(times, key=times.get)
+        return best_n, times[best_n]
     except: return row.get('zone_label'), row.get('duration', 9999)
 
-def process_file_and_clip(hex_path, st_lookup, conf, area_gdf, feat_idx, metrics_ph, prog_bar, station_attrs=None):
-    gdf = load_geodataframe_raw(hex_path)
+# --- CHECKPOINTS (Fortsetzen nach Abbruch) ---
+def checkpoint_path(final_dir, t_idx, hex_path):
+    base = os.path.splitext(os.path.basename(hex_path))[0]
+    return os.path.join(final_dir, "checkpoints", f"{t_idx:03d}_{base}.json")
+
+def file_sig(path):
+    """(mtime_ns, Größe) als Liste (JSON-tauglich), None wenn nicht vorhanden."""
+    try:
+        s = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [s.st_mtime_ns, s.st_size]
+
+def checkpoint_fingerprint(conf, hex_path, stations_path):
+    """Alles, was die Labels eines Batches beeinflusst: Routing-Einstellungen + Eingabedateien."""
+    return {
+        "conf": {k: conf[k] for k in ("url", "profile", "top_n", "use_fallback")},
+        "hex": file_sig(hex_path),
+        "stations": file_sig(stations_path),
+    }
+
+def save_checkpoint(path, gdf, fingerprint=None):
+    """Speichert Labels & Dauer je Hex (positionsbasiert, kompakt). Atomar via tmp + rename."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "n": len(gdf),
+        "fingerprint": fingerprint,
+        "labels": [None if pd.isna(l) else str(l) for l in gdf['zone_label']],
+        "durations": [None if pd.isna(d) else float(d) for d in gdf.get('duration', [None] * len(gdf))],
+    }
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+    os.replace(tmp, path)
+
+def load_checkpoint(path, n_rows, fingerprint=None):
+    """Liefert (labels, durations) oder None, falls fehlend/unpassend (andere Einstellungen oder Dateien)."""
+    if not path or not os.path.exists(path): return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+    except Exception: return None
+    if data.get("n") != n_rows: return None
+    if data.get("fingerprint") != fingerprint: return None
+    return data["labels"], data["durations"]
+
+def find_resume_dir(out_path, run_name):
+    """Neuester 'Refined_{run_name}_*' Ordner mit Checkpoints, sonst None."""
+    prefix = f"Refined_{run_name}_"
+    try: names = os.listdir(out_path)
+    except OSError: return None
+    dirs = [os.path.join(out_path, n) for n in names if n.startswith(prefix)]
+    dirs = [d for d in dirs if os.path.isdir(os.path.join(d, "checkpoints"))]
+    return max(dirs, key=os.path.getmtime) if dirs else None
+
+def process_file_and_clip(hex_path, st_lookup, conf, area_gdf, feat_idx, metrics_ph, prog_bar, station_attrs=None, ckpt_path=None, ckpt_fp=None):
+    # Batch-Dateien werden nur einmal gelesen -> nicht cachen
+    gdf = load_geodataframe_raw(hex_path, cache=False)
     
     # Prüfen ob Kandidaten vorhanden sind
     has_cands = "cand_1_name" in gdf.columns
@@ -100,29 +253,45 @@ def process_file_and_clip(hex_path, st_lookup, conf, area_gdf, feat_idx, metrics
         # und machen nur den Dissolve/Tag-Merge Schritt
         pass
     
-    if has_cands:
+    ckpt = load_checkpoint(ckpt_path, len(gdf), ckpt_fp) if has_cands else None
+    if ckpt is None and has_cands and ckpt_path and os.path.exists(ckpt_path):
+        st.warning(f"Checkpoint für `{os.path.basename(hex_path)}` passt nicht zu Einstellungen/Dateien – wird neu berechnet.")
+    if ckpt is not None:
+        # Routing bereits erledigt -> Labels aus Checkpoint übernehmen
+        gdf['zone_label'], gdf['duration'] = ckpt
+        metrics_ph.markdown("♻️ Aus Checkpoint geladen")
+        prog_bar.progress(1.0)
+    elif has_cands:
         tot = len(gdf); don = 0; res = []; stt = time.time()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=conf["threads"]) as exc:
-            fut = {exc.submit(route_hex, r, st_lookup, conf): i for i, r in gdf.iterrows()}
-            for f in concurrent.futures.as_completed(fut):
-                don += 1
-                if don % 20 == 0:
-                    el = time.time()-stt; sp = don/el if el>0 else 0
-                    prog_bar.progress(don/tot)
-                    metrics_ph.markdown(f"⚡ Speed: `{sp:.1f}` Hex/s")
-                try: res.append((fut[f], f.result()))
-                except: pass
+        sessions = []
+        # Ein begrenzter Pool für die Fallback-Anfragen aller Hex-Worker (kein Pool je Hex)
+        directions_pool = concurrent.futures.ThreadPoolExecutor(max_workers=conf["threads"] * DIRECTIONS_PER_HEX)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=conf["threads"], initializer=init_worker_session,
+                                                       initargs=(sessions, threading.Lock(), directions_pool)) as exc:
+                fut = {exc.submit(route_hex, r, st_lookup, conf): i for i, r in gdf.iterrows()}
+                for f in concurrent.futures.as_completed(fut):
+                    don += 1
+                    if don % 20 == 0:
+                        el = time.time()-stt; sp = don/el if el>0 else 0
+                        prog_bar.progress(don/tot)
+                        metrics_ph.markdown(f"⚡ Speed: `{sp:.1f}` Hex/s")
+                    try: res.append((fut[f], f.result()))
+                    except: pass
+        finally:
+            directions_pool.shutdown(wait=True)
+            for s in sessions: s.close()
         
         prog_bar.progress(1.0)
         for i, (l, d) in res: 
             gdf.at[i, 'zone_label'] = l
             gdf.at[i, 'duration'] = d
+        if ckpt_path: save_checkpoint(ckpt_path, gdf, ckpt_fp)
             
     gdf = gdf.dropna(subset=['zone_label'])
-    gdf['geometry'] = gdf.geometry.buffer(0)
     
-    # Dissolve
-    zones = gdf.dissolve(by='zone_label', as_index=False)
+    # Dissolve (Coverage-Union wenn möglich)
+    zones = dissolve_zones(gdf, 'zone_label')
     
     # NEU: Tags wiederherstellen (Attribut Merge)
     if station_attrs is not None and not station_attrs.empty:
@@ -137,7 +306,7 @@ def process_file_and_clip(hex_path, st_lookup, conf, area_gdf, feat_idx, metrics
             try: cg = area_gdf.iloc[[feat_idx]] 
             except: cg = area_gdf
         else: cg = area_gdf
-        cg = cg.copy(); cg['geometry'] = cg.geometry.buffer(0)
+        cg = cg.copy(); cg['geometry'] = repair_geoseries(cg.geometry)[0]
         try: zones = gpd.overlay(zones, cg, how='intersection')
         except: pass
         
@@ -181,6 +350,8 @@ with st.sidebar:
     st.session_state["top_n"] = st.number_input("Top N", 1, 20, st.session_state["top_n"])
     st.session_state["threads"] = st.slider("Threads", 1, 32, st.session_state["threads"])
     st.session_state["use_fallback"] = st.checkbox("Fallback erzwingen", st.session_state["use_fallback"])
+    st.session_state["resume_run"] = st.checkbox("Vorherigen Lauf fortsetzen", st.session_state["resume_run"],
+                                                 help="Nutzt den letzten 'Refined_<Run>_*' Ordner und rechnet nur fehlende Batches neu.")
     
     c5,c6=st.columns([3,1])
     with c6:
@@ -216,7 +387,7 @@ if st.button("🚀 Start Smart-Refiner", type="primary"):
         global_status.info(f"Lade Datei {f_idx+1}/{len(fps)}: {fname}")
         
         # 1. Prepare Meta & Data
-        area_gdf = None; st_lookup = None; tasks = []; run_name = "Run"
+        area_gdf = None; st_lookup = None; tasks = []; run_name = "Run"; stations_path = None
         station_attrs = None # DF für Tags
         
         if fpath.endswith(".json"):
@@ -226,6 +397,7 @@ if st.button("🚀 Start Smart-Refiner", type="primary"):
                     if "run_name" in js["meta"]: run_name = js["meta"]["run_name"]
                     ap = js["meta"]["area_path"]
                     sp = js["meta"]["stations_path"]
+                    stations_path = sp
                     
                     # Tags aus Meta lesen
                     tags_to_load = js["meta"].get("selected_tags", [])
@@ -234,8 +406,8 @@ if st.button("🚀 Start Smart-Refiner", type="primary"):
                         area_gdf = load_geodataframe_raw(ap).to_crs(epsg=4326)
 
                     if os.path.exists(sp):
-                        # Lade DS komplett für Lookup UND Attribute
-                        raw_st = load_geodataframe_raw(sp).to_crs(epsg=4326)
+                        # Lade DS nur mit Namens-Spalten + gewählten Tags (Lookup UND Attribute)
+                        raw_st = load_geodataframe_raw(sp, columns=['name', 'alt_name'] + list(tags_to_load)).to_crs(epsg=4326)
                         if 'alt_name' not in raw_st: raw_st['alt_name'] = None
                         if 'name' not in raw_st: raw_st['name'] = raw_st.index.astype(str)
                         raw_st['final_label'] = raw_st['alt_name'].fillna(raw_st['name'])
@@ -259,9 +431,14 @@ if st.button("🚀 Start Smart-Refiner", type="primary"):
         
         if not tasks: continue
         
-        # 2. Output Dir
-        ts = datetime.now().strftime("%H-%M-%S")
-        final_dir = os.path.join(st.session_state["out_path"], f"Refined_{run_name}_{ts}")
+        # 2. Output Dir (ggf. vorherigen Lauf fortsetzen)
+        final_dir = None
+        if st.session_state["resume_run"]:
+            final_dir = find_resume_dir(st.session_state["out_path"], run_name)
+            if final_dir: st.info(f"♻️ Setze fort in `{os.path.basename(final_dir)}`")
+        if not final_dir:
+            ts = datetime.now().strftime("%H-%M-%S")
+            final_dir = os.path.join(st.session_state["out_path"], f"Refined_{run_name}_{ts}")
         os.makedirs(final_dir, exist_ok=True)
         
         file_zones = []
@@ -274,7 +451,9 @@ if st.button("🚀 Start Smart-Refiner", type="primary"):
             
             if os.path.exists(hexp):
                 # Hier übergeben wir station_attrs
-                z = process_file_and_clip(hexp, st_lookup, conf, area_gdf, cidx, current_job_metrics, current_job_prog, station_attrs)
+                ckpt = checkpoint_path(final_dir, t_idx, hexp)
+                ckpt_fp = checkpoint_fingerprint(conf, hexp, stations_path)
+                z = process_file_and_clip(hexp, st_lookup, conf, area_gdf, cidx, current_job_metrics, current_job_prog, station_attrs, ckpt, ckpt_fp)
                 if z is not None: file_zones.append(z)
         
         queue_placeholder.markdown(render_queue(tasks, len(tasks)))
@@ -285,6 +464,9 @@ if st.button("🚀 Start Smart-Refiner", type="primary"):
             fin.to_file(os.path.join(final_dir, f"Refined_{run_name}.geojson"), driver='GeoJSON')
             st.toast(f"✅ {fname} abgeschlossen!", icon="🎉")
             
+    # Fortsetzen gilt nur für den abgebrochenen Lauf, nicht für den nächsten
+    st.session_state["resume_run"] = False
+    save_config(CONFIG_FILE, {k: st.session_state[k] for k in defaults if k in st.session_state})
     global_status.success("Alle Dateien erfolgreich verarbeitet!")
     current_job_title.empty()
     current_job_metrics.empty()
@@ -11,7 +11,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.geojson_tools import (
     select_files_dialog,
     select_folder_dialog,
-    load_geodataframe_raw
+    load_geodataframes_parallel,
+    stream_merge_files,
+    dissolve_zones,
+    read_field_names
 )
 
 # --- SETUP ---
@@ -73,9 +76,8 @@ if st.session_state["res_input_files"]:
     # 1. ANALYSE (Erste Datei lesen um Spalten zu finden)
     first_file = st.session_state["res_input_files"][0]
     try:
-        # Wir laden nur eine Zeile für die Spalten-Vorschau
-        preview = gpd.read_file(first_file, rows=1)
-        available_cols = [c for c in preview.columns if c != 'geometry']
+        # Nur das Schema lesen (keine Features)
+        available_cols = read_field_names(first_file)
     except Exception as e:
         st.error(f"Konnte Datei nicht lesen: {e}")
         st.stop()
@@ -100,6 +102,7 @@ if st.session_state["res_input_files"]:
         st.subheader("⚙️ Optionen")
         do_dissolve = st.checkbox("Grenzen auflösen (Dissolve)", value=True, help="Entfernt Grenzen zwischen gleichen Zonen (z.B. über Bezirke hinweg).")
         keep_attrs = st.checkbox("Andere Attribute behalten", value=True, help="Wenn aktiv, werden Tags (Adresse, etc.) beibehalten (erster gefundener Wert pro Zone).")
+        streaming = st.checkbox("Streaming-Modus (speicherschonend)", value=False, help="Liest die Dateien einzeln und vereinigt nur Zonen, die in mehreren Dateien vorkommen. Empfohlen für landesweite Merges.")
 
     st.markdown("---")
 
@@ -108,62 +111,70 @@ if st.session_state["res_input_files"]:
         status = st.empty()
         
         try:
-            gdfs = []
             files = st.session_state["res_input_files"]
+            out_p = os.path.join(st.session_state["res_output_folder"], out_filename)
+
+            if streaming:
+                def stream_cb(i, n, msg):
+                    status.text(f"Verarbeite {min(i+1, n)}/{n}: {msg}")
+                    prog.progress(i / n)
+
+                stats = stream_merge_files(files, target_col, out_p, keep_attrs=keep_attrs, do_dissolve=do_dissolve, progress_cb=stream_cb)
+                prog.progress(1.0)
+                status.empty()
+                st.balloons()
+                st.success(f"Erfolgreich gespeichert: `{out_p}` ({stats['features_written']} Features, {stats['shared_names']} dateiübergreifende Zonen)")
+
+                with st.expander("Vorschau Ergebnisse"):
+                    st.dataframe(gpd.read_file(out_p, rows=20, ignore_geometry=True))
+            else:
+                # A. Paralleles Laden (ohne Geometrie-Reparatur)
+                # Ohne "Attribute behalten" wird nur die Quell-Spalte gelesen
+                def load_cb(done, n, name):
+                    status.text(f"Geladen {done}/{n}: {name}")
+                    prog.progress(done / (n * 2))
+
+                gdfs = load_geodataframes_parallel(files, columns=None if keep_attrs else [target_col], progress_cb=load_cb)
+                for tmp in gdfs:
+                    # Check ob Spalte existiert
+                    if target_col not in tmp.columns:
+                        tmp[target_col] = "Unknown"
             
-            # A. Lade Schleife
-            for i, fpath in enumerate(files):
-                status.text(f"Lade {i+1}/{len(files)}: {os.path.basename(fpath)}")
-                
-                # Ohne Geometrie-Reparatur laden
-                tmp = load_geodataframe_raw(fpath)
-                
-                # Check ob Spalte existiert
-                if target_col not in tmp.columns:
-                    tmp[target_col] = "Unknown"
-                
-                gdfs.append(tmp)
-                prog.progress((i+1) / (len(files)*2))
-            
-            # B. Concat
-            status.text("Füge Geometrien zusammen...")
-            full = pd.concat(gdfs, ignore_index=True)
+                # B. Concat
+                status.text("Füge Geometrien zusammen...")
+                full = pd.concat(gdfs, ignore_index=True)
             
-            # C. Remap Name
-            status.text(f"Setze 'name' = '{target_col}'...")
-            full['name'] = full[target_col].fillna("Unknown")
+                # C. Remap Name
+                status.text(f"Setze 'name' = '{target_col}'...")
+                full['name'] = full[target_col].fillna("Unknown")
             
-            # D. Cleanup Columns
-            if not keep_attrs:
-                # Nur Name und Geometrie behalten
-                full = full[['name', 'geometry']]
+                # D. Cleanup Columns
+                if not keep_attrs:
+                    # Nur Name und Geometrie behalten
+                    full = full[['name', 'geometry']]
             
-            # E. Dissolve
-            if do_dissolve:
-                status.text("Löse Grenzen auf (Dissolve)...")
-                # Sicherstellen, dass Geometrie valide ist vor Dissolve
-                full['geometry'] = full.geometry.buffer(0)
-                
-                # Dissolve by 'name'. 
-                # as_index=False sorgt dafür, dass 'name' eine Spalte bleibt.
-                # Andere Spalten werden per 'first' aggregiert (erster Wert wird behalten).
-                final = full.dissolve(by='name', as_index=False)
-            else:
-                final = full
-
-            # F. Save
-            status.text("Speichere...")
-            out_p = os.path.join(st.session_state["res_output_folder"], out_filename)
-            final.to_file(out_p, driver='GeoJSON')
+                # E. Dissolve
+                if do_dissolve:
+                    status.text("Löse Grenzen auf (Dissolve)...")
+                    # Dissolve by 'name' (Coverage-Union wenn möglich, sonst Reparatur + Union).
+                    # as_index=False sorgt dafür, dass 'name' eine Spalte bleibt.
+                    # Andere Spalten werden per 'first' aggregiert (erster Wert wird behalten).
+                    final = dissolve_zones(full, 'name')
+                else:
+                    final = full
+
+                # F. Save
+                status.text("Speichere...")
+                final.to_file(out_p, driver='GeoJSON')
             
-            prog.progress(1.0)
-            status.empty()
-            st.balloons()
-            st.success(f"Erfolgreich gespeichert: `{out_p}`")
+                prog.progress(1.0)
+                status.empty()
+                st.balloons()
+                st.success(f"Erfolgreich gespeichert: `{out_p}`")
             
-            with st.expander("Vorschau Ergebnisse"):
-                # Geometrie nicht anzeigen in Tabelle, dauert zu lange
-                st.dataframe(final.drop(columns='geometry', errors='ignore').head(20))
+                with st.expander("Vorschau Ergebnisse"):
+                    # Geometrie nicht anzeigen in Tabelle, dauert zu lange
+                    st.dataframe(final.drop(columns='geometry', errors='ignore').head(20))
 
         except Exception as e:
             st.error(f"Fehler: {e}")
@@ -9,8 +9,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.geojson_tools import (
     select_file_dialog,
-    load_geodataframe_raw
+    DatasetRef,
+    to_json_value,
+    build_property_update
 )
+from src.geojson_stream import rewrite_properties
 
 # --- SETUP ---
 st.set_page_config(page_title="Geo List Editor V2", layout="wide", page_icon="📜")
@@ -18,15 +21,106 @@ st.title("📜 GeoJSON Tag Editor")
 st.markdown("Bearbeite Attribute (Tags) direkt in einer Tabelle oder verwalte die Spaltenstruktur.")
 
 # --- STATE ---
-if "editor_gdf" not in st.session_state: st.session_state["editor_gdf"] = None
+if "editor_gdf" not in st.session_state: st.session_state["editor_gdf"] = None            # DatasetRef (geteilt bis zur ersten Änderung)
 if "editor_filepath" not in st.session_state: st.session_state["editor_filepath"] = None
 if "editor_unsaved_changes" not in st.session_state: st.session_state["editor_unsaved_changes"] = False
+if "editor_file_sig" not in st.session_state: st.session_state["editor_file_sig"] = None
+if "editor_log" not in st.session_state: st.session_state["editor_log"] = []          # Append-only Änderungsprotokoll
+if "editor_view" not in st.session_state: st.session_state["editor_view"] = None      # Tabelle im Editor (ohne Geometrie)
+if "editor_snapshot" not in st.session_state: st.session_state["editor_snapshot"] = {}  # Letzter Delta-State des Widgets
+if "editor_widget_rev" not in st.session_state: st.session_state["editor_widget_rev"] = 0
 
 # --- HELPER ---
-def save_to_disk(in_place=True):
+GEOJSON_EXTENSIONS = (".geojson", ".json")
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def widget_key():
+    return f"data_editor_widget_{st.session_state['editor_widget_rev']}"
+
+def apply_edit_log(df, log):
+    """Wendet das Protokoll auf df an (in-place, letzter Wert je Zelle gewinnt). Aufwand ~ Anzahl Änderungen."""
+    final = {}
+    for entry in log:
+        final[(entry["row"], entry["col"])] = entry["new"]
+    by_col = {}
+    for (row, col), value in final.items():
+        rows, values = by_col.setdefault(col, ([], []))
+        rows.append(row)
+        values.append(value)
+    for col, (rows, values) in by_col.items():
+        if col not in df.columns:
+            continue
+        j = df.columns.get_loc(col)
+        try:
+            df.iloc[rows, j] = values
+        except (TypeError, ValueError):
+            # z.B. Text in Zahlen-Spalte -> Spalte als object weiterführen
+            df[col] = df[col].astype(object)
+            df.iloc[rows, j] = values
+    return df
+
+def reset_editor_view():
+    """Tabelle = Basis + offenes Protokoll; neuer Widget-Key verwirft den Delta-State des Editors."""
+    view = pd.DataFrame(st.session_state["editor_gdf"].get().drop(columns='geometry'))
+    if st.session_state["editor_log"]:
+        view = apply_edit_log(view, st.session_state["editor_log"])
+    st.session_state["editor_view"] = view
+    st.session_state["editor_snapshot"] = {}
+    st.session_state["editor_widget_rev"] += 1
+
+def commit_edit_log():
+    """Protokoll in das Basis-GDF übernehmen (beim Speichern / vor Struktur-Änderungen)."""
+    if st.session_state["editor_log"]:
+        apply_edit_log(st.session_state["editor_gdf"].edit(), st.session_state["editor_log"])
+        st.session_state["editor_log"] = []
+
+def record_edits():
+    """on_change des Editors: nur geänderte Zellen (edited_rows) gegen den letzten Stand vergleichen."""
+    delta = st.session_state.get(widget_key(), {})
+    edited = {int(r): cells for r, cells in delta.get("edited_rows", {}).items()}
+    snapshot = st.session_state["editor_snapshot"]
+    view = st.session_state["editor_view"]
+    log = st.session_state["editor_log"]
+
+    touched = {(r, c) for r, cells in edited.items() for c in cells}
+    touched |= {(r, c) for r, cells in snapshot.items() for c in cells}
+    for row, col in sorted(touched, key=lambda rc: (rc[0], str(rc[1]))):
+        # Gleich normalisieren (pyogrio-Arrays -> Listen), sonst liefert != ein Array
+        base = to_json_value(view.iat[row, view.columns.get_loc(col)])
+        old = to_json_value(snapshot.get(row, {}).get(col, base))
+        new = to_json_value(edited.get(row, {}).get(col, base))
+        if old != new:
+            log.append({"row": row, "col": col, "old": old, "new": new})
+
+    st.session_state["editor_snapshot"] = {r: dict(cells) for r, cells in edited.items()}
+    if log:
+        st.session_state["editor_unsaved_changes"] = True
+
+def undo_last_edit():
+    if st.session_state["editor_log"]:
+        st.session_state["editor_log"].pop()
+        reset_editor_view()
+
+def discard_edits():
+    st.session_state["editor_log"] = []
+    reset_editor_view()
+
+def can_save_attributes_only():
+    """Nur für GeoJSON, solange die Datei seit dem Laden nicht verändert wurde."""
+    path = st.session_state["editor_filepath"]
+    return (
+        bool(path) and path.lower().endswith(GEOJSON_EXTENSIONS) and os.path.exists(path)
+        and st.session_state["editor_file_sig"] == file_signature(path)
+    )
+
+def save_to_disk(in_place=True, attributes_only=True):
     if st.session_state["editor_gdf"] is not None and st.session_state["editor_filepath"]:
         try:
-            target_path = st.session_state["editor_filepath"]
+            source_path = st.session_state["editor_filepath"]
+            target_path = source_path
 
             if not in_place:
                 base_name = os.path.splitext(os.path.basename(target_path))[0]
@@ -35,8 +129,20 @@ def save_to_disk(in_place=True):
                     f"{base_name}_edited.geojson"
                 )
 
-            st.session_state["editor_gdf"].to_file(target_path, driver='GeoJSON')
+            # Protokoll erst jetzt auf die Basis anwenden
+            commit_edit_log()
+            gdf = st.session_state["editor_gdf"].get()
+            if attributes_only and can_save_attributes_only():
+                # Original streamen, nur properties neu schreiben (Geometrie bleibt Byte für Byte)
+                stats = rewrite_properties(source_path, target_path, build_property_update(gdf))
+                if stats["features_total"] != len(gdf):
+                    st.warning("Feature-Anzahl der Datei passt nicht zur Tabelle – bitte Datei neu laden.")
+            else:
+                gdf.to_file(target_path, driver='GeoJSON')
+            if in_place:
+                st.session_state["editor_file_sig"] = file_signature(target_path)
             st.session_state["editor_unsaved_changes"] = False
+            reset_editor_view()
 
             success_msg = "Original überschrieben" if in_place else f"Als Kopie gespeichert: `{os.path.basename(target_path)}`"
             st.toast(f"✅ Datei erfolgreich gespeichert! ({success_msg})", icon="💾")
@@ -50,9 +156,12 @@ with st.sidebar:
         f = select_file_dialog()
         if f:
             try:
-                st.session_state["editor_gdf"] = load_geodataframe_raw(f)
+                st.session_state["editor_gdf"] = DatasetRef(f)
                 st.session_state["editor_filepath"] = f
+                st.session_state["editor_file_sig"] = file_signature(f)
                 st.session_state["editor_unsaved_changes"] = False
+                st.session_state["editor_log"] = []
+                reset_editor_view()
                 st.rerun()
             except Exception as e:
                 st.error(f"Fehler: {e}")
@@ -75,13 +184,21 @@ with st.sidebar:
             key="editor_save_mode"
         )
 
+        attributes_only = st.checkbox(
+            "Nur Attribute schreiben (Geometrie unverändert)",
+            value=True,
+            disabled=not can_save_attributes_only(),
+            help="Streamt die Original-GeoJSON und ersetzt nur die properties. Schnell, Koordinaten bleiben Byte für Byte erhalten. "
+                 "Nicht verfügbar für andere Formate oder wenn die Datei seit dem Laden verändert wurde.",
+        )
+
         if st.button("Auf Festplatte schreiben", type="primary" if st.session_state["editor_unsaved_changes"] else "secondary"):
-            save_to_disk(in_place="In-Place" in save_mode)
+            save_to_disk(in_place="In-Place" in save_mode, attributes_only=attributes_only)
 
 
 # --- MAIN AREA ---
 if st.session_state["editor_gdf"] is not None:
-    gdf = st.session_state["editor_gdf"]
+    gdf = st.session_state["editor_gdf"].get()
     
     # Tabs für Daten und Struktur
     tab_data, tab_struct = st.tabs(["📝 Daten bearbeiten (Excel-Modus)", "🔧 Spalten verwalten"])
@@ -90,28 +207,28 @@ if st.session_state["editor_gdf"] is not None:
     with tab_data:
         st.info("Du kannst Werte direkt in der Tabelle ändern. Geometrie-Spalten sind ausgeblendet.")
         
-        # Wir trennen Geometrie ab, da DataEditor die nicht gut darstellen kann
-        df_display = pd.DataFrame(gdf.drop(columns='geometry'))
-        
-        # Der Editor
-        edited_df = st.data_editor(
-            df_display,
+        if st.session_state["editor_view"] is None:
+            reset_editor_view()
+
+        # Der Editor (Geometrie ist in der Ansicht nicht enthalten). Änderungen landen über
+        # on_change im Protokoll; die Tabelle selbst wird nicht kopiert oder verglichen.
+        st.data_editor(
+            st.session_state["editor_view"],
             num_rows="fixed", # Keine Zeilen hinzufügen/löschen hier (Geometrie würde fehlen)
             width="stretch",
             height=600,
-            key="data_editor_widget"
+            key=widget_key(),
+            on_change=record_edits
         )
-        
-        # Check auf Änderungen
-        if not df_display.equals(edited_df):
-            # Änderungen erkannt -> GDF updaten
-            # Wir iterieren über die Spalten und updaten das GDF
-            for col in edited_df.columns:
-                gdf[col] = edited_df[col]
-            
-            st.session_state["editor_gdf"] = gdf
-            st.session_state["editor_unsaved_changes"] = True
-            st.rerun() # Refresh um Warnung in Sidebar anzuzeigen
+
+        log = st.session_state["editor_log"]
+        c_undo, c_discard, c_info = st.columns([1, 1, 3])
+        c_undo.button("↩️ Rückgängig", on_click=undo_last_edit, disabled=not log)
+        c_discard.button("Alle Änderungen verwerfen", on_click=discard_edits, disabled=not log)
+        c_info.caption(f"{len(log)} Zellen-Änderung(en) seit dem letzten Speichern.")
+        if log:
+            with st.expander(f"Änderungsprotokoll ({len(log)})"):
+                st.dataframe(pd.DataFrame(log[-100:]).astype(str), hide_index=True, width="stretch")
 
 
     # === TAB 2: STRUKTUR (Spalten) ===
@@ -128,7 +245,9 @@ if st.session_state["editor_gdf"] is not None:
             default_val = st.text_input("Standardwert (optional)")
             if st.button("Hinzufügen"):
                 if new_col_name and new_col_name not in gdf.columns:
-                    st.session_state["editor_gdf"][new_col_name] = default_val if default_val else None
+                    commit_edit_log()
+                    st.session_state["editor_gdf"].edit()[new_col_name] = default_val if default_val else None
+                    reset_editor_view()
                     st.session_state["editor_unsaved_changes"] = True
                     st.success(f"Tag '{new_col_name}' hinzugefügt.")
                     st.rerun()
@@ -142,7 +261,10 @@ if st.session_state["editor_gdf"] is not None:
             rename_new = st.text_input("Neuer Name", value=rename_target)
             if st.button("Umbenennen"):
                 if rename_new and rename_new not in gdf.columns:
-                    st.session_state["editor_gdf"] = st.session_state["editor_gdf"].rename(columns={rename_target: rename_new})
+                    commit_edit_log()
+                    ref = st.session_state["editor_gdf"]
+                    ref.replace(ref.get().rename(columns={rename_target: rename_new}))
+                    reset_editor_view()
                     st.session_state["editor_unsaved_changes"] = True
                     st.success(f"Umbenannt in '{rename_new}'.")
                     st.rerun()
@@ -154,7 +276,10 @@ if st.session_state["editor_gdf"] is not None:
             st.write("**Tag löschen**")
             del_target = st.selectbox("Tag wählen", cols, key="sel_del")
             if st.button("🗑️ Löschen", type="secondary"):
-                st.session_state["editor_gdf"] = st.session_state["editor_gdf"].drop(columns=[del_target])
+                commit_edit_log()
+                ref = st.session_state["editor_gdf"]
+                ref.replace(ref.get().drop(columns=[del_target]))
+                reset_editor_view()
                 st.session_state["editor_unsaved_changes"] = True
                 st.warning(f"Tag '{del_target}' gelöscht.")
                 st.rerun()
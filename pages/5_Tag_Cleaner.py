@@ -9,7 +9,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.geojson_tools import (
     select_file_dialog,
-    load_geodataframe_raw
+    DatasetRef,
+    profile_columns
 )
 
 # --- SETUP ---
@@ -26,33 +27,20 @@ if "cleaner_stats" not in st.session_state: st.session_state["cleaner_stats"] =
 def analyze_tags(gdf):
     """Erstellt eine Statistik über alle Spalten (Tags)"""
     total_rows = len(gdf)
-    stats = []
-    
-    # Geometrie ignorieren wir bei Tags
-    cols = [c for c in gdf.columns if c != 'geometry']
-    
-    for col in cols:
-        # Zähle nicht-null Werte
-        count = gdf[col].count()
-        percent = (count / total_rows) * 100
-        
-        # Beispielwert finden (erster nicht-null)
-        try:
-            sample = gdf[col].dropna().iloc[0] if count > 0 else ""
-        except:
-            sample = ""
-            
-        sample_str = str(sample)
-        if len(sample_str) > 50: sample_str = sample_str[:47] + "..."
-        
-        stats.append({
-            "Tag": col,
-            "Count": count,
-            "Percent": round(percent, 1),
-            "Sample": sample_str
-        })
-        
-    return pd.DataFrame(stats).sort_values(by="Count", ascending=False)
+    # Geteiltes Spaltenprofil; Anzahl und Beispiel sind immer exakt
+    profile = profile_columns(gdf)
+
+    def shorten(sample):
+        sample_str = "" if sample is None else str(sample)
+        return sample_str[:47] + "..." if len(sample_str) > 50 else sample_str
+
+    stats = pd.DataFrame({
+        "Tag": profile.index,
+        "Count": profile["non_null"].astype(int).values,
+        "Percent": (profile["non_null"].astype(float) / max(total_rows, 1) * 100).round(1).values,
+        "Sample": [shorten(v) for v in profile["example"]],
+    })
+    return stats.sort_values(by="Count", ascending=False)
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -62,9 +50,9 @@ with st.sidebar:
         if f:
             try:
                 st.session_state["cleaner_filepath"] = f
-                gdf = load_geodataframe_raw(f)
-                st.session_state["cleaner_gdf"] = gdf
-                st.session_state["cleaner_stats"] = analyze_tags(gdf)
+                ref = DatasetRef(f)
+                st.session_state["cleaner_gdf"] = ref
+                st.session_state["cleaner_stats"] = analyze_tags(ref.get())
                 st.rerun()
             except Exception as e:
                 st.error(f"Fehler beim Laden: {e}")
@@ -76,7 +64,7 @@ with st.sidebar:
 
 # --- MAIN AREA ---
 if st.session_state["cleaner_gdf"] is not None:
-    gdf = st.session_state["cleaner_gdf"]
+    gdf = st.session_state["cleaner_gdf"].get()
     stats_df = st.session_state["cleaner_stats"]
     
     st.divider()
@@ -8,7 +8,9 @@ import os
 
 # Pfad-Fix für Importe aus src
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.geojson_tools import process_coloring, load_geodataframe_raw, select_file_dialog
+from src.geojson_tools import (
+    process_coloring, load_geodataframe_raw, select_file_dialog, zone_adjacency_from_hexes, DatasetRef
+)
 
 st.set_page_config(page_title="Zonen Färbung", page_icon="🎨", layout="wide")
 
@@ -18,6 +20,7 @@ st.markdown("Färbt Zonen so ein, dass keine Nachbarn die gleiche Farbe haben.")
 # --- STATE ---
 if "color_gdf" not in st.session_state: st.session_state["color_gdf"] = None
 if "color_filename" not in st.session_state: st.session_state["color_filename"] = ""
+if "color_adjacency" not in st.session_state: st.session_state["color_adjacency"] = None
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -26,7 +29,7 @@ with st.sidebar:
         f = select_file_dialog("Zonen Datei wählen")
         if f:
             try:
-                st.session_state["color_gdf"] = load_geodataframe_raw(f)
+                st.session_state["color_gdf"] = DatasetRef(f)
                 st.session_state["color_filename"] = os.path.basename(f)
                 st.rerun()
             except Exception as e:
@@ -35,9 +38,41 @@ with st.sidebar:
     if st.session_state["color_filename"]:
         st.success(f"Geladen: {st.session_state['color_filename']}")
 
+    st.header("Bestehende Farben")
+    prev_file = st.file_uploader(
+        "Vorheriges color_mapping.json (optional)", type=["json"],
+        help="Zonen behalten ihre bisherige Farbe, solange kein Nachbar dieselbe hat. Nur geänderte Zonen werden neu gefärbt."
+    )
+    existing_colors = None
+    if prev_file is not None:
+        try:
+            existing_colors = json.load(prev_file)
+            st.caption(f"{len(existing_colors)} Farben aus Mapping übernommen.")
+        except Exception as e:
+            st.error(f"Mapping ungültig: {e}")
+
+    st.header("Nachbarschaft aus Hex-Gitter")
+    st.caption("Optional: Zonen-Nachbarschaft aus einer Kandidaten-/Refiner-Hexdatei (Spalte 'zone_label') statt aus der Polygon-Topologie.")
+    if st.button("📂 Hex-Datei laden"):
+        f = select_file_dialog("Hex-Gitter wählen")
+        if f:
+            try:
+                hexes = load_geodataframe_raw(f, cache=False, columns=["zone_label"], use_arrow=True)
+                st.session_state["color_adjacency"] = zone_adjacency_from_hexes(hexes, "zone_label")
+            except Exception as e:
+                st.error(f"Fehler: {e}")
+    adjacency = st.session_state["color_adjacency"]
+    if adjacency is not None:
+        st.success(f"{len(adjacency)} Zonenpaare")
+        st.download_button(
+            "💾 Nachbarschaft (CSV)", adjacency.to_csv(index=False), "zone_adjacency.csv", "text/csv"
+        )
+        if not st.checkbox("Hex-Nachbarschaft verwenden", value=True):
+            adjacency = None
+
 # --- MAIN ---
 if st.session_state["color_gdf"] is not None:
-    gdf = st.session_state["color_gdf"]
+    gdf = st.session_state["color_gdf"].get()
     
     # Spaltenauswahl (ohne Geometrie)
     cols = [c for c in gdf.columns if c != "geometry"]
@@ -53,18 +88,26 @@ if st.session_state["color_gdf"] is not None:
     
     with c2:
         st.info(f"Anzahl Features: {len(gdf)}")
+        min_len = st.number_input(
+            "Mindest-Grenzlänge (m)", min_value=0.0, value=0.0, step=10.0,
+            help="Zonen, die sich nur an einem Eckpunkt oder auf kürzerer Strecke berühren, gelten nicht als Nachbarn."
+        )
 
     if st.button("🎨 Farben berechnen", type="primary"):
         with st.spinner("Berechne Topologie..."):
             try:
-                colored_gdf, mapping, stats = process_coloring(gdf, target_col)
+                colored_gdf, mapping, stats = process_coloring(
+                    gdf, target_col, existing_colors=existing_colors,
+                    min_shared_length=min_len, adjacency=adjacency
+                )
                 
                 st.divider()
                 # Metriken
-                m1, m2, m3 = st.columns(3)
+                m1, m2, m3, m4 = st.columns(4)
                 m1.metric("Benötigte Farben", stats["num_colors"])
                 m2.metric("Inseln", len(stats["isolates"]))
                 m3.metric("Features", stats["num_features"])
+                m4.metric("Farbe beibehalten", stats["kept"], delta=f"{stats['recolored']} neu gefärbt", delta_color="off")
 
                 # Plot
                 fig, ax = plt.subplots(figsize=(10, 8))
@@ -5,6 +5,7 @@ import os
 import sys
 import re
 import json
+import hashlib
 
 # --- IMPORT SHARED TOOLS ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -13,7 +14,10 @@ from src.geojson_tools import (
     load_config,
     select_file_dialog,
     select_folder_dialog,
-    load_geodataframe_raw
+    DatasetRef,
+    load_geodataframe_shared,
+    assign_by_polygons,
+    split_to_files
 )
 
 # --- SETUP ---
@@ -27,8 +31,11 @@ STATE_CONFIG_FILE = "bundesland_config.json"
 # --- STATE ---
 if "split_gdf" not in st.session_state: st.session_state["split_gdf"] = None
 if "split_filename" not in st.session_state: st.session_state["split_filename"] = ""
+if "split_path" not in st.session_state: st.session_state["split_path"] = None
 if "split_mapping_df" not in st.session_state: st.session_state["split_mapping_df"] = None
 if "municipality_lookup" not in st.session_state: st.session_state["municipality_lookup"] = {} 
+if "municipality_index" not in st.session_state: st.session_state["municipality_index"] = None
+if "bezirk_path" not in st.session_state: st.session_state["bezirk_path"] = None
 
 # --- HELPER ---
 def load_configs():
@@ -45,113 +52,157 @@ def load_municipality_csv(filepath):
         st.error(f"Fehler beim Laden der CSV: {e}")
         return {}
 
-def find_district_code(row):
-    """Sucht 4-stellige Zahl."""
-    text = ""
-    if 'name' in row and pd.notna(row['name']): text += str(row['name']) + " "
-    if 'alt_name' in row and pd.notna(row['alt_name']): text += str(row['alt_name'])
-    
-    match = re.search(r'\b(\d{4})\b', text)
-    if match:
-        full_code = match.group(1)
-        return full_code[:2], full_code 
-    return None, None
-
-def clean_zone_name(raw_name):
-    """Entfernt typische Rotes Kreuz Präfixe für besseres Matching."""
-    if not raw_name or not isinstance(raw_name, str):
-        return ""
-    
-    # WICHTIG: Längere Phrasen zuerst, damit sie komplett entfernt werden
-    noise_words = [
-        "Rotes Kreuz Bezirksstelle", "Rotes Kreuz Ortsstelle", "Rotes Kreuz Dienststelle",
-        "Rotkreuz-Bezirksstelle", "Rotkreuz-Ortsstelle", "Rotkreuz-Dienststelle",
-        "Rotes Kreuz", "Rotkreuz", "ÖRK", "RK", 
-        "Bezirksstelle", "Ortsstelle", "Dienststelle", 
-        "Ausgabestelle", "Stützpunkt"
-    ]
-    
-    cleaned = raw_name
-    for word in noise_words:
-        # Ersetze Wort (ignoriere Groß/Kleinschreibung) durch nichts
-        pattern = re.compile(re.escape(word), re.IGNORECASE)
-        cleaned = pattern.sub("", cleaned)
-    
-    # Sonderzeichen wie Bindestriche/Slashes entfernen oder durch Leerzeichen ersetzen
-    cleaned = cleaned.replace("-", " ").replace("_", " ").replace("/", " ")
-    
-    # Doppelte Leerzeichen entfernen und trimmen
-    return re.sub(r'\s+', ' ', cleaned).strip()
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    """Wörter in Kleinschreibung (entspricht \\b-Grenzen bei re.IGNORECASE)."""
+    return tuple(TOKEN_RE.findall(text.casefold()))
+
+def build_municipality_index(muni_lookup):
+    """
+    Index für die "Enthält"-Suche, einmalig beim CSV-Laden gebaut:
+    erstes Wort -> [(Wörter, Name, Bundesland)], längste Namen zuerst.
+    """
+    index = {}
+    for muni_name, bundesland in muni_lookup.items():
+        tokens = tokenize(muni_name)
+        if tokens:
+            index.setdefault(tokens[0], []).append((tokens, muni_name, bundesland))
+    for candidates in index.values():
+        candidates.sort(key=lambda c: (-len(c[0]), -len(c[1]), c[1]))
+    return index
+
+def find_municipality(clean_name, muni_index):
+    """Längster Gemeindename (als ganze Wörter) im Zonennamen; bei Gleichstand der vorderste."""
+    tokens = tokenize(clean_name)
+    best = None
+    for pos, token in enumerate(tokens):
+        for cand_tokens, muni_name, bundesland in muni_index.get(token, ()):
+            if tokens[pos:pos + len(cand_tokens)] == cand_tokens:
+                key = (len(cand_tokens), len(muni_name))
+                if best is None or key > best[0]:
+                    best = (key, bundesland)
+                break  # Kandidaten sind nach Länge sortiert
+    return best[1] if best else None
+
+# WICHTIG: Längere Phrasen zuerst, damit sie komplett entfernt werden
+NOISE_WORDS = [
+    "Rotes Kreuz Bezirksstelle", "Rotes Kreuz Ortsstelle", "Rotes Kreuz Dienststelle",
+    "Rotkreuz-Bezirksstelle", "Rotkreuz-Ortsstelle", "Rotkreuz-Dienststelle",
+    "Rotes Kreuz", "Rotkreuz", "ÖRK", "RK", 
+    "Bezirksstelle", "Ortsstelle", "Dienststelle", 
+    "Ausgabestelle", "Stützpunkt"
+]
+NOISE_RE = re.compile("|".join(re.escape(w) for w in NOISE_WORDS), re.IGNORECASE)
+DISTRICT_CODE_RE = r'\b(\d{4})\b'
+
+def content_hash(obj):
+    """Stabiler Hash für Konfigurationen/Lookups (Cache-Key)."""
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def file_signature(path):
+    """Pfad + Änderungszeit + Größe (Cache-Key für die geladene Datei)."""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
 
-def auto_assign_leitstelle(row, code_conf, state_conf, muni_lookup):
+def invert_code_config(code_conf):
+    """Bezirks-Code -> Leitstelle (bei Mehrfachnennung gewinnt die erste Leitstelle)."""
+    code_to_ls = {}
+    for ls_name, codes in code_conf.items():
+        for code in codes:
+            code_to_ls.setdefault(str(code), ls_name)
+    return code_to_ls
+
+def text_column(gdf, col):
+    if col not in gdf.columns:
+        return pd.Series("", index=gdf.index, dtype=object)
+    values = gdf[col]
+    return values.astype(str).where(values.notna(), "")
+
+def clean_zone_names(names):
+    """Entfernt typische Rotes Kreuz Präfixe für besseres Matching (vektorisiert)."""
+    cleaned = names.str.replace(NOISE_RE, "", regex=True)
+    # Sonderzeichen wie Bindestriche/Slashes durch Leerzeichen ersetzen, Leerzeichen zusammenfassen
+    cleaned = cleaned.str.replace(r"[-_/]", " ", regex=True)
+    return cleaned.str.replace(r"\s+", " ", regex=True).str.strip()
+
+def prepare_data(gdf, code_conf, state_conf, muni_lookup, muni_index, spatial_codes=None):
     """
     Logik:
+    0. Optional: Bezirks-Code aus räumlicher Zuordnung (spatial_codes) -> Priorität 0
     1. Suche Funkkennung (Bezirks-Code) -> Priorität A
     2. Suche Name in CSV (mit Bereinigung) -> Priorität B
     """
-    
-    # 1. Funkkennung Check
-    bezirk, full_code = find_district_code(row)
-    
-    if bezirk:
-        for ls_name, codes in code_conf.items():
-            if bezirk in codes:
-                return ls_name, f"Code ({full_code})", bezirk
-    
-    # 2. Namens-Check (Fallback)
-    # Hole Roh-Namen
-    raw_name = str(row['name']) if 'name' in row and pd.notna(row['name']) else ""
-    
-    # A) Versuch: Bereinigter Name (z.B. "Ortsstelle Bad Ischl" -> "Bad Ischl")
-    clean_name = clean_zone_name(raw_name)
-    
-    match_bundesland = None
-    
-    # Direkter Treffer im Lookup?
-    if clean_name in muni_lookup:
-        match_bundesland = muni_lookup[clean_name]
-    else:
-        # B) Versuch: "Enthält"-Suche (Ist eine bekannte Gemeinde Teil des Namens?)
-        if muni_lookup:
-            for muni_name, bundesland in muni_lookup.items():
-                # Prüfen ob Gemeinde im bereinigten Namen steckt (als ganzes Wort)
-                if re.search(r'\b' + re.escape(muni_name) + r'\b', clean_name, re.IGNORECASE):
-                    match_bundesland = bundesland
-                    break 
-
-    if match_bundesland:
-        if match_bundesland in state_conf:
-            return state_conf[match_bundesland], f"Ort ({clean_name})", "-"
-            
-    return None, None, (bezirk if bezirk else "-")
-
-def prepare_data(gdf, code_conf, state_conf, muni_lookup):
-    assigned_rows = []
-    unassigned_rows = []
-    
     all_ls = set(code_conf.keys()) | set(state_conf.values())
     ls_cols = sorted(list(all_ls))
-    
-    for idx, row in gdf.iterrows():
-        ls_match, method, bezirk_display = auto_assign_leitstelle(row, code_conf, state_conf, muni_lookup)
-        
-        name_val = row['name'] if 'name' in row and pd.notna(row['name']) else f"Feature {idx}"
-        
-        base_data = {
-            "orig_index": idx,
-            "Name": name_val,
-            "Info": method if method else "-", 
-            "Bezirk": bezirk_display
-        }
-        
-        if ls_match:
-            base_data["Zuweisung"] = ls_match
-            assigned_rows.append(base_data)
-        else:
-            for ls in ls_cols: base_data[ls] = False
-            unassigned_rows.append(base_data)
-            
-    return pd.DataFrame(assigned_rows), pd.DataFrame(unassigned_rows), ls_cols
+    code_to_ls = invert_code_config(code_conf)
+
+    names = text_column(gdf, "name")
+    has_name = gdf["name"].notna() if "name" in gdf.columns else pd.Series(False, index=gdf.index)
+
+    # 1. Funkkennung: erste 4-stellige Zahl in name + alt_name
+    text = names.where(~has_name, names + " ") + text_column(gdf, "alt_name")
+    full_code = text.str.extract(DISTRICT_CODE_RE, expand=False)
+    bezirk = full_code.str[:2]
+    ls_match = bezirk.map(code_to_ls)
+    info = ("Code (" + full_code + ")").where(ls_match.notna())
+    bezirk_display = bezirk.fillna("-")
+
+    # 0. Räumliche Zuordnung hat Vorrang vor Code und Name
+    if spatial_codes is not None:
+        geo_code = spatial_codes.reindex(gdf.index).astype(object)
+        geo_code = geo_code.where(geo_code.isna(), geo_code.astype(str).str.strip())
+        geo_ls = geo_code.map(code_to_ls)
+        geo_hit = geo_ls.notna()
+        ls_match = geo_ls.where(geo_hit, ls_match)
+        info = ("Geo (" + geo_code + ")").where(geo_hit, info)
+        bezirk_display = geo_code.where(geo_hit, bezirk_display)
+
+    # 2. Namens-Check (Fallback), nur für eindeutige Namen ohne Code-Treffer
+    clean = clean_zone_names(names[ls_match.isna()])
+    unique_clean = pd.Series(clean.unique(), dtype=object)
+    bundesland = unique_clean.map(muni_lookup).astype(object)
+    if muni_index:
+        missing = bundesland.isna()
+        bundesland[missing] = [find_municipality(n, muni_index) for n in unique_clean[missing]]
+    ls_by_name = dict(zip(unique_clean, bundesland.map(state_conf)))
+    name_ls = clean.map(ls_by_name).reindex(gdf.index)
+    clean = clean.reindex(gdf.index)
+
+    hit = ls_match.isna() & name_ls.notna()
+    ls_match = ls_match.where(~hit, name_ls)
+    info = info.where(~hit, "Ort (" + clean + ")")
+    bezirk_display = bezirk_display.where(~hit, "-")
+
+    display_names = pd.Series([f"Feature {i}" for i in gdf.index], index=gdf.index, dtype=object)
+    if "name" in gdf.columns:
+        display_names = gdf["name"].where(has_name, display_names)
+
+    frame = pd.DataFrame({
+        "orig_index": gdf.index,
+        "Name": display_names.values,
+        "Info": info.fillna("-").values,
+        "Bezirk": bezirk_display.values,
+    })
+    assigned = ls_match.notna().values
+
+    ass_df = frame[assigned].assign(Zuweisung=ls_match[assigned].values).reset_index(drop=True)
+    unass_df = frame[~assigned].reset_index(drop=True)
+    for ls in ls_cols:
+        unass_df[ls] = False
+    return ass_df, unass_df, ls_cols
+
+@st.cache_data(max_entries=8, show_spinner="Zonen werden zugeordnet ...")
+def prepare_data_cached(file_key, config_hash, csv_hash, spatial_key, _gdf, _code_conf, _state_conf, _muni_lookup, _muni_index, _bezirk_gdf=None):
+    """
+    Memoisiert auf (Datei, Config-Hash, CSV-Hash, Bezirks-Layer) – Eingaben im Editor lösen keine Neuberechnung aus.
+    spatial_key = (Datei-Signatur, Code-Spalte, Methode) oder None.
+    """
+    spatial_codes = None
+    if spatial_key is not None and _bezirk_gdf is not None:
+        _, code_col, method = spatial_key
+        spatial_codes = assign_by_polygons(_gdf, _bezirk_gdf, code_col, method=method)
+    return prepare_data(_gdf, _code_conf, _state_conf, _muni_lookup, _muni_index, spatial_codes)
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -161,8 +212,9 @@ with st.sidebar:
     if st.button("📂 GeoJSON laden", type="primary"):
         f = select_file_dialog()
         if f:
-            st.session_state["split_gdf"] = load_geodataframe_raw(f)
+            st.session_state["split_gdf"] = DatasetRef(f)
             st.session_state["split_filename"] = os.path.basename(f)
+            st.session_state["split_path"] = f
             st.rerun()
 
     if st.session_state["split_gdf"] is not None:
@@ -176,6 +228,8 @@ with st.sidebar:
         csv_path = select_file_dialog("Gemeinde CSV wählen", [("CSV", "*.csv"), ("Text", "*.txt")])
         if csv_path:
             st.session_state["municipality_lookup"] = load_municipality_csv(csv_path)
+            st.session_state["municipality_index"] = build_municipality_index(st.session_state["municipality_lookup"])
+            st.session_state["municipality_hash"] = content_hash(st.session_state["municipality_lookup"])
             st.success("CSV geladen!")
             st.rerun()
 
@@ -184,6 +238,33 @@ with st.sidebar:
     else:
         st.warning("Keine CSV geladen. Namenserkennung eingeschränkt.")
 
+    st.markdown("---")
+
+    # C) Bezirks-Polygone (optional)
+    st.write("**Räumliche Zuordnung (Bezirke)**")
+    if st.button("📂 Bezirks-Layer laden"):
+        bezirk_path = select_file_dialog("Bezirks-Polygone wählen")
+        if bezirk_path:
+            st.session_state["bezirk_path"] = bezirk_path
+            st.rerun()
+
+    bezirk_gdf = None
+    spatial_key = None
+    if st.session_state["bezirk_path"]:
+        bezirk_gdf = load_geodataframe_shared(st.session_state["bezirk_path"])
+        st.caption(f"Bezirke: `{os.path.basename(st.session_state['bezirk_path'])}` ({len(bezirk_gdf)} Polygone)")
+        attr_cols = [c for c in bezirk_gdf.columns if c != bezirk_gdf.geometry.name]
+        use_spatial = st.checkbox("Räumlich zuordnen", value=True,
+                                  help="Hat Vorrang vor Funkkennung und Name; diese bleiben Fallback für den Rest.")
+        code_col = st.selectbox("Code-Spalte (Codes wie in der Leitstellen-Config)", attr_cols)
+        method_label = st.radio("Methode", ["Repräsentativer Punkt", "Größte Überlappung"], horizontal=True)
+        if use_spatial and code_col:
+            method = "point" if method_label == "Repräsentativer Punkt" else "overlap"
+            spatial_key = (file_signature(st.session_state["bezirk_path"]), code_col, method)
+        if st.button("Bezirks-Layer entfernen"):
+            st.session_state["bezirk_path"] = None
+            st.rerun()
+
     st.markdown("---")
     st.header("2. Output")
     if "split_out_dir" not in st.session_state: st.session_state["split_out_dir"] = os.getcwd()
@@ -198,18 +279,40 @@ with st.sidebar:
 
 # --- MAIN AREA ---
 if st.session_state["split_gdf"] is not None:
+    split_gdf = st.session_state["split_gdf"].get()  # geteilt, read-only
     
     code_conf, state_conf = load_configs()
     muni_lookup = st.session_state.get("municipality_lookup", {})
+    if muni_lookup and st.session_state["municipality_index"] is None:
+        st.session_state["municipality_index"] = build_municipality_index(muni_lookup)
+    muni_index = st.session_state["municipality_index"] or {}
+    if "municipality_hash" not in st.session_state:
+        st.session_state["municipality_hash"] = content_hash(muni_lookup)
     
     if not code_conf and not state_conf:
         st.error("Keine Konfiguration gefunden! Bitte Seite 7 nutzen.")
     else:
-        ass_df, unass_df, ls_cols = prepare_data(st.session_state["split_gdf"], code_conf, state_conf, muni_lookup)
+        split_path = st.session_state["split_path"]
+        file_key = file_signature(split_path) if split_path and os.path.exists(split_path) else id(split_gdf)
+        config_hash = content_hash([code_conf, state_conf])
+        try:
+            ass_df, unass_df, ls_cols = prepare_data_cached(
+                file_key, config_hash, st.session_state["municipality_hash"], spatial_key,
+                split_gdf, code_conf, state_conf, muni_lookup, muni_index, bezirk_gdf
+            )
+        except Exception as e:
+            if spatial_key is None:
+                raise
+            # Räumliche Zuordnung fehlgeschlagen -> ohne Bezirks-Layer weiterarbeiten
+            st.error(f"Räumliche Zuordnung fehlgeschlagen: {e}")
+            ass_df, unass_df, ls_cols = prepare_data_cached(
+                file_key, config_hash, st.session_state["municipality_hash"], None,
+                split_gdf, code_conf, state_conf, muni_lookup, muni_index, None
+            )
         
         # 1. Info Metriken
         c1, c2, c3 = st.columns(3)
-        c1.metric("Gesamt Zonen", len(st.session_state["split_gdf"]))
+        c1.metric("Gesamt Zonen", len(split_gdf))
         c2.metric("Automatisch zugeordnet", len(ass_df))
         c3.metric("Offen / Manuell", len(unass_df), delta_color="inverse")
         
@@ -231,13 +334,13 @@ if st.session_state["split_gdf"] is not None:
             for ls in ls_cols:
                 col_config[ls] = st.column_config.CheckboxColumn(ls, default=False)
 
-        edited_unass_df = st.data_editor(
-            unass_df,
-            column_config=col_config,
-            hide_index=True,
-            width="stretch",
-            height=500
-        )
+            edited_unass_df = st.data_editor(
+                unass_df,
+                column_config=col_config,
+                hide_index=True,
+                width="stretch",
+                height=500
+            )
         else:
             st.success("🎉 Alles erledigt! Keine offenen Zonen.")
 
@@ -252,7 +355,7 @@ if st.session_state["split_gdf"] is not None:
         with col_r:
             if st.button("Dateien splitten & speichern", type="primary"):
                 try:
-                    gdf_source = st.session_state["split_gdf"]
+                    gdf_source = split_gdf
                     out_dir = st.session_state["split_out_dir"]
                     
                     final_mapping = []
@@ -277,25 +380,20 @@ if st.session_state["split_gdf"] is not None:
                     if map_df.empty:
                         st.warning("Nichts zu exportieren.")
                     else:
-                        files_created = []
-                        groups = map_df.groupby("Zuweisung")
-                        
-                        bar = st.progress(0); current_i = 0; total_g = len(groups)
-                        
-                        for ls_name, group_data in groups:
-                            current_i += 1
-                            bar.progress(current_i / total_g)
-                            
-                            indices = group_data["orig_index"].tolist()
-                            sub_gdf = gdf_source.iloc[indices].copy()
-                            
+                        # Zuweisung je Zeile der Quelldatei (orig_index = Index-Label)
+                        keys = map_df.set_index("orig_index")["Zuweisung"].reindex(gdf_source.index)
+                        bar = st.progress(0)
+
+                        def path_for(ls_name):
                             safe_name = "".join([c for c in ls_name if c.isalnum() or c in (' ', '_', '-')]).strip().replace(" ", "_")
-                            filename = f"Export_{safe_name}.geojson"
-                            
-                            out_path = os.path.join(out_dir, filename)
-                            sub_gdf.to_file(out_path, driver='GeoJSON')
-                            files_created.append(f"{filename} ({len(sub_gdf)} Zonen)")
-                        
+                            return os.path.join(out_dir, f"Export_{safe_name}.geojson")
+
+                        results = split_to_files(
+                            gdf_source, keys.to_numpy(), path_for,
+                            progress_cb=lambda done, total, _: bar.progress(done / total)
+                        )
+                        files_created = [f"{os.path.basename(r['path'])} ({r['features']} Zonen)" for r in results]
+
                         bar.progress(1.0)
                         st.balloons()
                         st.success("Export abgeschlossen!")
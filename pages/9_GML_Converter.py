@@ -77,12 +77,19 @@ if st.session_state["gml_input_path"]:
             
             target_path = os.path.join(st.session_state["gml_output_dir"], out_filename)
             
+            progress = st.progress(0.0, text="Analysiere Layer...")
+
+            def on_layer(done, total, layer):
+                progress.progress(done / total, text=f"Layer {done}/{total}: {layer}")
+
             with st.spinner("Analysiere Geometrie und konvertiere..."):
                 success, msg = convert_gml_to_geojson(
                     st.session_state["gml_input_path"], 
                     target_path,
-                    swap_mode=mode_map[swap_option]
+                    swap_mode=mode_map[swap_option],
+                    progress_cb=on_layer
                 )
+            progress.empty()
                 
             if success:
                 st.balloons()
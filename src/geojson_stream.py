@@ -0,0 +1,310 @@
+"""
+Streaming-IO für GeoJSON FeatureCollections.
+
+Liest Features inkrementell von der Platte (ohne die ganze Datei zu laden) und
+schreibt FeatureCollections Feature für Feature mit kompakten Separatoren.
+Wird von den dict-basierten Tools (Linien-Bereiniger, ID-Fixer, ...) genutzt.
+"""
+import io
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import orjson  # optional, deutlich schneller als json
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+_DECODER = json.JSONDecoder()
+_WS = re.compile(r"[ \t\n\r]*")
+
+
+def dumps(obj: Any) -> bytes:
+    """Kompaktes JSON (UTF-8). orjson falls verfügbar, sonst json mit kompakten Separatoren."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass  # z.B. Integer > 64 Bit oder Nicht-String-Keys
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _Buffer:
+    """Text-Puffer über einer Datei; Lesegröße wächst mit dem Puffer (amortisiert linear)."""
+
+    def __init__(self, fh, chunk_size: int):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self) -> bool:
+        if self.eof:
+            return False
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        chunk = self.fh.read(max(self.chunk_size, len(self.text)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.text += chunk
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"Ungültiges GeoJSON: '{chars}' erwartet, gefunden '{c or 'EOF'}'")
+        self.pos += 1
+        return c
+
+    def value(self) -> Tuple[Any, str]:
+        """Nächster vollständiger JSON-Wert als (Objekt, Rohtext)."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.more():
+                    continue
+                raise
+            # Zahl am Pufferende könnte abgeschnitten sein -> nachladen und erneut lesen
+            if end == len(self.text) and self.more():
+                continue
+            raw = self.text[self.pos:end]
+            self.pos = end
+            return obj, raw
+
+
+class FeatureCollectionReader:
+    """
+    Inkrementeller Leser für FeatureCollections (Pfad, Text- oder Binär-Dateiobjekt).
+    Iteration liefert Feature-Dicts; iter_raw() zusätzlich den unveränderten Quelltext.
+    Alle übrigen Top-Level-Einträge (name, crs, ...) landen in `members`.
+    """
+
+    def __init__(self, source, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.members: Dict[str, Any] = {}
+        self.features_read = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for feature, _ in self.iter_raw():
+            yield feature
+
+    def iter_raw(self) -> Iterator[Tuple[Dict[str, Any], str]]:
+        if isinstance(self.source, (str, os.PathLike)):
+            with open(self.source, "r", encoding="utf-8-sig", newline="") as fh:
+                yield from self._parse(fh)
+        elif isinstance(self.source, io.TextIOBase):
+            yield from self._parse(self.source)
+        else:
+            # Binär (z.B. Streamlit UploadedFile): Wrapper danach lösen, sonst schließt er die Quelle
+            fh = io.TextIOWrapper(self.source, encoding="utf-8-sig", newline="")
+            try:
+                yield from self._parse(fh)
+            finally:
+                fh.detach()
+
+    def _parse(self, fh) -> Iterator[Tuple[Dict[str, Any], str]]:
+        self.members = {}
+        self.features_read = 0
+        has_features = False
+        buf = _Buffer(fh, self.chunk_size)
+
+        buf.expect("{")
+        if buf.peek() == "}":
+            buf.pos += 1
+        else:
+            while True:
+                key, _ = buf.value()
+                buf.expect(":")
+                if key == "features":
+                    if self.members.get("type", "FeatureCollection") != "FeatureCollection":
+                        break
+                    has_features = True
+                    buf.expect("[")
+                    if buf.peek() == "]":
+                        buf.pos += 1
+                    else:
+                        while True:
+                            feature, raw = buf.value()
+                            self.features_read += 1
+                            yield feature, raw
+                            if buf.expect(",]") == "]":
+                                break
+                else:
+                    self.members[key], _ = buf.value()
+                if buf.expect(",}") == "}":
+                    break
+
+        if not has_features or self.members.get("type") != "FeatureCollection":
+            raise ValueError("Datei muss eine GeoJSON FeatureCollection enthalten.")
+
+
+def iter_features(source, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Kurzform: Features einer FeatureCollection nacheinander."""
+    return iter(FeatureCollectionReader(source, chunk_size))
+
+
+class FeatureCollectionWriter:
+    """
+    Schreibt eine FeatureCollection Feature für Feature.
+    Bei einem Pfad wird in eine temporäre Datei geschrieben und erst bei close() ersetzt
+    (sicher auch beim Überschreiben der gerade gelesenen Datei). Alternativ Binär-Dateiobjekt.
+    """
+
+    def __init__(self, target, members: Optional[Dict[str, Any]] = None):
+        self.path = None
+        if isinstance(target, (str, os.PathLike)):
+            self.path = os.fspath(target)
+            self.tmp_path = f"{self.path}.tmp"
+            self.fh = open(self.tmp_path, "wb")
+        else:
+            self.fh = target
+        self.count = 0
+        self.closed = False
+        self.fh.write(b'{"type":"FeatureCollection"')
+        self._write_members(members)
+        self.fh.write(b',"features":[')
+
+    def _write_members(self, members: Optional[Dict[str, Any]]):
+        for key, value in (members or {}).items():
+            if key in ("type", "features"):
+                continue
+            self.fh.write(b"," + dumps(key) + b":" + dumps(value))
+
+    def _sep(self):
+        if self.count:
+            self.fh.write(b",\n")
+        else:
+            self.fh.write(b"\n")
+        self.count += 1
+
+    def write(self, feature: Dict[str, Any]):
+        self._sep()
+        self.fh.write(dumps(feature))
+
+    def write_raw(self, text: str):
+        """Feature-Quelltext unverändert übernehmen (z.B. aus FeatureCollectionReader.iter_raw)."""
+        self._sep()
+        self.fh.write(text.encode("utf-8"))
+
+    def close(self, members: Optional[Dict[str, Any]] = None):
+        """Schließt das Array; `members` werden nach den Features ergänzt."""
+        if self.closed:
+            return
+        self.fh.write(b"\n]")
+        self._write_members(members)
+        self.fh.write(b"}\n")
+        self.closed = True
+        if self.path:
+            self.fh.close()
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Verwirft die Ausgabe (Zieldatei bleibt unverändert)."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.path:
+            self.fh.close()
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def member_spans(raw: str, stop_at: Optional[str] = None) -> Dict[str, Tuple[int, int]]:
+    """
+    (Start, Ende) der Werte aller Top-Level-Einträge eines JSON-Objekt-Quelltexts.
+    Mit `stop_at` endet die Suche nach diesem Eintrag (spart z.B. das Dekodieren der Geometrie).
+    """
+    spans: Dict[str, Tuple[int, int]] = {}
+    pos = _WS.match(raw, 0).end()
+    if raw[pos:pos + 1] != "{":
+        raise ValueError("Ungültiges GeoJSON: Objekt erwartet")
+    pos = _WS.match(raw, pos + 1).end()
+    if raw[pos:pos + 1] == "}":
+        return spans
+    while True:
+        key, pos = _DECODER.raw_decode(raw, pos)
+        pos = _WS.match(raw, pos).end()
+        if raw[pos:pos + 1] != ":":
+            raise ValueError("Ungültiges GeoJSON: ':' erwartet")
+        start = _WS.match(raw, pos + 1).end()
+        _, end = _DECODER.raw_decode(raw, start)
+        spans[key] = (start, end)
+        if key == stop_at:
+            return spans
+        pos = _WS.match(raw, end).end()
+        sep = raw[pos:pos + 1]
+        if sep == "}":
+            return spans
+        if sep != ",":
+            raise ValueError("Ungültiges GeoJSON: ',' oder '}' erwartet")
+        pos = _WS.match(raw, pos + 1).end()
+
+
+def replace_properties(raw: str, properties: Dict[str, Any]) -> str:
+    """Feature-Quelltext mit neuen properties; alles andere (Geometrie, id, ...) bleibt Byte für Byte."""
+    new = dumps(properties).decode("utf-8")
+    spans = member_spans(raw, stop_at="properties")
+    if "properties" in spans:
+        start, end = spans["properties"]
+        return raw[:start] + new + raw[end:]
+    close = raw.rstrip().rfind("}")
+    sep = "," if spans else ""
+    return f'{raw[:close]}{sep}"properties":{new}{raw[close:]}'
+
+
+def rewrite_properties(
+    source,
+    target,
+    update: Callable[[int, Dict[str, Any]], Optional[Dict[str, Any]]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, int]:
+    """
+    Streamt eine FeatureCollection und ersetzt nur die properties.
+    update(i, properties) liefert die neuen properties des i-ten Features oder None
+    (Feature wird unverändert übernommen). Geometrien werden nie neu kodiert.
+    """
+    stats = {"features_total": 0, "features_changed": 0}
+    reader = FeatureCollectionReader(source, chunk_size)
+    writer = FeatureCollectionWriter(target)
+    try:
+        for i, (feature, raw) in enumerate(reader.iter_raw()):
+            stats["features_total"] += 1
+            old = feature.get("properties") or {}
+            new = update(i, old)
+            if new is None or new == old:
+                writer.write_raw(raw)
+            else:
+                writer.write_raw(replace_properties(raw, new))
+                stats["features_changed"] += 1
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close(reader.members)
+    return stats
@@ -5,19 +5,38 @@ Beinhaltet:
 2. Datei-Dialoge (Tkinter Wrapper)
 3. Geometrie-Reparatur & IO
 4. Config-Management
+5. GML Konverter
+6. Streaming-Merge (Resolver)
+7. Dataset-Cache (prozessweit, LRU) & Dataset-Referenzen für den Session-State
+8. Räumliche Zuweisung (Zonen -> Polygon-Layer)
+9. Split-Engine (eine Datei pro Wert)
+10. Spalten-Profil (memoisiert, optional mit Stichprobe)
 """
 
 import os
 import json
+import hashlib
 import logging
+import concurrent.futures
+import threading
+import weakref
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import filedialog
-from typing import Dict, Any, Tuple, List, Optional
+from typing import Dict, Any, Callable, Tuple, List, Optional
 
 import geopandas as gpd
 import networkx as nx
-import libpysal
+import numpy as np
 import pandas as pd
+import shapely
+
+# Optional: Arrow-basiertes Lesen (deutlich schneller bei vielen Attributen)
+try:
+    import pyarrow  # noqa: F401
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -66,41 +85,417 @@ def select_folder_dialog(title: str = "Ordner wählen") -> str:
 
 # --- 3. GEOMETRIE & IO ---
 
-def load_geodataframe_raw(path: str) -> gpd.GeoDataFrame:
+def _read_file(
+    path: str,
+    columns: Optional[List[str]] = None,
+    bbox=None,
+    mask=None,
+    rows=None,
+    ignore_geometry: bool = False,
+    use_arrow: bool = False
+):
     """
-    Läd GeoJSON ohne Geometrie-Reparatur.
-    Ideal für Tools, die nur Attribute bearbeiten (z.B. Streamlit-General-Splitter).
+    Gemeinsamer Lese-Pfad aller Loader.
+    columns: nur diese Attribute lesen (None = alle, unbekannte Namen werden ignoriert)
+    bbox/mask: räumlicher Filter (bbox als (minx, miny, maxx, maxy) im CRS der Datei)
+    rows: Anzahl oder slice der zu lesenden Features
+    use_arrow: Arrow-Reader (opt-in, nur wenn pyarrow installiert ist). Schneller, liefert aber
+               andere dtypes (z.B. datetime.date / Arrow-Strings statt object) -> nur für Aufrufer,
+               die die Attribute nicht unverändert zurückschreiben.
     """
-    gdf = gpd.read_file(path)
-    if gdf.crs is None:
+    kwargs: Dict[str, Any] = {}
+    if columns is not None:
+        kwargs["columns"] = list(columns)
+    if bbox is not None:
+        kwargs["bbox"] = bbox
+    if mask is not None:
+        kwargs["mask"] = mask
+    if rows is not None:
+        kwargs["rows"] = rows
+    if ignore_geometry:
+        kwargs["ignore_geometry"] = True
+    if use_arrow and ARROW_AVAILABLE:
+        kwargs["use_arrow"] = True
+
+    gdf = gpd.read_file(path, **kwargs)
+    if not ignore_geometry and gdf.crs is None:
         gdf.set_crs(epsg=4326, inplace=True)
     return gdf
 
 
-def load_geodataframe(path: str) -> gpd.GeoDataFrame:
+def read_field_names(path: str) -> List[str]:
+    """Attribut-Namen einer Datei, ohne Features zu lesen."""
+    import pyogrio
+    return [str(f) for f in pyogrio.read_info(path)["fields"]]
+
+
+def write_geodataframe_atomic(gdf: gpd.GeoDataFrame, path: str, driver: str = "GeoJSON") -> None:
+    """
+    Schreibt in eine temporäre Datei im Zielordner und ersetzt das Ziel erst danach
+    (os.replace). Bei Fehlern bleibt eine vorhandene Zieldatei unverändert.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        gdf.to_file(tmp_path, driver=driver)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_geodataframe_raw(path: str, cache: bool = True, **load_opts) -> gpd.GeoDataFrame:
+    """
+    Läd GeoJSON ohne Geometrie-Reparatur.
+    Ideal für Tools, die nur Attribute bearbeiten (z.B. Streamlit-General-Splitter).
+    load_opts: columns, bbox, mask, rows, ignore_geometry, use_arrow (siehe _read_file).
+    cache=True geht über den Dataset-Cache und liefert eine eigene (veränderbare) Kopie
+    (flach dank Copy-on-Write). Wer nur liest, nimmt load_geodataframe_shared / DatasetRef.get().
+    """
+    if not cache:
+        return _read_file(path, **load_opts)
+    return _private_copy(load_geodataframe_shared(path, **load_opts))
+
+
+def load_geodataframe(path: str, cache: bool = True, **load_opts) -> gpd.GeoDataFrame:
     """Lädt GeoJSON und führt IMMER eine Basis-Reparatur durch."""
-    gdf = gpd.read_file(path)
     # Standardisiere CRS auf WGS84 wenn möglich, sonst lass es
-    if gdf.crs is None:
-        gdf.set_crs(epsg=4326, inplace=True)
+    gdf = load_geodataframe_raw(path, cache=cache, **load_opts)
     return repair_geometry(gdf)
 
 
-def repair_geometry(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    """Führt buffer(0) aus und entfernt leere Geometrien."""
+def load_geodataframes_parallel(
+    paths: List[str],
+    max_workers: Optional[int] = None,
+    progress_cb=None,
+    cache: bool = False,
+    **load_opts
+) -> List[gpd.GeoDataFrame]:
+    """
+    Lädt mehrere Dateien parallel (Threads, GDAL gibt den GIL beim Lesen frei).
+    load_opts wie bei load_geodataframe_raw (z.B. columns=[...] für Projektion).
+    cache=False: einmalige Merges belegen weder Cache-Budget noch eine zweite Kopie.
+    Reihenfolge der Rückgabe = Reihenfolge von paths.
+    """
+    if not paths:
+        return []
+    workers = max_workers or min(len(paths), os.cpu_count() or 4)
+    results: List[Optional[gpd.GeoDataFrame]] = [None] * len(paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as exc:
+        fut = {exc.submit(load_geodataframe_raw, p, cache=cache, **load_opts): i for i, p in enumerate(paths)}
+        for done, f in enumerate(concurrent.futures.as_completed(fut), start=1):
+            results[fut[f]] = f.result()
+            if progress_cb:
+                progress_cb(done, len(paths), os.path.basename(paths[fut[f]]))
+    return results
+
+
+def _polygonal_parts(geom):
+    """Behält nur Flächen-Anteile (make_valid kann bei Flächen auch Linien/Punkte liefern)."""
+    if geom is None or shapely.get_type_id(geom) in (3, 6):
+        return geom
+    parts = [p for p in shapely.get_parts(geom) if shapely.get_type_id(p) == 3]
+    return shapely.multipolygons(parts) if parts else shapely.Polygon()
+
+
+def _repair_array(arr: np.ndarray) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Repariert nur ungültige Geometrien (vektorisierte Prüfung).
+    make_valid-Semantik, buffer(0) als Fallback, falls make_valid kein gültiges Ergebnis liefert.
+    """
+    arr = np.asarray(arr, dtype=object)
+    invalid = ~shapely.is_valid(arr) & ~shapely.is_missing(arr)
+    stats = {"total": len(arr), "invalid": int(invalid.sum()), "make_valid": 0, "buffer_fallback": 0, "failed": 0}
+    if not stats["invalid"]:
+        return arr, stats
+
+    out = arr.copy()
+    bad = arr[invalid]
+    polygonal = np.isin(shapely.get_type_id(bad), (3, 6))
+    try:
+        # shapely >= 2.1: 'structure' liefert für Flächen direkt Flächen
+        fixed = shapely.make_valid(bad, method="structure", keep_collapsed=False)
+    except TypeError:
+        fixed = shapely.make_valid(bad)
+    fixed = np.array([_polygonal_parts(g) if p else g for g, p in zip(fixed, polygonal)], dtype=object)
+
+    still_bad = ~shapely.is_valid(fixed) | (shapely.is_empty(fixed) & ~shapely.is_empty(bad))
+    if still_bad.any():
+        fixed[still_bad] = shapely.buffer(bad[still_bad], 0)
+        stats["buffer_fallback"] = int(still_bad.sum())
+    stats["make_valid"] = stats["invalid"] - stats["buffer_fallback"]
+    stats["failed"] = int((~shapely.is_valid(fixed)).sum())
+
+    out[invalid] = fixed
+    return out, stats
+
+
+def repair_geoseries(geoms: gpd.GeoSeries) -> Tuple[gpd.GeoSeries, Dict[str, int]]:
+    """Ersatz für geoms.buffer(0): repariert nur ungültige Geometrien. Rückgabe: (GeoSeries, Statistik)."""
+    fixed, stats = _repair_array(np.asarray(geoms.values, dtype=object))
+    return gpd.GeoSeries(fixed, index=geoms.index, crs=geoms.crs, name=geoms.name), stats
+
+
+def repair_geometry(gdf: gpd.GeoDataFrame, return_stats: bool = False):
+    """
+    Repariert ungültige Geometrien (selektiv) und entfernt leere/fehlende.
+    return_stats=True liefert (gdf, stats) mit Anzahl ungültig/repariert/entfernt.
+    """
     if gdf is None or gdf.empty:
-        return gdf
-    gdf["geometry"] = gdf["geometry"].buffer(0)
-    return gdf[~gdf.geometry.is_empty & gdf.geometry.is_valid].copy()
+        empty_stats = {"total": 0, "invalid": 0, "make_valid": 0, "buffer_fallback": 0, "failed": 0, "dropped": 0}
+        return (gdf, empty_stats) if return_stats else gdf
+    geoms, stats = repair_geoseries(gdf.geometry)
+    gdf = gdf.copy()
+    gdf[gdf.geometry.name] = geoms
+    keep = ~geoms.is_empty & ~geoms.isna() & geoms.is_valid
+    stats["dropped"] = int((~keep).sum())
+    if stats["invalid"]:
+        logger.info(f"Geometrie-Reparatur: {stats}")
+    gdf = gdf[keep.values]
+    return (gdf, stats) if return_stats else gdf
+
+def is_valid_coverage(geoms) -> bool:
+    """
+    True, wenn die Polygone eine gültige Coverage bilden
+    (valide, keine Überlappungen, gemeinsame Kanten mit identischen Stützpunkten).
+    """
+    if not hasattr(shapely, "coverage_is_valid"):  # erst ab shapely 2.1
+        return False
+    arr = np.asarray(geoms, dtype=object)
+    if len(arr) == 0:
+        return False
+    types = shapely.get_type_id(arr)
+    # 3 = Polygon, 6 = MultiPolygon
+    if not np.isin(types, (3, 6)).all() or not shapely.is_valid(arr).all():
+        return False
+    try:
+        return bool(shapely.coverage_is_valid(arr))
+    except Exception as e:
+        logger.warning(f"Coverage-Prüfung fehlgeschlagen: {e}")
+        return False
+
+
+def union_geometries(geoms, coverage: Optional[bool] = None):
+    """
+    Vereinigt Geometrien. Gültige Coverages werden per coverage_union (nur Kanten-Abgleich)
+    vereinigt, sonst generisch über selektive Reparatur + union_all.
+    coverage=None prüft automatisch.
+    """
+    arr = np.asarray(geoms, dtype=object)
+    if coverage is None:
+        coverage = is_valid_coverage(arr)
+    if coverage:
+        return shapely.coverage_union_all(arr)
+    return shapely.union_all(_repair_array(arr)[0])
+
+
+def dissolve_zones(
+    gdf: gpd.GeoDataFrame,
+    by: str,
+    aggfunc: str = "first",
+    as_index: bool = False
+) -> gpd.GeoDataFrame:
+    """
+    Ersatz für buffer(0) + gdf.dissolve(by=...), mit Coverage-Schnellpfad
+    (sonst werden nur ungültige Geometrien repariert).
+    Die Coverage-Prüfung läuft einmal über alle Features; jede Teilmenge einer
+    gültigen Coverage ist wieder eine Coverage.
+    """
+    gdf = gdf[gdf[by].notna()]
+    geom_col = gdf.geometry.name
+    if gdf.empty:
+        out = gdf.iloc[:0].drop(columns=geom_col)
+        out = gpd.GeoDataFrame(out, geometry=gpd.GeoSeries([], crs=gdf.crs), crs=gdf.crs)
+        return out if not as_index else out.set_index(by)
+
+    arr = np.asarray(gdf.geometry.values, dtype=object)
+    coverage = is_valid_coverage(arr)
+    if not coverage:
+        arr, _ = _repair_array(arr)
+
+    groups = gdf.groupby(by, sort=True).indices
+    merge = shapely.coverage_union_all if coverage else shapely.union_all
+    geoms = [merge(arr[idx]) for idx in groups.values()]
+
+    data = pd.DataFrame(gdf.drop(columns=geom_col)).groupby(by, sort=True).agg(aggfunc)
+    out = gpd.GeoDataFrame(data, geometry=gpd.GeoSeries(geoms, index=data.index, crs=gdf.crs), crs=gdf.crs)
+    if not as_index:
+        out = out.reset_index()
+    return out
 
 # --- 4. COLORING LOGIK (NEU) ---
+def _metric_geometries(gdf: gpd.GeoDataFrame) -> np.ndarray:
+    """Geometrien in einem metrischen CRS (UTM), damit Längen in Metern vorliegen."""
+    if gdf.crs is not None and gdf.crs.is_geographic:
+        gdf = gdf.to_crs(gdf.estimate_utm_crs())
+    return np.asarray(gdf.geometry.values, dtype=object)
+
+
+def build_adjacency(gdf: gpd.GeoDataFrame, min_shared_length: float = 0.0):
+    """
+    Nachbarschaft der Polygone als symmetrische CSR-Matrix (n x n).
+    Ein STRtree-Bulk-Query liefert alle sich berührenden/schneidenden Paare.
+    min_shared_length (Meter): Paare mit kürzerer gemeinsamer Grenze (z.B. nur Eckpunkt)
+    werden ignoriert; überlappende Polygone gelten immer als Nachbarn.
+    """
+    n = len(gdf)
+    arr = np.asarray(gdf.geometry.values, dtype=object)
+    tree = shapely.STRtree(arr)
+    left, right = tree.query(arr, predicate="intersects")
+    keep = left < right
+    left, right = left[keep], right[keep]
+
+    if min_shared_length > 0 and len(left):
+        metric = _metric_geometries(gdf)
+        inter = shapely.intersection(metric[left], metric[right])
+        shared = (shapely.area(inter) > 0) | (shapely.length(inter) >= min_shared_length)
+        left, right = left[shared], right[shared]
+
+    return _symmetric_csr(left, right, n)
+
+
+def _symmetric_csr(left: np.ndarray, right: np.ndarray, n: int):
+    """Ungerichtete Kantenliste (i, j) als symmetrische CSR-Matrix."""
+    from scipy import sparse
+
+    rows = np.concatenate([left, right])
+    cols = np.concatenate([right, left])
+    data = np.ones(len(rows), dtype=np.int8)
+    m = sparse.csr_matrix((data, (rows, cols)), shape=(n, n))
+    m.data[:] = 1
+    return m
+
+
+# Axiale Nachbarrichtungen im Hex-Gitter (je Paar nur eine Richtung nötig)
+_HEX_DIRECTIONS = ((1, 0), (0, 1), (-1, 1))
+_WEB_MERCATOR_R = 6378137.0
+
+
+def zone_adjacency_from_hexes(hex_gdf: gpd.GeoDataFrame, label_col: str = "zone_label") -> pd.DataFrame:
+    """
+    Zonen-Nachbarschaft direkt aus dem Hex-Gitter (Generator/Refiner), ohne Polygon-Topologie.
+    Jedes Hexagon bekommt axiale Gitterkoordinaten (EPSG:3857, Spitze oben); benachbarte
+    Hexagone mit unterschiedlichem Label ergeben ein Zonenpaar. Laufzeit linear in der Hex-Anzahl.
+    Rückgabe: DataFrame [zone_a, zone_b, shared_edges, shared_length_m].
+    """
+    cols = ["zone_a", "zone_b", "shared_edges", "shared_length_m"]
+    hexes = hex_gdf[hex_gdf[label_col].notna()]
+    if hexes.empty:
+        return pd.DataFrame(columns=cols)
+    if hexes.crs is None or hexes.crs.to_epsg() != 3857:
+        hexes = hexes.to_crs(epsg=3857)
+
+    geoms = hexes.geometry.values
+    bounds = shapely.bounds(geoms)
+    edge = float(np.median(bounds[:, 3] - bounds[:, 1])) / 2.0  # Hex-Höhe = 2 * Kantenlänge
+    centers = shapely.get_coordinates(shapely.centroid(geoms))
+    x = centers[:, 0] - centers[0, 0]
+    y = centers[:, 1] - centers[0, 1]
+    q = np.rint((np.sqrt(3) / 3 * x - y / 3) / edge).astype(np.int64)
+    r = np.rint((2 / 3 * y) / edge).astype(np.int64)
+
+    def key(qq, rr):
+        return (qq << 32) + rr
+
+    lookup = pd.Index(key(q, r))
+    if not lookup.is_unique:
+        raise ValueError("Hex-Gitter nicht eindeutig (doppelte Zellen oder kein reguläres Gitter)")
+
+    labels = hexes[label_col].astype(str).to_numpy()
+    lat = np.degrees(2 * np.arctan(np.exp(centers[:, 1] / _WEB_MERCATOR_R)) - np.pi / 2)
+    true_edge = edge * np.cos(np.radians(lat))  # Mercator-Verzerrung ausgleichen
+
+    parts = []
+    for dq, dr in _HEX_DIRECTIONS:
+        nb = lookup.get_indexer(key(q + dq, r + dr))
+        i = np.flatnonzero(nb >= 0)
+        j = nb[i]
+        diff = labels[i] != labels[j]
+        i, j = i[diff], j[diff]
+        a, b = labels[i], labels[j]
+        parts.append(pd.DataFrame({
+            "zone_a": np.where(a < b, a, b),
+            "zone_b": np.where(a < b, b, a),
+            "shared_length_m": (true_edge[i] + true_edge[j]) / 2,
+        }))
+
+    pairs = pd.concat(parts, ignore_index=True)
+    if pairs.empty:
+        return pd.DataFrame(columns=cols)
+    out = pairs.groupby(["zone_a", "zone_b"], sort=True).agg(
+        shared_edges=("shared_length_m", "size"),
+        shared_length_m=("shared_length_m", "sum"),
+    ).reset_index()
+    return out[cols]
+
+
+def adjacency_from_pairs(names: List[Any], pairs: pd.DataFrame, min_shared_length: float = 0.0):
+    """
+    Wandelt eine Zonenpaar-Tabelle (zone_a, zone_b[, shared_length_m]) in die CSR-Matrix
+    für die Features mit den Namen `names` um. Mehrteilige Zonen werden komplett verbunden.
+    """
+    if min_shared_length > 0 and "shared_length_m" in pairs.columns:
+        pairs = pairs[pairs["shared_length_m"] >= min_shared_length]
+
+    positions: Dict[str, List[int]] = {}
+    for i, name in enumerate(names):
+        if not _is_missing(name):
+            positions.setdefault(str(name), []).append(i)
+
+    left, right = [], []
+    for a, b in zip(pairs["zone_a"].astype(str), pairs["zone_b"].astype(str)):
+        for i in positions.get(a, ()):
+            for j in positions.get(b, ()):
+                left.append(i)
+                right.append(j)
+    return _symmetric_csr(np.asarray(left, dtype=np.int64), np.asarray(right, dtype=np.int64), len(names))
+
+
+def _incremental_coloring(
+    graph: nx.Graph,
+    names: List[Any],
+    existing_colors: Dict[str, int]
+) -> Tuple[Dict[int, int], int]:
+    """
+    Übernimmt vorhandene Farben (0-basiert), solange kein bereits übernommener Nachbar
+    dieselbe Farbe trägt. Alle übrigen Knoten bekommen greedy die kleinste freie Farbe.
+    Gibt (coloring, Anzahl übernommener Farben) zurück.
+    """
+    coloring: Dict[int, int] = {}
+    for node in graph.nodes:
+        prev = existing_colors.get(names[node])
+        if prev is None or _is_missing(prev):
+            continue
+        color = int(prev) - 1
+        if color < 0:
+            continue
+        if all(coloring.get(nb) != color for nb in graph.neighbors(node)):
+            coloring[node] = color
+    kept = len(coloring)
+
+    # Rest: höchster Grad zuerst (wie largest_first), kleinste freie Farbe
+    todo = sorted((n for n in graph.nodes if n not in coloring), key=graph.degree, reverse=True)
+    for node in todo:
+        used = {coloring[nb] for nb in graph.neighbors(node) if nb in coloring}
+        color = 0
+        while color in used:
+            color += 1
+        coloring[node] = color
+    return coloring, kept
+
+
 def process_coloring(
     gdf: gpd.GeoDataFrame,
     property_name: str,
-    existing_colors: Dict[str, int] = None
+    existing_colors: Dict[str, int] = None,
+    min_shared_length: float = 0.0,
+    adjacency: Optional[pd.DataFrame] = None
 ) -> Tuple[gpd.GeoDataFrame, Dict[str, int], Dict[str, Any]]:
     """
     Färbt Zonen basierend auf Nachbarschaft (Graph Coloring).
+    Mit existing_colors ({Name: color_id}) wird inkrementell gefärbt: Zonen behalten ihre
+    bisherige Farbe, sofern konfliktfrei; nur neue/konfliktbehaftete Zonen werden neu gefärbt.
+    adjacency: vorberechnete Zonenpaare (z.B. zone_adjacency_from_hexes) statt Polygon-Topologie.
     """
     if gdf is None or gdf.empty:
         columns = list(getattr(gdf, "columns", []))
@@ -112,139 +507,941 @@ def process_coloring(
             "num_features": 0,
             "num_colors": 0,
             "components": 0,
-            "isolates": []
+            "isolates": [],
+            "kept": 0,
+            "recolored": 0
         }
         return empty_gdf, existing_colors or {}, stats
 
     # Sicherstellen, dass Geometrie sauber ist
     gdf = repair_geometry(gdf).reset_index(drop=True)
 
-    # Nachbarschaftsgraph (Queen)
-    try:
-        w = libpysal.weights.Queen.from_dataframe(gdf, use_index=False)
-    except Exception as e:
-        logger.warning(f"Queen weights failed, fallback to KNN: {e}")
-        w = libpysal.weights.KNN.from_dataframe(gdf, k=1)
+    # Nachbarschaftsgraph (STRtree, Queen-Kontiguität bzw. Mindest-Grenzlänge)
+    if adjacency is not None and property_name in gdf.columns:
+        matrix = adjacency_from_pairs(gdf[property_name].tolist(), adjacency, min_shared_length)
+    else:
+        matrix = build_adjacency(gdf, min_shared_length=min_shared_length)
+    graph = nx.from_scipy_sparse_array(matrix)
 
-    graph = w.to_networkx()
-
-    # Färben (Greedy Strategy)
-    coloring = nx.greedy_color(graph, strategy="largest_first")
+    # Färben: inkrementell (stabile Farben) oder komplett neu (Greedy Strategy)
+    if existing_colors and property_name in gdf.columns:
+        coloring, kept = _incremental_coloring(graph, gdf[property_name].tolist(), existing_colors)
+    else:
+        coloring, kept = nx.greedy_color(graph, strategy="largest_first"), 0
     
     # +1 damit IDs bei 1 starten
-    gdf["color_id"] = gdf.index.map(coloring) + 1
+    gdf["color_id"] = gdf.index.map(coloring).astype(int) + 1
     
-    # Mapping erstellen
-    new_color_mapping = {}
+    # Mapping erstellen (Einträge für nicht mehr vorhandene Zonen bleiben erhalten)
+    new_color_mapping = dict(existing_colors or {})
     if property_name in gdf.columns:
         temp_df = gdf[[property_name, "color_id"]].drop_duplicates(subset=[property_name])
-        new_color_mapping = dict(zip(temp_df[property_name], temp_df["color_id"]))
+        new_color_mapping.update({k: int(v) for k, v in zip(temp_df[property_name], temp_df["color_id"])})
 
     stats = {
         "num_features": len(gdf),
-        "num_colors": int(gdf["color_id"].max()),
+        "num_colors": int(gdf["color_id"].nunique()),
         "components": nx.number_connected_components(graph),
-        "isolates": list(nx.isolates(graph))
+        "isolates": list(nx.isolates(graph)),
+        "kept": kept,
+        "recolored": len(gdf) - kept
     }
 
     return gdf, new_color_mapping, stats
 
 # --- 5. GML CONVERTER (AUSTRIA-SMART FIX) ---
-def convert_gml_to_geojson(input_path: str, output_path: str, swap_mode: str = "auto") -> Tuple[bool, str]:
+GML_FALLBACK_CRS = "EPSG:31255"  # Annahme: OÖ Standard (MGI)
+
+
+# Fiona-Feldtypen -> Pandas-Dtypes (für _merge_schema)
+_FIONA_DTYPES = {"int": "int64", "float": "float64", "str": "object", "bool": "bool"}
+
+
+def _gml_layer_info(input_path: str, layer: str) -> Dict[str, Any]:
+    """
+    Layer-Metadaten ohne Features zu laden: Anzahl, Felder und Ausdehnung in WGS84
+    (transformiert wie beim Einlesen).
+    """
+    import fiona
+    from pyproj import CRS, Transformer
+
+    with fiona.open(input_path, layer=layer) as src:
+        n = len(src)
+        props = src.schema.get("properties", {})
+        crs = CRS.from_user_input(src.crs or GML_FALLBACK_CRS)
+        bounds = src.bounds if n else None
+
+    info = {
+        "features": n,
+        "fields": list(props),
+        "dtypes": [_FIONA_DTYPES.get(t.split(":")[0], t.split(":")[0]) for t in props.values()],
+        "bounds": None,
+    }
+    if bounds is not None and np.all(np.isfinite(bounds)):
+        if crs.to_string() != "EPSG:4326":
+            bounds = Transformer.from_crs(crs, "EPSG:4326", always_xy=True).transform_bounds(*bounds)
+        info["bounds"] = tuple(bounds)
+    return info
+
+
+def _swap_axes(coords: np.ndarray) -> np.ndarray:
+    return coords[:, ::-1]
+
+
+def _convert_gml_layer(input_path: str, layer: str, swap: bool) -> gpd.GeoDataFrame:
+    """Liest einen Layer, transformiert nach WGS84, explodiert und entfernt Z (vektorisiert)."""
+    # engine='fiona' ist wichtig für GML-Kurven
+    gdf = gpd.read_file(input_path, layer=layer, engine="fiona")
+    if gdf.empty:
+        return gdf
+
+    # 1. CRS Fallback
+    if gdf.crs is None:
+        gdf.set_crs(GML_FALLBACK_CRS, inplace=True)
+
+    # 2. Nach WGS84 transformieren (falls nötig)
+    if gdf.crs.to_string() != "EPSG:4326":
+        gdf = gdf.to_crs(epsg=4326)
+
+    # 3. Geometrie bereinigen, Z-Koordinaten entfernen (Flatten to 2D), ggf. Achsen tauschen
+    gdf = gdf[gdf.geometry.notnull()]
+    gdf = gdf.explode(index_parts=False).reset_index(drop=True)
+    arr = shapely.force_2d(np.asarray(gdf.geometry.values, dtype=object))
+    if swap:
+        arr = shapely.transform(arr, _swap_axes)
+    gdf = gdf.set_geometry(gpd.GeoSeries(arr, index=gdf.index, crs="EPSG:4326"))
+    gdf["source_layer"] = layer
+    return gdf
+
+
+def convert_gml_to_geojson(
+    input_path: str,
+    output_path: str,
+    swap_mode: str = "auto",
+    max_workers: Optional[int] = None,
+    progress_cb=None
+) -> Tuple[bool, str]:
     """
     Konvertiert GML nach GeoJSON.
     Spezial-Feature: Prüft geographisch, ob die Daten in Österreich liegen.
     Falls sie im Jemen/Afrika liegen, werden die Achsen automatisch gedreht.
+    Layer werden parallel gelesen und in Layer-Reihenfolge an die Ausgabe angehängt;
+    der Österreich-Check nutzt nur die Layer-Metadaten (kein Zusammenführen im Speicher).
+    progress_cb(done, total, layer) wird nach jedem Layer aufgerufen.
     """
     import fiona
-    from shapely.ops import transform
-    
+
     try:
         layers = fiona.listlayers(input_path)
         if not layers:
             return False, "Keine Layer in der GML-Datei gefunden."
-        
-        gdfs = []
-        
+
+        # A. Metadaten: Schema + Ausdehnung je Layer
+        infos, extents = {}, []
         for layer in layers:
             try:
-                # engine='fiona' ist wichtig für GML-Kurven
-                gdf = gpd.read_file(input_path, layer=layer, engine="fiona")
-                
-                if gdf.empty:
-                    continue
-
-                # 1. CRS Fallback
-                if gdf.crs is None:
-                    # Annahme: OÖ Standard (MGI)
-                    gdf.set_crs(epsg=31255, inplace=True)
-                
-                # 2. Nach WGS84 transformieren (falls nötig)
-                if gdf.crs.to_string() != "EPSG:4326":
-                    gdf = gdf.to_crs(epsg=4326)
-                
-                # 3. Geometrie bereinigen
-                gdf = gdf[gdf.geometry.notnull()]
-                gdf = gdf.explode(index_parts=False).reset_index(drop=True)
-                
-                # Z-Koordinaten entfernen (Flatten to 2D)
-                # Das verhindert viele Fehler bei Web-Darstellung und Swap
-                if not gdf.empty:
-                    gdf.geometry = gdf.geometry.map(
-                        lambda geom: transform(lambda x, y, z=None: (x, y), geom)
-                    )
-
-                if not gdf.empty:
-                    gdf["source_layer"] = layer
-                    gdfs.append(gdf)
-                    
+                info = _gml_layer_info(input_path, layer)
             except Exception as e:
                 logger.warning(f"Warnung bei Layer '{layer}': {e}")
+                continue
+            if info["features"] == 0:
+                continue
+            infos[layer] = info
+            if info["bounds"] is not None:
+                extents.append(info["bounds"])
 
-        if not gdfs:
+        if not infos:
             return False, "Konnte keine validen Geometrien extrahieren."
 
-        full_gdf = pd.concat(gdfs, ignore_index=True)
-        
         # --- AUSTRIA CHECK ---
         # Wir prüfen, ob die Daten "sinnvoll" in Österreich liegen.
         # Österreich Bounding Box ca: Lon (X) 9-17, Lat (Y) 46-49
-        
-        bounds = full_gdf.total_bounds # [minx, miny, maxx, maxy]
-        mean_x = (bounds[0] + bounds[2]) / 2
-        mean_y = (bounds[1] + bounds[3]) / 2
-        
         perform_swap = False
         msg_suffix = ""
 
         if swap_mode == "yes":
             perform_swap = True
             msg_suffix = " (Manuell erzwungen)"
-        
-        elif swap_mode == "auto":
-            # IST-Zustand Analyse:
+
+        elif swap_mode == "auto" and extents:
+            ext = np.array(extents)
+            mean_x = (ext[:, 0].min() + ext[:, 2].max()) / 2
+            mean_y = (ext[:, 1].min() + ext[:, 3].max()) / 2
+
             # Fall A: X ist ~48 (Breite), Y ist ~14 (Länge) -> DAS IST JEMEN -> SWAP NÖTIG
             if mean_x > 40 and mean_x < 55 and mean_y > 9 and mean_y < 20:
                 perform_swap = True
                 msg_suffix = " (Auto-Korrektur: Jemen-Problem erkannt & behoben)"
-            
+
             # Fall B: X ist ~14, Y ist ~48 -> DAS IST ÖSTERREICH -> KEIN SWAP
             elif mean_x > 9 and mean_x < 20 and mean_y > 40 and mean_y < 55:
                 perform_swap = False
                 msg_suffix = " (Auto-Check: Daten liegen korrekt in Österreich)"
-                
+
             # Fall C: Ganz woanders -> Wir vertrauen dem CRS, machen nichts.
 
-        if perform_swap:
-            full_gdf.geometry = full_gdf.geometry.map(
-                lambda geom: transform(lambda x, y, z=None: (y, x), geom)
-            )
+        # B. Layer parallel lesen, in Reihenfolge anhängen (höchstens max_workers Layer im Speicher)
+        schema = _merge_schema(list(infos.values()))
+        schema["source_layer"] = "object"
+        todo = list(infos)
+        workers = max_workers or min(4, len(todo))
+        written = 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = OrderedDict()
+            queue = iter(todo)
+            for layer in queue:
+                pending[layer] = pool.submit(_convert_gml_layer, input_path, layer, perform_swap)
+                if len(pending) >= workers:
+                    break
+
+            done = 0
+            while pending:
+                layer, fut = pending.popitem(last=False)
+                try:
+                    gdf = fut.result()
+                except Exception as e:
+                    logger.warning(f"Warnung bei Layer '{layer}': {e}")
+                    gdf = None
+                nxt = next(queue, None)
+                if nxt is not None:
+                    pending[nxt] = pool.submit(_convert_gml_layer, input_path, nxt, perform_swap)
 
-        # Speichern
-        full_gdf.to_file(output_path, driver='GeoJSON')
-        
-        return True, f"Erfolgreich konvertiert! ({len(full_gdf)} Features){msg_suffix}"
+                if gdf is not None and not gdf.empty:
+                    chunk = gpd.GeoDataFrame(_apply_schema(gdf, schema), geometry="geometry", crs="EPSG:4326")
+                    chunk.to_file(output_path, driver="GeoJSON", mode="a" if written else "w")
+                    written += len(chunk)
+                del gdf
+                done += 1
+                if progress_cb:
+                    progress_cb(done, len(todo), layer)
+
+        if not written:
+            return False, "Konnte keine validen Geometrien extrahieren."
+
+        return True, f"Erfolgreich konvertiert! ({written} Features){msg_suffix}"
 
     except Exception as e:
         logger.error(f"GML Convert Error: {e}")
-        return False, f"Fehler: {str(e)}"
\ No newline at end of file
+        return False, f"Fehler: {str(e)}"
+
+# --- 6. STREAMING MERGE (RESOLVER) ---
+def _merge_schema(infos: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Gemeinsames Spalten-Schema über alle Dateien (Reihenfolge = erstes Auftreten)."""
+    seen: Dict[str, set] = {}
+    for info in infos:
+        for field, dtype in zip(info["fields"], info["dtypes"]):
+            seen.setdefault(field, set()).add(str(dtype))
+
+    schema = {}
+    for field, dtypes in seen.items():
+        kinds = {"int" if d.startswith("int") else d for d in dtypes}
+        if len(kinds) > 1:
+            schema[field] = "str"
+        else:
+            kind = kinds.pop()
+            # Nullable Typen, damit fehlende Werte als null (nicht als Float/NaN) geschrieben werden
+            schema[field] = {"int": "Int64", "bool": "boolean"}.get(kind, kind)
+    return schema
+
+
+def _is_missing(v) -> bool:
+    return v is None or (pd.api.types.is_scalar(v) and pd.isna(v))
+
+
+def _apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """Richtet ein Teil-Ergebnis auf das Schema aus, damit Append konsistent schreibt."""
+    df = df.reindex(columns=list(schema) + ["geometry"])
+    for col, dtype in schema.items():
+        if dtype == "str":
+            df[col] = df[col].map(lambda v: None if _is_missing(v) else str(v)).astype(object)
+        elif dtype in ("object", "Int64", "boolean", "float64"):
+            try:
+                df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                df[col] = df[col].astype(object)
+    return df
+
+
+def stream_merge_files(
+    paths: List[str],
+    target_col: str,
+    output_path: str,
+    keep_attrs: bool = True,
+    do_dissolve: bool = True,
+    progress_cb=None
+) -> Dict[str, int]:
+    """
+    Speicherschonender Merge für den Resolver.
+    Liest die Dateien einzeln, schreibt Zonen, die nur in einer Datei vorkommen, sofort
+    in die Ausgabe und vereinigt nur Namen, die in mehreren Dateien vorkommen, inkrementell.
+    Ergebnis entspricht concat -> dissolve(by='name'), ohne die volle Konkatenation im Speicher.
+    """
+    import pyogrio
+
+    # A. Vorlauf: nur Schema und Namens-Spalte lesen (ohne Geometrie)
+    infos = []
+    files_per_name: Dict[Any, int] = {}
+    for path in paths:
+        info = pyogrio.read_info(path)
+        infos.append(info)
+        if target_col in list(info["fields"]):
+            names = load_geodataframe_raw(path, cache=False, columns=[target_col], ignore_geometry=True)[target_col]
+            names = names.fillna("Unknown")
+        else:
+            names = pd.Series(["Unknown"])
+        for n in names.unique():
+            files_per_name[n] = files_per_name.get(n, 0) + 1
+    shared_names = {n for n, c in files_per_name.items() if c > 1}
+
+    if keep_attrs:
+        schema = _merge_schema(infos)
+        if target_col not in schema:
+            schema[target_col] = "object"
+        schema.pop("name", None)
+        schema = {"name": "object", **schema}
+    else:
+        schema = {"name": "object"}
+
+    stats = {"files": len(paths), "features_written": 0, "shared_names": len(shared_names)}
+    pending_geoms: Dict[Any, Any] = {}
+    pending_attrs: Dict[Any, Dict[str, Any]] = {}
+    written = False
+
+    def write_chunk(chunk: gpd.GeoDataFrame):
+        nonlocal written
+        if chunk.empty:
+            return
+        chunk = gpd.GeoDataFrame(_apply_schema(chunk, schema), geometry="geometry", crs="EPSG:4326")
+        chunk.to_file(output_path, driver="GeoJSON", mode="a" if written else "w")
+        written = True
+        stats["features_written"] += len(chunk)
+
+    # B. Dateien einzeln verarbeiten
+    for i, path in enumerate(paths):
+        if progress_cb:
+            progress_cb(i, len(paths), os.path.basename(path))
+
+        gdf = load_geodataframe_raw(path, cache=False, columns=None if keep_attrs else [target_col])
+        if gdf.crs and gdf.crs.to_epsg() != 4326:
+            gdf = gdf.to_crs(epsg=4326)
+        if target_col not in gdf.columns:
+            gdf[target_col] = "Unknown"
+        gdf["name"] = gdf[target_col].fillna("Unknown")
+        if not keep_attrs:
+            gdf = gdf[["name", "geometry"]]
+
+        if not do_dissolve:
+            write_chunk(gdf)
+            continue
+
+        part = dissolve_zones(gdf, "name")
+
+        is_shared = part["name"].isin(shared_names)
+        write_chunk(part[~is_shared])
+
+        # Geteilte Namen inkrementell vereinigen (erster nicht-leerer Wert bleibt, wie bei dissolve)
+        for _, row in part[is_shared].iterrows():
+            n = row["name"]
+            attrs = row.drop(labels="geometry").to_dict()
+            if n in pending_geoms:
+                pending_geoms[n] = union_geometries([pending_geoms[n], row.geometry])
+                known = pending_attrs[n]
+                for k, v in attrs.items():
+                    if _is_missing(known.get(k)) and not _is_missing(v):
+                        known[k] = v
+            else:
+                pending_geoms[n] = row.geometry
+                pending_attrs[n] = attrs
+        del gdf, part
+
+    # C. Vereinigte Zonen anhängen
+    if pending_geoms:
+        rest = gpd.GeoDataFrame(
+            [pending_attrs[n] for n in pending_geoms],
+            geometry=list(pending_geoms.values()),
+            crs="EPSG:4326"
+        )
+        write_chunk(rest)
+
+    if not written:
+        empty = gpd.GeoDataFrame({c: [] for c in schema}, geometry=[], crs="EPSG:4326")
+        empty.to_file(output_path, driver="GeoJSON")
+
+    if progress_cb:
+        progress_cb(len(paths), len(paths), "fertig")
+    return stats
+
+
+# --- 7. DATASET CACHE ---
+# Geteilte Datensätze werden NICHT gegen Veränderung geschützt. Schutz für Kopien bietet allein
+# Copy-on-Write (pandas >= 3, siehe requirements.txt): flache Kopien sind dann billig und sicher.
+# Unter pandas < 3 wird tief kopiert – korrekt, aber jeder Cache-Treffer kostet eine volle Kopie.
+_COW_ACTIVE = int(pd.__version__.split(".")[0]) >= 3 or bool(getattr(pd.options.mode, "copy_on_write", False))
+
+
+def _private_copy(gdf):
+    """Eigene Kopie eines geteilten Datensatzes (flach bei Copy-on-Write, sonst tief)."""
+    return gdf.copy(deep=not _COW_ACTIVE)
+
+
+def _freeze(value):
+    """Macht Lade-Optionen hashbar (für den Cache-Key)."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, slice):
+        return ("slice", value.start, value.stop, value.step)
+    if isinstance(value, shapely.Geometry):
+        return ("wkb", shapely.to_wkb(value))
+    raise TypeError(f"Nicht cachebare Option: {type(value).__name__}")
+
+
+def estimate_nbytes(df) -> int:
+    """Grobe Speicherschätzung inkl. Geometrien (Koordinaten + Objekt-Overhead)."""
+    if isinstance(df, gpd.GeoDataFrame) and df.geometry.name in df.columns:
+        attrs = pd.DataFrame(df.drop(columns=df.geometry.name)).memory_usage(deep=True).sum()
+        geoms = np.asarray(df.geometry.values, dtype=object)
+        coords = int(shapely.get_num_coordinates(geoms).sum())
+        return int(attrs + coords * 16 + len(geoms) * 96)
+    return int(df.memory_usage(deep=True).sum())
+
+
+class DatasetCache:
+    """
+    Prozessweiter Cache für geladene Datensätze.
+    Key = (Pfad, mtime, Größe, Lade-Optionen). Die gelieferten Objekte sind GETEILT und ungeschützt:
+    Aufrufer dürfen sie nicht verändern (Schreiben nur über load_geodataframe_raw / DatasetRef.edit).
+    Budget = geteilte Einträge + bearbeitete Kopien (DatasetRef). Bei Überschreitung werden
+    die größten geteilten Einträge verdrängt und beim nächsten Zugriff neu geladen.
+    """
+
+    def __init__(self, budget_mb: float):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._entries: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        # Bearbeitete Kopien je DatasetRef (Eintrag verschwindet mit der Referenz)
+        self._private: "weakref.WeakKeyDictionary[Any, Tuple[str, int]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(path: str, load_opts: Dict[str, Any]) -> tuple:
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size, _freeze(load_opts))
+
+    def get(self, path: str, **load_opts):
+        try:
+            key = self.make_key(path, load_opts)
+        except TypeError:
+            # z.B. mask als GeoDataFrame -> ohne Cache laden
+            return _read_file(path, **load_opts)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                logger.debug(f"Cache-Hit: {path}")
+                return self._entries[key][0]
+            self.misses += 1
+        logger.debug(f"Cache-Miss: {path}")
+
+        gdf = _read_file(path, **load_opts)
+        self.put(key, gdf)
+        return gdf
+
+    def contains(self, path: str, **load_opts) -> bool:
+        try:
+            key = self.make_key(path, load_opts)
+        except (TypeError, OSError):
+            return False
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: tuple, gdf) -> None:
+        nbytes = estimate_nbytes(gdf)
+        if nbytes > self.budget_bytes:
+            logger.info(f"Datensatz größer als das Cache-Budget ({nbytes / 1e6:.0f} MB): {key[0]}")
+        with self._lock:
+            # Veraltete Stände derselben Datei entfernen
+            for old in [k for k in self._entries if k[0] == key[0] and k[1:3] != key[1:3]]:
+                del self._entries[old]
+            self._entries[key] = (gdf, nbytes)
+            self._entries.move_to_end(key)
+            # Der gerade geladene Eintrag bleibt (auch wenn er allein das Budget sprengt),
+            # sonst würde er bei jedem Zugriff neu gelesen
+            self._evict(keep=key)
+
+    def track_private(self, owner, name: str, gdf) -> None:
+        """Bearbeitete Kopie einer DatasetRef auf das Budget anrechnen."""
+        nbytes = estimate_nbytes(gdf)
+        with self._lock:
+            self._private[owner] = (name, nbytes)
+            self._evict()
+
+    def untrack_private(self, owner) -> None:
+        with self._lock:
+            self._private.pop(owner, None)
+
+    def _evict(self, keep: Optional[tuple] = None) -> None:
+        """Größte geteilte Einträge zuerst verdrängen, bis das Budget eingehalten ist."""
+        while self.nbytes > self.budget_bytes:
+            candidates = [k for k in self._entries if k != keep]
+            if not candidates:
+                break
+            del self._entries[max(candidates, key=lambda k: self._entries[k][1])]
+            self.evictions += 1
+
+    @property
+    def shared_bytes(self) -> int:
+        return sum(n for _, n in self._entries.values())
+
+    @property
+    def private_bytes(self) -> int:
+        return sum(n for _, n in self._private.values())
+
+    @property
+    def nbytes(self) -> int:
+        return self.shared_bytes + self.private_bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "private": len(self._private),
+                "shared_bytes": self.shared_bytes,
+                "private_bytes": self.private_bytes,
+                "bytes": self.nbytes,
+                "budget_bytes": self.budget_bytes,
+            }
+
+
+DATASET_CACHE = DatasetCache(float(os.environ.get("EINSATZZONEN_CACHE_MB", 2048)))
+
+
+def load_geodataframe_shared(path: str, **load_opts):
+    """
+    Geteilter Datensatz aus dem Cache. Read-only nur per Konvention (nicht erzwungen):
+    Aufrufer dürfen ihn NICHT verändern – Schreibzugriffe über DatasetRef.edit() oder load_geodataframe_raw.
+    """
+    return DATASET_CACHE.get(path, **load_opts)
+
+
+def dataset_cache_stats() -> Dict[str, Any]:
+    return DATASET_CACHE.stats()
+
+
+class DatasetRef:
+    """
+    Verweis auf einen Datensatz im Dataset-Cache – gehört statt des GeoDataFrames in st.session_state.
+    get() liefert das GETEILTE Objekt (nach Verdrängung lazy von der Platte nachgeladen),
+    edit() eine eigene Kopie (Copy-on-Write), die aufs Cache-Budget zählt, bis release().
+    """
+
+    def __init__(self, path: str, cache: Optional[DatasetCache] = None, **load_opts):
+        self.path = os.path.abspath(path)
+        self.name = os.path.basename(path)
+        self.load_opts = load_opts
+        self._key = (self.path, _freeze(load_opts))  # TypeError bei nicht cachebaren Optionen
+        self._cache = cache if cache is not None else DATASET_CACHE
+        self._private = None  # bearbeitete Fassung
+        self.get()  # sofort laden, damit Ladefehler beim Öffnen auftreten
+        _DATASET_REFS.add(self)
+
+    def get(self) -> gpd.GeoDataFrame:
+        """Aktuelle Fassung: bearbeitete Kopie, sonst der geteilte Datensatz (read-only!)."""
+        if self._private is not None:
+            return self._private
+        return self._cache.get(self.path, **self.load_opts)
+
+    def edit(self) -> gpd.GeoDataFrame:
+        """Veränderbare Fassung; die Kopie wird beim ersten Aufruf angelegt."""
+        if self._private is None:
+            self.replace(_private_copy(self.get()))
+        return self._private
+
+    def replace(self, gdf: gpd.GeoDataFrame) -> None:
+        """Setzt die bearbeitete Fassung (z.B. nach rename/drop, die ein neues Objekt liefern)."""
+        self._private = gdf
+        self._cache.track_private(self, self.name, gdf)
+
+    def release(self) -> None:
+        """Bearbeitete Kopie verwerfen; danach gilt wieder der Stand auf der Platte."""
+        self._private = None
+        self._cache.untrack_private(self)
+
+    @property
+    def modified(self) -> bool:
+        return self._private is not None
+
+    def __len__(self) -> int:
+        return len(self.get())
+
+
+# Alle lebenden Referenzen (Sessions), nur für das Speicher-Panel
+_DATASET_REFS: "weakref.WeakSet[DatasetRef]" = weakref.WeakSet()
+
+
+def dataset_memory_report(cache: Optional[DatasetCache] = None) -> pd.DataFrame:
+    """Speicherübersicht: geteilte Cache-Einträge (mit Anzahl Referenzen) und bearbeitete Kopien."""
+    cache = cache if cache is not None else DATASET_CACHE
+    refs = [r for r in list(_DATASET_REFS) if r._cache is cache and not r.modified]
+    with cache._lock:
+        entries = [(k, n) for k, (_, n) in cache._entries.items()]
+        private = list(cache._private.values())
+
+    rows = []
+    for key, nbytes in entries:
+        users = sum(1 for r in refs if r._key == (key[0], key[3]))
+        rows.append({"Datei": os.path.basename(key[0]), "Art": "geteilt", "MB": nbytes / 1e6, "Referenzen": users})
+    for name, nbytes in private:
+        rows.append({"Datei": name, "Art": "Kopie (bearbeitet)", "MB": nbytes / 1e6, "Referenzen": 1})
+    return pd.DataFrame(rows, columns=["Datei", "Art", "MB", "Referenzen"])
+
+
+# --- 8. RÄUMLICHE ZUWEISUNG ---
+def assign_by_polygons(
+    zones: gpd.GeoDataFrame,
+    polygons: gpd.GeoDataFrame,
+    value_col: str,
+    method: str = "point"
+) -> pd.Series:
+    """
+    Ordnet jeder Zone den Wert `value_col` eines Polygons zu (ein STRtree-Bulk-Query).
+    method="point": Polygon, das den repräsentativen Punkt der Zone enthält.
+    method="overlap": Polygon mit der größten Überlappungsfläche.
+    Bei Gleichstand gewinnt das erste Polygon. Ohne Treffer: NaN. Index wie `zones`.
+    """
+    if method not in ("point", "overlap"):
+        raise ValueError(f"Unbekannte Methode: {method}")
+    result = pd.Series(np.nan, index=zones.index, dtype=object)
+    if zones.empty or polygons.empty:
+        return result
+
+    if polygons.crs is not None and zones.crs is not None and polygons.crs != zones.crs:
+        polygons = polygons.to_crs(zones.crs)
+    poly_geoms = np.asarray(polygons.geometry.values, dtype=object)
+    zone_geoms = np.asarray(zones.geometry.values, dtype=object)
+
+    if method == "point":
+        tree = shapely.STRtree(poly_geoms)
+        zone_idx, poly_idx = tree.query(shapely.point_on_surface(zone_geoms), predicate="intersects")
+        score = np.zeros(len(zone_idx))
+    else:
+        # intersection wirft bei ungültigen Flächen -> vorher selektiv reparieren
+        zone_geoms = _repair_array(zone_geoms)[0]
+        poly_geoms = _repair_array(poly_geoms)[0]
+        tree = shapely.STRtree(poly_geoms)
+        zone_idx, poly_idx = tree.query(zone_geoms, predicate="intersects")
+        score = shapely.area(shapely.intersection(zone_geoms[zone_idx], poly_geoms[poly_idx]))
+        keep = score > 0
+        zone_idx, poly_idx, score = zone_idx[keep], poly_idx[keep], score[keep]
+
+    # Je Zone bester Treffer: höchste Fläche, dann kleinster Polygon-Index
+    order = np.lexsort((poly_idx, -score, zone_idx))
+    zone_idx, poly_idx = zone_idx[order], poly_idx[order]
+    first = np.unique(zone_idx, return_index=True)[1]
+    values = polygons[value_col].to_numpy(dtype=object)
+    result.iloc[zone_idx[first]] = values[poly_idx[first]]
+    return result
+
+
+# --- 9. SPLIT-ENGINE ---
+def _write_group(
+    gdf: gpd.GeoDataFrame,
+    idx: np.ndarray,
+    out_path: str,
+    dissolve_by: Optional[str]
+) -> int:
+    sub = gdf.iloc[idx]
+    if dissolve_by:
+        try:
+            sub = dissolve_zones(sub, dissolve_by)
+        except Exception as e:
+            # Wenn dissolve knallt, speichern wir ohne
+            logger.warning(f"Dissolve fehlgeschlagen ({out_path}): {e}")
+    sub.to_file(out_path, driver="GeoJSON")
+    return len(sub)
+
+
+def _unique_paths(values: List[Any], paths: List[str]) -> List[str]:
+    """Gleiche Zielpfade für verschiedene Werte (z.B. nach Bereinigung des Dateinamens) eindeutig machen."""
+    used = set()
+    unique = []
+    for value, path in zip(values, paths):
+        candidate = path
+        key = os.path.normcase(os.path.abspath(candidate))
+        if key in used:
+            root, ext = os.path.splitext(path)
+            digest = hashlib.sha1(repr(value).encode("utf-8")).hexdigest()[:8]
+            candidate, n = f"{root}__{digest}{ext}", 1
+            while os.path.normcase(os.path.abspath(candidate)) in used:
+                n += 1
+                candidate = f"{root}__{digest}_{n}{ext}"
+            logger.warning(f"Dateiname doppelt ({os.path.basename(path)}), '{value}' -> {os.path.basename(candidate)}")
+            key = os.path.normcase(os.path.abspath(candidate))
+        used.add(key)
+        unique.append(candidate)
+    return unique
+
+
+def split_to_files(
+    gdf: gpd.GeoDataFrame,
+    by,
+    path_for: Callable[[Any], str],
+    dissolve_by: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    progress_cb: Optional[Callable[[int, int, Any], None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Schreibt eine Datei pro Wert von `by` (Spaltenname oder Werte je Zeile, fehlende Werte
+    werden übersprungen). Gruppen-Indizes entstehen in einem groupby-Durchlauf; Teilmengen,
+    Dissolve und Schreiben laufen in einem Thread-Pool. Es sind höchstens 2 * max_workers
+    Gruppen gleichzeitig im Speicher. progress_cb(done, total, wert) je fertiger Gruppe.
+    Liefert path_for für verschiedene Werte denselben Pfad, bekommen die späteren ein Hash-Suffix.
+    Rückgabe in Reihenfolge des ersten Auftretens: [{"value", "path", "features"}].
+    """
+    keys = gdf[by] if isinstance(by, str) else pd.Series(np.asarray(by, dtype=object), index=gdf.index)
+    groups = keys.groupby(keys, sort=False, dropna=True).indices if len(keys) else {}
+    total = len(groups)
+    results: List[Optional[Dict[str, Any]]] = [None] * total
+    if not total:
+        return []
+
+    paths = _unique_paths(list(groups), [path_for(value) for value in groups])
+    workers = max_workers or min(total, os.cpu_count() or 2)
+    max_pending = 2 * workers
+    done = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def collect(return_when):
+            nonlocal done
+            finished, _ = concurrent.futures.wait(pending, return_when=return_when)
+            for fut in finished:
+                i, value, out_path = pending.pop(fut)
+                results[i] = {"value": value, "path": out_path, "features": fut.result()}
+                done += 1
+                if progress_cb:
+                    progress_cb(done, total, value)
+
+        try:
+            for i, (value, idx) in enumerate(groups.items()):
+                out_path = paths[i]
+                pending[pool.submit(_write_group, gdf, idx, out_path, dissolve_by)] = (i, value, out_path)
+                if len(pending) >= max_pending:
+                    collect(concurrent.futures.FIRST_COMPLETED)
+            collect(concurrent.futures.ALL_COMPLETED)
+        except BaseException:
+            for fut in pending:
+                fut.cancel()
+            raise
+    return results
+
+
+# --- 10. SPALTEN-PROFIL ---
+PROFILE_SAMPLE_ROWS = 50_000  # ab dieser Größe: Distinct/Komma-Check auf Stichprobe
+
+_PROFILE_CACHE: Dict[int, Tuple[Any, Dict[tuple, pd.DataFrame]]] = {}
+_PROFILE_LOCK = threading.Lock()
+
+
+def estimate_distinct(sample: pd.Series, population: int) -> int:
+    """
+    Distinct-Schätzung aus einer Stichprobe (Duj1, Haas et al. 1995):
+    d / (1 - (1 - n/N) * f1/n), f1 = nur einmal gesehene Werte. Exakt für n = N.
+    """
+    n = len(sample)
+    if n == 0 or population <= 0:
+        return 0
+    freq = sample.value_counts(dropna=True)
+    d = len(freq)
+    f1 = int((freq == 1).sum())
+    denom = 1 - (1 - n / population) * f1 / n
+    estimate = d / denom if denom > 0 else population
+    return int(round(min(max(estimate, d), population)))
+
+
+def _hashable(series: pd.Series) -> pd.Series:
+    # Listen/Dicts (z.B. aus GeoJSON-Arrays) sind nicht hashbar -> als Text zählen
+    return series.map(lambda v: str(v) if isinstance(v, (list, dict, set)) else v)
+
+
+def _nunique(values: pd.Series) -> int:
+    try:
+        return int(values.nunique())
+    except TypeError:
+        return int(_hashable(values).nunique())
+
+
+def _distinct(sample: pd.Series, population: int, sampled: bool) -> int:
+    if not sampled:
+        return _nunique(sample)
+    try:
+        return estimate_distinct(sample, population)
+    except TypeError:
+        return estimate_distinct(_hashable(sample), population)
+
+
+def column_stats(series: pd.Series) -> Dict[str, Any]:
+    """Exakte Statistik einer Spalte (für die ausgewählte Spalte auf Anfrage)."""
+    values = series.dropna()
+    first = series.first_valid_index()
+    return {
+        "dtype": str(series.dtype),
+        "non_null": int(len(values)),
+        "missing": int(len(series) - len(values)),
+        "unique": _nunique(values),
+        "unique_approx": False,
+        "has_comma": bool(values.astype(str).str.contains(",", regex=False).any()),
+        "example": series.loc[first] if first is not None else None,
+    }
+
+
+def _profile(gdf: pd.DataFrame, sample_rows: Optional[int], seed: int) -> pd.DataFrame:
+    geom_col = gdf._geometry_column_name if isinstance(gdf, gpd.GeoDataFrame) else None
+    cols = [c for c in gdf.columns if c not in (geom_col, "geometry")]
+    n = len(gdf)
+    sampled = bool(sample_rows) and n > sample_rows
+    # Eine gemeinsame Zeilen-Stichprobe für alle Spalten
+    positions = np.sort(np.random.default_rng(seed).choice(n, sample_rows, replace=False)) if sampled else None
+    rows = {}
+    for col in cols:
+        series = gdf[col]
+        non_null = int(series.count())
+        sample = (series.iloc[positions] if sampled else series).dropna()
+        first = series.first_valid_index()
+        rows[col] = {
+            "dtype": str(series.dtype),
+            "non_null": non_null,
+            "missing": n - non_null,
+            "unique": _distinct(sample, non_null, sampled),
+            "unique_approx": sampled,
+            "has_comma": bool(sample.astype(str).str.contains(",", regex=False).any()),
+            "example": series.loc[first] if first is not None else None,
+        }
+    return pd.DataFrame.from_dict(rows, orient="index", columns=[
+        "dtype", "non_null", "missing", "unique", "unique_approx", "has_comma", "example"
+    ])
+
+
+def _drop_profiles(key: int) -> None:
+    with _PROFILE_LOCK:
+        _PROFILE_CACHE.pop(key, None)
+
+
+def profile_columns(
+    gdf: pd.DataFrame,
+    sample_rows: Optional[int] = PROFILE_SAMPLE_ROWS,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    Profil aller Attributspalten (Index = Spaltenname): dtype, non_null, missing, unique,
+    unique_approx, has_comma, example (erster Nicht-Null-Wert).
+    non_null/missing sind immer exakt; unique/has_comma ab `sample_rows` Zeilen aus einer
+    Stichprobe (unique_approx=True). Memoisiert je geladenem Datensatz (Objekt), der Eintrag
+    verschwindet mit dem Datensatz. Den Datensatz danach nicht verändern.
+    """
+    key = id(gdf)
+    variant = (sample_rows, seed, len(gdf), tuple(gdf.columns))
+    with _PROFILE_LOCK:
+        entry = _PROFILE_CACHE.get(key)
+        if entry is not None and entry[0]() is gdf and variant in entry[1]:
+            return entry[1][variant]
+
+    profile = _profile(gdf, sample_rows, seed)
+    with _PROFILE_LOCK:
+        entry = _PROFILE_CACHE.get(key)
+        if entry is None or entry[0]() is not gdf:
+            entry = (weakref.ref(gdf), {})
+            _PROFILE_CACHE[key] = entry
+            weakref.finalize(gdf, _drop_profiles, key)
+        entry[1][variant] = profile
+    return profile
+
+
+# --- 11. TAG-WERTE (TABELLE <-> JSON) ---
+def is_missing(v) -> bool:
+    if v is None or v is pd.NA or v is pd.NaT:
+        return True
+    return isinstance(v, (float, np.floating)) and np.isnan(v)
+
+
+def to_json_value(v):
+    """Tabellenwert -> JSON-Wert (numpy/pandas-Typen auflösen, auch in Listen aus pyogrio-Arrays)."""
+    if isinstance(v, np.ndarray):
+        v = v.tolist()
+    if isinstance(v, (list, tuple)):
+        return [to_json_value(x) for x in v]
+    if isinstance(v, dict):
+        return {k: to_json_value(x) for k, x in v.items()}
+    if is_missing(v):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.isoformat()
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+def same_value(orig, value) -> bool:
+    """Entspricht der Tabellenwert noch dem Originalwert? (Typen wie beim Einlesen durch GDAL)"""
+    if is_missing(value):
+        return orig is None
+    try:
+        if isinstance(value, pd.Timestamp) and isinstance(orig, str):
+            return pd.Timestamp(orig) == value
+        value = to_json_value(value)
+        if isinstance(orig, (dict, list)) and isinstance(value, str):
+            return json.loads(value) == orig
+        return bool(orig == value)
+    except Exception:
+        return False
+
+
+def _like_original(orig, value):
+    # Integer-Spalten mit Lücken werden in pandas zu float: 7.0 -> 7, wenn das Original ein int war
+    if (isinstance(orig, int) and not isinstance(orig, bool)
+            and isinstance(value, float) and value.is_integer()):
+        return int(value)
+    return value
+
+
+def build_property_update(gdf: pd.DataFrame) -> Callable[[int, Dict[str, Any]], Dict[str, Any]]:
+    """
+    update(i, properties) für rewrite_properties: unveränderte Werte bleiben exakt wie im
+    Original (auch 5 statt 5.0), geänderte/neue Spalten kommen aus der Tabelle,
+    gelöschte Tags entfallen.
+    """
+    geom_col = gdf._geometry_column_name if isinstance(gdf, gpd.GeoDataFrame) else None
+    attrs = pd.DataFrame(gdf.drop(columns=geom_col) if geom_col in gdf.columns else gdf)
+    columns = list(attrs.columns)
+    col_pos = {c: j for j, c in enumerate(columns)}
+    values = attrs.to_numpy(dtype=object)
+
+    def update(i, props):
+        if i >= len(values):
+            raise ValueError("Datei enthält mehr Features als die Tabelle.")
+        row = values[i]
+        new = {}
+        for key, orig in props.items():
+            if key in col_pos:
+                value = row[col_pos[key]]
+                new[key] = orig if same_value(orig, value) else _like_original(orig, to_json_value(value))
+        for col in columns:
+            if col not in props and not is_missing(row[col_pos[col]]):
+                new[col] = to_json_value(row[col_pos[col]])
+        return new
+
+    return update
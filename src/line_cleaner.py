@@ -0,0 +1,574 @@
+"""
+Kern des Linien-Bereinigers (pages/13_Linien_bereinigen.py).
+
+Liegt in src, damit Worker-Prozesse (ProcessPoolExecutor, auch mit "spawn" unter Windows)
+die Funktionen importieren können. Enthält den Segment-Filter, Simplify je UTM-Zone,
+das Streaming über ganze Dateien sowie die parallelen Batch-Modi.
+"""
+import bisect
+import concurrent.futures
+import logging
+import math
+import os
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.geojson_stream import FeatureCollectionReader, FeatureCollectionWriter
+
+# Optional geometry tooling
+try:
+    import shapely
+    from shapely.geometry import LineString, MultiLineString
+    from shapely.geometry import mapping
+
+    SHAPELY_AVAILABLE = True
+except Exception:
+    SHAPELY_AVAILABLE = False
+
+try:
+    from pyproj import CRS, Transformer
+
+    PYPROJ_AVAILABLE = True
+except Exception:
+    PYPROJ_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000  # mean Earth radius in meters
+SCALAR_PROBE = 4  # Kandidaten hinter einem kurzen Segment, die ohne Numpy geprüft werden
+SEARCH_WINDOW = 64  # Startgröße der Suchfenster (verdoppelt sich bei Bedarf)
+FEATURE_CHUNK = 2000  # Features pro Bulk-Verarbeitung (Simplify je UTM-Zone)
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Great-circle distance between lon/lat points in meters (vectorized, broadcasting)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def ensure_min_points(coords: List[List[float]]) -> List[List[float]]:
+    if len(coords) >= 2:
+        return coords
+    if not coords:
+        return []
+    # Duplicate first point if only one remains to avoid degenerating
+    return [coords[0], coords[-1]]
+
+
+def _lonlat(coords: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    try:
+        xy = np.asarray(coords, dtype=float)[:, :2]
+    except ValueError:  # gemischte 2D/3D-Punkte
+        xy = np.array([(pt[0], pt[1]) for pt in coords], dtype=float)
+    return xy[:, 0], xy[:, 1]
+
+
+def _far_point_search(lon: np.ndarray, lat: np.ndarray, a_lon: float, a_lat: float, start: int, min_seg_m: float) -> int:
+    """Erster Index >= start mit Abstand >= min_seg_m zum Anker, fensterweise (len(lon), falls keiner)."""
+    n = len(lon)
+    window = SEARCH_WINDOW
+    while start < n:
+        end = min(n, start + window)
+        dist = haversine_m(a_lon, a_lat, lon[start:end], lat[start:end])
+        hit = np.flatnonzero(dist >= min_seg_m)
+        if hit.size:
+            return start + int(hit[0])
+        start = end
+        window *= 2
+    return n
+
+
+def kept_indices(lon: np.ndarray, lat: np.ndarray, min_seg_m: float, keep_ends: bool) -> np.ndarray:
+    """
+    Indizes der Punkte, die der sequenzielle Filter behält (Abstand zum zuletzt behaltenen
+    Punkt >= min_seg_m). Solange alle Folgeabstände reichen, bleiben Punkte ohne Suche erhalten;
+    nur nach einem zu kurzen Segment wird ab dem Anker weitergesucht (erst skalar, dann fensterweise).
+    """
+    n = len(lon)
+    if n < 2:
+        return np.arange(n)
+
+    consecutive = haversine_m(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    short = np.flatnonzero(~(consecutive >= min_seg_m)) + 1  # Punkt zu nah am Vorgänger (auch NaN)
+    if not short.size:
+        return np.arange(n)
+
+    # Luftlinie <= Weglänge: Punkte, deren Weglänge ab dem Anker unter min_seg_m liegt,
+    # sind sicher zu nah und werden ohne Distanzberechnung übersprungen (kleine Toleranz für Rundung).
+    path = np.concatenate(([0.0], np.cumsum(consecutive)))
+    path_l = path.tolist() if np.isfinite(path[-1]) else None
+    reach = min_seg_m * (1 - 1e-9) - 1e-9
+
+    # Verworfene Bereiche [k, j) sammeln, Maske am Ende in einem Schritt
+    drop_from, drop_to = [], []
+    short_l = short.tolist()
+    lam, phi = np.radians(lon), np.radians(lat)
+    lam_l, phi_l, cos_l = lam.tolist(), phi.tolist(), np.cos(phi).tolist()
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    diameter = 2 * EARTH_RADIUS_M
+    i = 0
+    while i < len(short_l):
+        k = short_l[i]  # Vorgänger k-1 ist behalten
+        a_lam, a_phi, a_cos = lam_l[k - 1], phi_l[k - 1], cos_l[k - 1]
+        j = k
+        if path_l is not None:
+            j = max(k, bisect.bisect_left(path_l, path_l[k - 1] + reach, k))
+        stop = min(n, j + SCALAR_PROBE)
+        while j < stop:
+            h = sin((phi_l[j] - a_phi) / 2) ** 2 + a_cos * cos_l[j] * sin((lam_l[j] - a_lam) / 2) ** 2
+            if diameter * asin(sqrt(h)) >= min_seg_m:
+                break
+            j += 1
+        if j == stop and j < n:
+            j = _far_point_search(lon, lat, lon[k - 1], lat[k - 1], j, min_seg_m)
+        drop_from.append(k)
+        drop_to.append(j)
+        if j >= n:
+            break
+        i = bisect.bisect_right(short_l, j, i)
+
+    delta = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(delta, drop_from, 1)
+    np.add.at(delta, drop_to, -1)
+    keep = np.cumsum(delta[:-1]) == 0
+    if keep_ends:
+        keep[-1] = True
+    return np.flatnonzero(keep)
+
+
+def clean_linestring(
+    coords: List[List[float]], min_seg_m: float, keep_ends: bool = True
+) -> Tuple[List[List[float]], int, int]:
+    """Remove consecutive points closer than min_seg_m (meters). Returns cleaned coords and point counts."""
+    if not coords:
+        return [], 0, 0
+
+    lon, lat = _lonlat(coords)
+    kept = [coords[i] for i in kept_indices(lon, lat, min_seg_m, keep_ends)]
+    cleaned = ensure_min_points(kept)
+    return cleaned, len(coords), len(cleaned)
+
+
+def infer_utm_epsg(lon: float, lat: float) -> int:
+    zone = int((lon + 180) // 6) + 1
+    north = lat >= 0
+    return 32600 + zone if north else 32700 + zone
+
+
+@lru_cache(maxsize=None)
+def utm_transformers(epsg: int):
+    """(WGS84 -> UTM, UTM -> WGS84), einmal pro Zone erzeugt."""
+    target_crs = CRS.from_epsg(epsg)
+    return (
+        Transformer.from_crs("EPSG:4326", target_crs, always_xy=True),
+        Transformer.from_crs(target_crs, "EPSG:4326", always_xy=True),
+    )
+
+
+def _coord_fn(transformer):
+    def fn(coords: np.ndarray) -> np.ndarray:
+        out = coords.copy()
+        out[:, 0], out[:, 1] = transformer.transform(coords[:, 0], coords[:, 1])
+        return out
+    return fn
+
+
+def simplify_lines(lines: List[Any], simplify_m: float) -> List[Any]:
+    """
+    Douglas-Peucker in Metern für viele Linien auf einmal: je UTM-Zone (nach Startpunkt)
+    ein Bulk-Transform, ein vektorisiertes simplify und ein Rück-Transform.
+    Liefert pro Linie das Ergebnis oder None (nicht vereinfacht).
+    """
+    result: List[Any] = [None] * len(lines)
+    if not SHAPELY_AVAILABLE or not PYPROJ_AVAILABLE or simplify_m <= 0:
+        return result
+
+    by_zone: Dict[int, List[int]] = {}
+    for idx, line in enumerate(lines):
+        if line is None or line.is_empty:
+            continue
+        lon, lat = line.coords[0][:2]
+        by_zone.setdefault(infer_utm_epsg(lon, lat), []).append(idx)
+
+    for epsg, idxs in by_zone.items():
+        try:
+            to_utm, to_wgs = utm_transformers(epsg)
+            arr = np.array([lines[i] for i in idxs], dtype=object)
+            projected = shapely.transform(arr, _coord_fn(to_utm), include_z=None)
+            simplified = shapely.simplify(projected, simplify_m, preserve_topology=False)
+            restored = shapely.transform(simplified, _coord_fn(to_wgs), include_z=None)
+        except Exception:
+            continue
+        for i, geom in zip(idxs, restored):
+            if geom is not None and geom.geom_type == "LineString" and len(geom.coords) >= 2:
+                result[i] = geom
+    return result
+
+
+def process_geometries(
+    geometries: List[Dict[str, Any]], min_seg_m: float, simplify_m: float, keep_ends: bool
+) -> List[Tuple[Dict[str, Any], Dict[str, int]]]:
+    """Bereinigt eine Liste von GeoJSON-Geometrien; Simplify läuft gebündelt über alle Linien."""
+    # 1. Kurze Segmente entfernen (pro Linie vektorisiert)
+    parts = []  # je Geometrie: Liste von (cleaned, pin, pout)
+    for geometry in geometries:
+        gtype = geometry.get("type")
+        if gtype == "LineString":
+            lines = [geometry.get("coordinates", [])]
+        elif gtype == "MultiLineString":
+            lines = geometry.get("coordinates", [])
+        else:
+            lines = []
+        parts.append([clean_linestring(coords, min_seg_m, keep_ends) for coords in lines])
+
+    # 2. Optional: Simplify für alle Linien gebündelt
+    flat = [item for items in parts for item in items]
+    simplified = [None] * len(flat)
+    if simplify_m > 0 and SHAPELY_AVAILABLE:
+        line_objs = []
+        for cleaned, _, _ in flat:
+            try:
+                line_objs.append(LineString(cleaned))
+            except Exception:
+                line_objs.append(None)
+        simplified = simplify_lines(line_objs, simplify_m)
+
+    # 3. Ergebnis-Geometrien und Statistik
+    results = []
+    pos = 0
+    for geometry, items in zip(geometries, parts):
+        stats = {
+            "lines": 0,
+            "points_in": 0,
+            "points_out": 0,
+            "changed": 0,
+        }
+        out_lines = []
+        changed_any = False
+        for cleaned, pin, pout in items:
+            stats["lines"] += 1
+            stats["points_in"] += pin
+            simple = simplified[pos]
+            pos += 1
+            if simple is not None:
+                new_coords = [list(pt) for pt in simple.coords]
+                stats["points_out"] += len(new_coords)
+                changed_any = changed_any or pin != len(new_coords) or pin != pout
+            else:
+                new_coords = cleaned
+                stats["points_out"] += pout
+                changed_any = changed_any or pin != pout
+            out_lines.append(new_coords)
+
+        gtype = geometry.get("type")
+        if gtype == "LineString":
+            stats["changed"] += int(changed_any)
+            results.append(({"type": "LineString", "coordinates": out_lines[0]}, stats))
+        elif gtype == "MultiLineString":
+            stats["changed"] += int(changed_any)
+            results.append(({"type": "MultiLineString", "coordinates": out_lines}, stats))
+        else:
+            results.append((geometry, stats))
+    return results
+
+
+def process_geometry(
+    geometry: Dict[str, Any], min_seg_m: float, simplify_m: float, keep_ends: bool
+) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    return process_geometries([geometry], min_seg_m, simplify_m, keep_ends)[0]
+
+
+# --- STREAMING ÜBER DATEIEN ---
+PREVIEW_FEATURES = 3
+STAT_KEYS = ("features_total", "lines_total", "points_in_total", "points_out_total", "features_changed")
+
+
+def empty_stats() -> Dict[str, int]:
+    return {key: 0 for key in STAT_KEYS}
+
+
+def add_stats(total: Dict[str, int], part: Dict[str, int]) -> Dict[str, int]:
+    """Summiert Teil-Statistiken (pro Datei/Chunk) in `total`."""
+    for key in STAT_KEYS:
+        total[key] += part.get(key, 0)
+    return total
+
+
+def line_geometry(geom: Dict[str, Any]):
+    """Shapely-Linie aus einem GeoJSON-Geometrie-Dict (None für andere Typen)."""
+    gtype = geom.get("type")
+    coords = geom.get("coordinates")
+    try:
+        if gtype == "LineString":
+            return LineString(coords)
+        if gtype == "MultiLineString":
+            return MultiLineString(coords)
+    except Exception:
+        return None
+    return None
+
+
+# --- UNION (RÄUMLICH PARTITIONIERT) ---
+UNION_PARTITION_SIZE = 5000  # Linien pro Gitterzelle (Richtwert)
+SEAM_TOLERANCE = 1e-9  # relativ zur Koordinatengröße
+_LINESTRING_TYPE_ID = 1
+
+
+def _grid_partitions(geoms: np.ndarray, per_partition: int) -> List[np.ndarray]:
+    """Teilt Linien nach dem Mittelpunkt ihrer Bounding-Box auf ein k x k Gitter auf."""
+    n = len(geoms)
+    k = max(1, int(math.ceil(math.sqrt(n / max(1, per_partition)))))
+    if k == 1:
+        return [np.arange(n)]
+    bounds = shapely.bounds(geoms)
+    cx = (bounds[:, 0] + bounds[:, 2]) / 2
+    cy = (bounds[:, 1] + bounds[:, 3]) / 2
+    minx, maxx, miny, maxy = np.nanmin(cx), np.nanmax(cx), np.nanmin(cy), np.nanmax(cy)
+    ix = np.clip(((cx - minx) / ((maxx - minx) or 1.0) * k).astype(int), 0, k - 1)
+    iy = np.clip(((cy - miny) / ((maxy - miny) or 1.0) * k).astype(int), 0, k - 1)
+    cell = iy * k + ix
+    order = np.argsort(cell, kind="stable")
+    _, starts = np.unique(cell[order], return_index=True)
+    return np.split(order, starts[1:])
+
+
+def _line_parts(geom) -> np.ndarray:
+    parts = shapely.get_parts(geom)
+    return parts[shapely.get_type_id(parts) == _LINESTRING_TYPE_ID]
+
+
+def _union_partition(geoms: np.ndarray) -> np.ndarray:
+    return _line_parts(shapely.line_merge(shapely.union_all(geoms)))
+
+
+def union_lines_partitioned(
+    line_geoms: List[Any],
+    per_partition: int = UNION_PARTITION_SIZE,
+    max_workers: Optional[int] = None,
+    progress_cb: Optional[Callable[[int, int, str], None]] = None
+):
+    """
+    Union + line_merge großer Liniennetze, räumlich partitioniert:
+    1. Linien auf ein Gitter verteilen, jede Partition parallel vereinigen und zusammenführen.
+    2. Teilstücke, die Stücke anderer Partitionen schneiden/berühren (STRtree), gemeinsam
+       erneut vereinigen (Naht-Noding), alle übrigen unverändert übernehmen.
+    3. Ein line_merge über das nun vollständig genodete Netz: nur so sieht jeder Knoten an der
+       Naht seinen echten Grad (sonst würden Äste über Verzweigungen hinweg verbunden).
+    Ergebnis entspricht line_merge(union_all) bis auf Rundungsdifferenzen beim Noding.
+    progress_cb(done, total, label) nach jeder Partition und nach der Naht.
+    """
+    geoms = np.asarray(line_geoms, dtype=object)
+    partitions = _grid_partitions(geoms, per_partition)
+    total = len(partitions) + 1
+
+    if len(partitions) == 1:
+        pieces = _union_partition(geoms)
+        if progress_cb:
+            progress_cb(total, total, "Union")
+        return shapely.multilinestrings(pieces)
+
+    results: List[Optional[np.ndarray]] = [None] * len(partitions)
+    workers = max_workers or min(len(partitions), os.cpu_count() or 2)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_union_partition, geoms[idx]): i for i, idx in enumerate(partitions)}
+        for done, fut in enumerate(concurrent.futures.as_completed(futures), start=1):
+            i = futures[fut]
+            results[i] = fut.result()
+            if progress_cb:
+                progress_cb(done, total, f"Partition {i + 1}/{len(partitions)}")
+
+    # Naht: nur Stücke mit Kontakt zu anderen Partitionen neu vereinigen.
+    # Vorfilter: nur Stücke im Überlappungsbereich der Partitions-Ausdehnungen kommen in den STRtree.
+    pieces = np.concatenate(results)
+    owner = np.repeat(np.arange(len(results)), [len(r) for r in results])
+    pb = shapely.bounds(pieces)
+    # Toleranz statt "intersects": nach dem Noding liegen deckungsgleiche Segmente verschiedener
+    # Partitionen teils nur fast aufeinander und würden sonst nicht erneut vereinigt.
+    tol = SEAM_TOLERANCE * max(1.0, float(np.abs(pb).max()))
+    candidate = np.zeros(len(pieces), dtype=bool)
+    for j, res in enumerate(results):
+        if not len(res):
+            continue
+        jb = shapely.total_bounds(res) + np.array([-tol, -tol, tol, tol])
+        candidate |= (owner != j) & (pb[:, 0] <= jb[2]) & (pb[:, 2] >= jb[0]) & (pb[:, 1] <= jb[3]) & (pb[:, 3] >= jb[1])
+    cand_idx = np.flatnonzero(candidate)
+    cand = pieces[cand_idx]
+    left, right = shapely.STRtree(cand).query(cand, predicate="dwithin", distance=tol)
+    cross = owner[cand_idx[left]] != owner[cand_idx[right]]
+    border = np.zeros(len(pieces), dtype=bool)
+    border[cand_idx[left[cross]]] = True
+    border[cand_idx[right[cross]]] = True
+
+    # Naht nur noden; zusammengeführt wird danach global, weil Naht-Stücke Knoten mit
+    # Nicht-Naht-Stücken derselben Partition teilen
+    noded = _line_parts(shapely.union_all(pieces[border])) if border.any() else pieces[:0]
+    merged = shapely.multilinestrings(_line_parts(shapely.line_merge(shapely.multilinestrings(np.concatenate([pieces[~border], noded])))))
+    if progress_cb:
+        progress_cb(total, total, "Nahtstellen")
+    return merged
+
+
+def union_lines(line_geoms: List[Any], warnings: List[str], progress_cb=None):
+    """Fasst Linien zu einem Feature zusammen (None, falls leer/fehlgeschlagen)."""
+    try:
+        merged = union_lines_partitioned(line_geoms, progress_cb=progress_cb)
+        if merged.is_empty:
+            warnings.append("Union der Linien ist leer – übersprungen.")
+            return None
+        return {"type": "Feature", "properties": {}, "geometry": mapping(merged)}
+    except Exception as exc:
+        warnings.append(f"Union der Linien fehlgeschlagen: {exc}")
+        return None
+
+
+def _clean_chunk(geometries: List[Dict[str, Any]], min_seg_m: float, simplify_m: float, keep_ends: bool):
+    return process_geometries(geometries, min_seg_m=min_seg_m, simplify_m=simplify_m, keep_ends=keep_ends)
+
+
+def clean_feature_file(
+    source,
+    target,
+    min_seg_m: float,
+    simplify_m: float = 0.0,
+    keep_ends: bool = True,
+    merge_features: bool = False,
+    executor: Optional[concurrent.futures.Executor] = None,
+    max_pending: int = 4,
+    chunk_size: int = FEATURE_CHUNK,
+    union_progress_cb: Optional[Callable[[int, int, str], None]] = None
+) -> Tuple[Dict[str, int], List[Dict[str, Any]], List[str]]:
+    """
+    Liest die FeatureCollection feature-weise, bereinigt blockweise und schreibt direkt nach `target`.
+    Mit `executor` werden die Blöcke einer großen Datei parallel bereinigt (höchstens
+    `max_pending` Blöcke gleichzeitig, Ausgabe in Original-Reihenfolge).
+    Nur bei `merge_features` werden die Liniengeometrien für die Union gesammelt
+    (Fortschritt je Partition über union_progress_cb).
+    Rückgabe: (Statistik, Vorschau der ersten Features, Warnungen).
+    """
+    aggregate = empty_stats()
+    preview: List[Dict[str, Any]] = []
+    warnings: List[str] = []
+    do_union = merge_features and SHAPELY_AVAILABLE
+    if merge_features and not SHAPELY_AVAILABLE:
+        warnings.append("Shapely ist nicht verfügbar; Zusammenfassung wird übersprungen.")
+    line_geoms = []
+    line_features = []
+
+    def emit(feature: Dict[str, Any]):
+        writer.write(feature)
+        if len(preview) < PREVIEW_FEATURES:
+            preview.append(feature)
+
+    def submit(chunk: List[Dict[str, Any]]):
+        with_geom = [f for f in chunk if f.get("geometry")]
+        args = ([f["geometry"] for f in with_geom], min_seg_m, simplify_m, keep_ends)
+        if executor is None:
+            return chunk, with_geom, _clean_chunk(*args)
+        return chunk, with_geom, executor.submit(_clean_chunk, *args)
+
+    def finish(chunk, with_geom, results):
+        if isinstance(results, concurrent.futures.Future):
+            results = results.result()
+        for feature, (new_geom, geom_stats) in zip(with_geom, results):
+            aggregate["lines_total"] += geom_stats["lines"]
+            aggregate["points_in_total"] += geom_stats["points_in"]
+            aggregate["points_out_total"] += geom_stats["points_out"]
+            aggregate["features_changed"] += geom_stats["changed"]
+            feature["geometry"] = new_geom
+
+        for feature in chunk:
+            if do_union and feature.get("geometry"):
+                line = line_geometry(feature["geometry"])
+                if line is not None:
+                    line_geoms.append(line)
+                    line_features.append(feature)
+                    continue
+            emit(feature)
+
+    reader = FeatureCollectionReader(source)
+    writer = FeatureCollectionWriter(target)
+    try:
+        pending = deque()
+        chunk: List[Dict[str, Any]] = []
+        for feature in reader:
+            aggregate["features_total"] += 1
+            chunk.append(feature)
+            if len(chunk) >= chunk_size:
+                pending.append(submit(chunk))
+                chunk = []
+                if len(pending) >= max_pending or executor is None:
+                    finish(*pending.popleft())
+        if chunk:
+            pending.append(submit(chunk))
+        while pending:
+            finish(*pending.popleft())
+
+        if line_geoms:
+            merged_feature = union_lines(line_geoms, warnings, progress_cb=union_progress_cb)
+            # Fallback wie bisher: ohne gültige Union bleiben die Einzel-Linien erhalten
+            for feature in [merged_feature] if merged_feature else line_features:
+                emit(feature)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close(reader.members)
+    return aggregate, preview, warnings
+
+
+def default_workers() -> int:
+    return max(1, min(8, (os.cpu_count() or 2) - 1))
+
+
+def clean_files_parallel(
+    jobs: List[Tuple[str, str]],
+    max_workers: Optional[int] = None,
+    progress_cb: Optional[Callable[[int, int, str, Dict[str, int]], None]] = None,
+    **options
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """
+    Bereinigt mehrere Dateien (Quelle, Ziel) parallel in einem Prozess-Pool; jeder Worker
+    streamt seine Datei direkt auf die Platte. Statistiken werden beim Eintreffen summiert,
+    progress_cb(done, total, source, totals) nach jeder Datei.
+    Rückgabe: ({source: {"stats", "preview", "warnings", "target"} oder {"error"}}, Gesamtsumme).
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    totals = empty_stats()
+    if not jobs:
+        return results, totals
+
+    workers = min(max_workers or default_workers(), len(jobs))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(clean_feature_file, source, target, **options): (source, target)
+            for source, target in jobs
+        }
+        for done, fut in enumerate(concurrent.futures.as_completed(futures), start=1):
+            source, target = futures[fut]
+            try:
+                stats, preview, warnings = fut.result()
+                add_stats(totals, stats)
+                results[source] = {"stats": stats, "preview": preview, "warnings": warnings, "target": target}
+            except Exception as exc:
+                logger.warning(f"Linien-Bereinigung fehlgeschlagen ({source}): {exc}")
+                results[source] = {"error": str(exc), "target": target}
+            if progress_cb:
+                progress_cb(done, len(jobs), source, totals)
+    return results, totals
+
+
+def clean_file_chunked(
+    source,
+    target,
+    max_workers: Optional[int] = None,
+    **options
+) -> Tuple[Dict[str, int], List[Dict[str, Any]], List[str]]:
+    """Eine (große) Datei: Feature-Blöcke werden im Prozess-Pool bereinigt, geschrieben wird hier."""
+    workers = max_workers or default_workers()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return clean_feature_file(source, target, executor=pool, max_pending=2 * workers, **options)
@@ -0,0 +1,125 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.geojson_stream import (
+    FeatureCollectionReader,
+    FeatureCollectionWriter,
+    iter_features,
+    replace_properties,
+    rewrite_properties,
+)
+
+
+def _collection():
+    return {
+        "type": "FeatureCollection",
+        "name": "straßen",
+        "features": [
+            {"type": "Feature", "id": i, "properties": {"n": i, "s": "ä" * i, "x": 1e-7 * i},
+             "geometry": {"type": "LineString", "coordinates": [[14.0 + i, 48.0], [14.5, 48.123456789]]}}
+            for i in range(25)
+        ],
+        "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}},
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_reader_matches_json_load_for_any_chunk_size(tmp_path, chunk_size):
+    data = _collection()
+    path = tmp_path / "in.geojson"
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    reader = FeatureCollectionReader(str(path), chunk_size=chunk_size)
+    pairs = list(reader.iter_raw())
+
+    assert [f for f, _ in pairs] == data["features"]
+    assert all(json.loads(raw) == f for f, raw in pairs)
+    assert reader.members == {"type": "FeatureCollection", "name": "straßen", "crs": data["crs"]}
+
+
+def test_writer_roundtrip_in_place_and_binary_sources(tmp_path):
+    data = _collection()
+    path = tmp_path / "in.geojson"
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+    # Gleiche Datei lesen und überschreiben (temporäre Datei + Ersetzen)
+    reader = FeatureCollectionReader(str(path), chunk_size=16)
+    with FeatureCollectionWriter(str(path)) as writer:
+        for feature, raw in reader.iter_raw():
+            if feature["id"] % 2:
+                writer.write_raw(raw)
+            else:
+                feature["properties"]["even"] = True
+                writer.write(feature)
+        writer.close(reader.members)
+    assert not os.path.exists(f"{path}.tmp")
+
+    result = json.loads(path.read_text(encoding="utf-8"))
+    assert result["name"] == "straßen"
+    assert len(result["features"]) == 25
+    assert result["features"][2]["properties"]["even"] is True
+    assert result["features"][3] == data["features"][3]
+
+    # Binär-Quelle/-Ziel (z.B. Upload -> Download)
+    src = io.BytesIO(path.read_bytes())
+    out = io.BytesIO()
+    writer = FeatureCollectionWriter(out, members={"name": "kopie"})
+    for feature in iter_features(src):
+        writer.write(feature)
+    writer.close()
+    assert not src.closed
+    assert json.loads(out.getvalue())["features"] == result["features"]
+
+
+def test_reader_rejects_non_feature_collections_and_abort_keeps_target(tmp_path):
+    path = tmp_path / "bad.geojson"
+    path.write_text(json.dumps({"type": "Feature", "geometry": None, "properties": {}}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_features(str(path)))
+
+    target = tmp_path / "keep.geojson"
+    target.write_text("original", encoding="utf-8")
+    with pytest.raises(ValueError):
+        with FeatureCollectionWriter(str(target)) as writer:
+            for feature in iter_features(str(path)):
+                writer.write(feature)
+    assert target.read_text(encoding="utf-8") == "original"
+    assert not os.path.exists(f"{target}.tmp")
+
+
+def test_rewrite_properties_keeps_geometry_bytes(tmp_path):
+    path = tmp_path / "zonen.geojson"
+    text = (
+        '{"type": "FeatureCollection", "name": "z", "features": [\n'
+        '{ "type" : "Feature", "id": 7, "properties" : {"name": "A", "n": 1},\n'
+        '  "geometry": {"type": "Point", "coordinates": [14.123456789012345, 48.10000]} },\n'
+        '{"type": "Feature", "geometry": {"type": "Point", "coordinates": [1e-7, 2.50]}},\n'
+        '{"type": "Feature", "properties": {"name": "C"}, "geometry": null}\n'
+        ']}'
+    )
+    path.write_text(text, encoding="utf-8")
+
+    def update(i, props):
+        if i == 0:
+            return {**props, "name": "Ä"}
+        if i == 1:
+            return {"neu": True}
+        return None
+
+    stats = rewrite_properties(str(path), str(path), update)
+    assert stats == {"features_total": 3, "features_changed": 2}
+
+    out = path.read_text(encoding="utf-8")
+    assert '"geometry": {"type": "Point", "coordinates": [14.123456789012345, 48.10000]}' in out
+    assert '{"type": "Point", "coordinates": [1e-7, 2.50]}' in out
+    data = json.loads(out)
+    assert [f["properties"] for f in data["features"]] == [{"name": "Ä", "n": 1}, {"neu": True}, {"name": "C"}]
+    assert data["features"][0]["id"] == 7 and data["name"] == "z"
+
+    assert replace_properties('{ }', {"a": 1}) == '{ "properties":{"a":1}}'
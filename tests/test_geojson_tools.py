@@ -1,11 +1,36 @@
+import json
+import math
 import os
 import sys
 
 import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import Polygon, box
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src.geojson_tools import process_coloring
+from src.geojson_tools import (
+    DatasetCache,
+    DatasetRef,
+    dataset_memory_report,
+    assign_by_polygons,
+    build_adjacency,
+    build_property_update,
+    column_stats,
+    convert_gml_to_geojson,
+    dissolve_zones,
+    is_valid_coverage,
+    load_geodataframe_raw,
+    process_coloring,
+    profile_columns,
+    zone_adjacency_from_hexes,
+    repair_geometry,
+    split_to_files,
+    stream_merge_files,
+    write_geodataframe_atomic,
+)
+from src.geojson_stream import rewrite_properties
 
 
 def test_process_coloring_handles_empty_geodataframe():
@@ -20,4 +45,396 @@ def test_process_coloring_handles_empty_geodataframe():
         "num_colors": 0,
         "components": 0,
         "isolates": [],
+        "kept": 0,
+        "recolored": 0,
     }
+
+
+def test_build_adjacency_queen_and_min_shared_length():
+    # 2x2-Raster (Meter): Diagonalen berühren sich nur im Mittelpunkt
+    grid = gpd.GeoDataFrame(
+        {"name": list("abcd")},
+        geometry=[box(0, 0, 100, 100), box(100, 0, 200, 100), box(0, 100, 100, 200), box(100, 100, 200, 200)],
+        crs="EPSG:3857"
+    )
+    queen = build_adjacency(grid)
+    assert queen.shape == (4, 4)
+    assert queen.nnz == 12
+    assert (queen != queen.T).nnz == 0
+
+    rook = build_adjacency(grid, min_shared_length=1.0)
+    assert rook.nnz == 8
+    assert rook[0, 3] == 0 and rook[0, 1] == 1
+
+    _, mapping, stats = process_coloring(grid, "name", min_shared_length=1.0)
+    assert stats["num_colors"] == 2
+    assert mapping["a"] == mapping["d"]
+
+
+def test_process_coloring_keeps_existing_colors_without_conflict():
+    # Streifen a-b-c-d: nur direkte Nachbarn berühren sich
+    strip = gpd.GeoDataFrame(
+        {"name": list("abcd")},
+        geometry=[box(i, 0, i + 1, 1) for i in range(4)], crs="EPSG:3857"
+    )
+    # b und c haben dieselbe alte Farbe -> Konflikt; e existiert nicht mehr
+    previous = {"a": 3, "b": 1, "c": 1, "d": 3, "e": 2}
+    colored, mapping, stats = process_coloring(strip, "name", existing_colors=previous)
+
+    assert mapping["a"] == 3 and mapping["b"] == 1 and mapping["d"] == 3
+    assert mapping["c"] not in (1, 3)
+    assert mapping["e"] == 2
+    assert stats["kept"] == 3 and stats["recolored"] == 1
+    for i in range(3):
+        assert colored.loc[i, "color_id"] != colored.loc[i + 1, "color_id"]
+
+
+def _hex(cx, cy, edge):
+    return Polygon([
+        (cx + edge * math.cos(math.radians(60 * i - 30)), cy + edge * math.sin(math.radians(60 * i - 30)))
+        for i in range(6)
+    ])
+
+
+def test_zone_adjacency_from_hexes_matches_lattice():
+    # Gitter wie im Generator: Spitze oben, ungerade Zeilen um h/2 versetzt
+    edge, h = 500.0, math.sqrt(3) * 500.0
+    cells, labels = [], []
+    for row in range(4):
+        for col in range(6):
+            cells.append(_hex(col * h + (h / 2 if row % 2 else 0), row * 1.5 * edge, edge))
+            labels.append("A" if col < 2 else ("B" if row < 2 else "C"))
+    hexes = gpd.GeoDataFrame({"zone_label": labels}, geometry=cells, crs="EPSG:3857").to_crs("EPSG:4326")
+
+    adj = zone_adjacency_from_hexes(hexes).set_index(["zone_a", "zone_b"])
+    assert sorted(adj.index) == [("A", "B"), ("A", "C"), ("B", "C")]
+    # Referenz: Paarweise Kanten über Polygon-Topologie im Gitter-CRS
+    grid = hexes.to_crs("EPSG:3857")
+    for (a, b), row in adj.iterrows():
+        za = grid[grid.zone_label == a].union_all()
+        zb = grid[grid.zone_label == b].union_all()
+        edges = round(za.buffer(1).intersection(zb.buffer(1)).area / (2 * edge))
+        assert row["shared_edges"] == edges
+    assert (adj["shared_length_m"] < adj["shared_edges"] * edge).all()
+
+    zones = dissolve_zones(hexes, "zone_label")
+    _, mapping, stats = process_coloring(zones, "zone_label", adjacency=adj.reset_index())
+    assert stats["num_colors"] == 3
+
+
+_GML_FEATURE = """
+  <gml:featureMember><ogr:{layer} gml:id="{fid}"><ogr:{field}>{value}</ogr:{field}>
+    <ogr:geometry><gml:Polygon srsName="EPSG:4326" srsDimension="3"><gml:exterior><gml:LinearRing>
+      <gml:posList srsDimension="3">{coords}</gml:posList>
+    </gml:LinearRing></gml:exterior></gml:Polygon></ogr:geometry>
+  </ogr:{layer}></gml:featureMember>"""
+
+
+def test_convert_gml_to_geojson_layers_2d_and_swap(tmp_path):
+    pytest.importorskip("fiona")
+
+    def feature(layer, fid, field, value, x, y):
+        ring = [(x, y), (x + 0.01, y), (x + 0.01, y + 0.01), (x, y + 0.01), (x, y)]
+        coords = " ".join(f"{a} {b} 300" for a, b in ring)
+        return _GML_FEATURE.format(layer=layer, fid=fid, field=field, value=value, coords=coords)
+
+    # Achsen absichtlich vertauscht (Breite zuerst) -> "Jemen-Problem"
+    body = feature("parcel", "p1", "nr", 1, 48.3, 14.3) + feature("parcel", "p2", "nr", 2, 48.4, 14.3) \
+        + feature("building", "b1", "use", "wohnen", 48.3, 14.4)
+    src = tmp_path / "swapped.gml"
+    src.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<ogr:FeatureCollection xmlns:ogr="http://ogr.maptools.org/" xmlns:gml="http://www.opengis.net/gml/3.2">'
+        + body + "\n</ogr:FeatureCollection>",
+        encoding="utf-8"
+    )
+    out = tmp_path / "out.geojson"
+
+    ok, msg = convert_gml_to_geojson(str(src), str(out), swap_mode="auto")
+    assert ok, msg
+    result = gpd.read_file(out)
+
+    assert len(result) == 3
+    assert set(result["source_layer"]) == {"parcel", "building"}
+    assert {"nr", "use"} <= set(result.columns)
+    assert not result.has_z.any()
+    minx, miny, maxx, maxy = result.total_bounds
+    assert 9 < minx < 17 and 46 < miny < 49
+
+
+def test_stream_merge_files_matches_concat_dissolve(tmp_path):
+    a = gpd.GeoDataFrame(
+        {"zone_label": ["A", "B"], "pop": [1, 2]},
+        geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs="EPSG:4326"
+    )
+    b = gpd.GeoDataFrame(
+        {"zone_label": ["B", "C"], "extra": ["x", "y"]},
+        geometry=[box(1, 1, 2, 2), box(2, 1, 3, 2)], crs="EPSG:4326"
+    )
+    paths = [str(tmp_path / "a.geojson"), str(tmp_path / "b.geojson")]
+    a.to_file(paths[0], driver="GeoJSON")
+    b.to_file(paths[1], driver="GeoJSON")
+    out = str(tmp_path / "merged.geojson")
+
+    stats = stream_merge_files(paths, "zone_label", out)
+
+    full = pd.concat([a, b], ignore_index=True)
+    full["name"] = full["zone_label"]
+    expected = full.dissolve(by="name", as_index=False).set_index("name")
+    result = gpd.read_file(out).set_index("name").loc[expected.index]
+
+    assert stats["shared_names"] == 1
+    assert len(result) == 3
+    assert result.geometry.geom_equals(expected.geometry).all()
+    assert result.loc["B", "extra"] == "x"
+    assert result.loc["B", "pop"] == 2
+
+
+def test_dissolve_zones_coverage_and_generic_path():
+    cov = gpd.GeoDataFrame(
+        {"k": ["a", "a", "b"], "v": [None, 2, 3]},
+        geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1), box(2, 0, 3, 1)], crs="EPSG:4326"
+    )
+    overlapping = cov.set_geometry([box(0, 0, 1.5, 1), box(1, 0, 2, 1), box(2, 0, 3, 1)])
+
+    assert is_valid_coverage(cov.geometry.values)
+    assert not is_valid_coverage(overlapping.geometry.values)
+
+    for gdf in (cov, overlapping):
+        result = dissolve_zones(gdf, "k").set_index("k")
+        expected = gdf.dissolve(by="k")
+        assert result.geometry.geom_equals(expected.geometry).all()
+        assert result.loc["a", "v"] == 2
+
+
+def test_dataset_cache_hits_invalidation_and_eviction(tmp_path):
+    path = str(tmp_path / "zones.geojson")
+    gdf = gpd.GeoDataFrame({"name": ["a", "b"]}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs="EPSG:4326")
+    gdf.to_file(path, driver="GeoJSON")
+    cache = DatasetCache(budget_mb=64)
+
+    first = cache.get(path)
+    assert cache.get(path) is first
+    assert cache.get(path, columns=["name"]) is not first
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # Geänderte Datei -> neuer Key, alter Stand wird verdrängt
+    gdf.iloc[:1].to_file(path, driver="GeoJSON")
+    os.utime(path, ns=(1, 1))
+    assert len(cache.get(path)) == 1
+    assert cache.stats()["entries"] == 1
+
+    cache.budget_bytes = 1
+    cache._evict()
+    assert cache.stats()["entries"] == 0
+
+
+def test_dataset_ref_shares_reloads_and_copies_on_write(tmp_path):
+    path = str(tmp_path / "zones.geojson")
+    gdf = gpd.GeoDataFrame({"name": ["a", "b"]}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs="EPSG:4326")
+    gdf.to_file(path, driver="GeoJSON")
+    cache = DatasetCache(budget_mb=64)
+
+    ref, other = DatasetRef(path, cache=cache), DatasetRef(path, cache=cache)
+    shared = ref.get()
+    assert other.get() is shared
+    assert dataset_memory_report(cache)["Referenzen"].tolist() == [2]
+
+    # Verdrängt -> beim nächsten Zugriff neu von der Platte
+    cache.clear()
+    assert ref.get() is not shared and ref.get().equals(shared)
+
+    edited = ref.edit()
+    edited.loc[0, "name"] = "x"
+    assert ref.modified and ref.get() is edited
+    assert other.get().loc[0, "name"] == "a"
+    assert set(dataset_memory_report(cache)["Art"]) == {"geteilt", "Kopie (bearbeitet)"}
+
+    # Bearbeitete Kopien zählen aufs Budget
+    assert cache.stats()["private_bytes"] > 0
+    ref.release()
+    assert ref.get().loc[0, "name"] == "a"
+    assert cache.stats()["private_bytes"] == 0
+
+
+def test_dataset_cache_over_budget_is_shared_and_evicts_largest(tmp_path):
+    small, large = str(tmp_path / "small.geojson"), str(tmp_path / "large.geojson")
+    gpd.GeoDataFrame({"v": [1]}, geometry=[box(0, 0, 1, 1)], crs="EPSG:4326").to_file(small, driver="GeoJSON")
+    gpd.GeoDataFrame({"v": range(50)}, geometry=[box(i, 0, i + 1, 1) for i in range(50)], crs="EPSG:4326").to_file(large, driver="GeoJSON")
+    cache = DatasetCache(budget_mb=0)
+    cache.budget_bytes = 2000
+
+    # Größer als das Budget: trotzdem EIN geteilter Eintrag für alle Referenzen
+    a, b = DatasetRef(large, cache=cache), DatasetRef(large, cache=cache)
+    assert a.get() is b.get() and cache.misses == 1
+    assert dataset_memory_report(cache)["Referenzen"].tolist() == [2]
+
+    # Neuer Datensatz braucht Platz -> der größte geteilte Eintrag wird verdrängt und lazy nachgeladen
+    DatasetRef(small, cache=cache)
+    assert cache.contains(small) and not cache.contains(large)
+    assert len(a.get()) == 50 and cache.misses == 3
+
+    # Eine bearbeitete Kopie verdrängt die geteilten Einträge
+    c = DatasetRef(small, cache=cache)
+    c.replace(gpd.GeoDataFrame({"v": range(50)}, geometry=[box(i, 0, i + 1, 1) for i in range(50)], crs="EPSG:4326"))
+    assert cache.stats()["entries"] == 0 and c.get()["v"].tolist() == list(range(50))
+
+
+def test_load_geodataframe_raw_arrow_is_opt_in(tmp_path):
+    path = tmp_path / "dates.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"d": "2024-01-05", "n": 1}, "geometry": {"type": "Point", "coordinates": [1, 2]}}
+    ]}), encoding="utf-8")
+
+    default = load_geodataframe_raw(str(path), cache=False)
+    assert pd.api.types.is_datetime64_any_dtype(default["d"])
+    assert pd.api.types.is_integer_dtype(default["n"])
+    # Explizit angefordert: gleiche Werte, ggf. andere dtypes
+    arrow = load_geodataframe_raw(str(path), cache=False, use_arrow=True)
+    assert str(arrow["d"].iloc[0])[:10] == "2024-01-05"
+
+
+def test_build_property_update_list_values_and_int_types(tmp_path):
+    source = tmp_path / "tags.geojson"
+    source.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"lines": ["U1", "U2"], "n": 5, "name": "a"},
+         "geometry": {"type": "Point", "coordinates": [1, 2]}},
+        {"type": "Feature", "properties": {"lines": ["U3"], "n": None, "name": "b"},
+         "geometry": {"type": "Point", "coordinates": [3, 4]}},
+    ]}), encoding="utf-8")
+    gdf = load_geodataframe_raw(str(source), cache=False)
+    assert gdf["n"].dtype.kind == "f"  # Lücke -> float
+
+    # Unverändert: Listen aus pyogrio-Arrays und 5 (nicht 5.0) bleiben wie im Original
+    target = tmp_path / "out.geojson"
+    stats = rewrite_properties(str(source), str(target), build_property_update(gdf))
+    assert stats["features_changed"] == 0
+    assert [f["properties"] for f in json.loads(target.read_text(encoding="utf-8"))["features"]] == [
+        {"lines": ["U1", "U2"], "n": 5, "name": "a"}, {"lines": ["U3"], "n": None, "name": "b"}]
+
+    gdf.loc[1, "name"] = "c"
+    gdf.loc[1, "n"] = 7.0
+    stats = rewrite_properties(str(source), str(target), build_property_update(gdf))
+    out = json.loads(target.read_text(encoding="utf-8"))["features"]
+    assert stats["features_changed"] == 1
+    assert out[1]["properties"] == {"lines": ["U3"], "n": 7, "name": "c"}
+    assert json.dumps(out[0]["properties"]) == '{"lines": ["U1", "U2"], "n": 5, "name": "a"}'
+
+
+def test_repair_geometry_only_touches_invalid_geometries():
+    valid = box(0, 0, 1, 1)
+    bowtie = Polygon([(0, 0), (1, 1), (1, 0), (0, 1)])
+    gdf = gpd.GeoDataFrame({"v": [1, 2, 3]}, geometry=[valid, bowtie, Polygon()], crs="EPSG:4326")
+
+    repaired, stats = repair_geometry(gdf, return_stats=True)
+
+    assert stats["invalid"] == 1
+    assert stats["dropped"] == 1
+    assert repaired.geometry.iloc[0] is valid
+    assert repaired.geometry.is_valid.all()
+    # make_valid behält beide Dreiecke (buffer(0) würde eines verlieren)
+    assert repaired.geometry.iloc[1].area == 0.5
+
+
+def test_assign_by_polygons_point_and_overlap():
+    bezirke = gpd.GeoDataFrame(
+        {"code": ["31", "34"]}, geometry=[box(0, 0, 100, 100), box(100, 0, 200, 100)], crs="EPSG:3857"
+    )
+    zones = gpd.GeoDataFrame(
+        {"name": ["links", "rechts", "mehr_rechts", "draussen"]},
+        geometry=[box(10, 10, 50, 50), box(120, 10, 150, 50), box(90, 10, 180, 20), box(500, 500, 510, 510)],
+        crs="EPSG:3857",
+        index=[10, 11, 12, 13],
+    )
+
+    by_point = assign_by_polygons(zones, bezirke, "code")
+    assert by_point.loc[[10, 11, 12]].tolist() == ["31", "34", "34"]
+    assert pd.isna(by_point.loc[13])
+
+    by_overlap = assign_by_polygons(zones.to_crs("EPSG:4326"), bezirke, "code", method="overlap")
+    assert by_overlap.loc[[10, 11, 12]].tolist() == ["31", "34", "34"]
+    assert pd.isna(by_overlap.loc[13])
+
+    # Ungültige Geometrien (Bowtie) dürfen die Überlappung nicht abbrechen
+    bowtie = Polygon([(100, 0), (200, 100), (200, 0), (100, 100)])
+    invalid = gpd.GeoDataFrame({"code": ["31", "34"]}, geometry=[box(0, 0, 100, 100), bowtie], crs="EPSG:3857")
+    zones.loc[11, "geometry"] = Polygon([(120, 10), (150, 50), (150, 10), (120, 50)])
+    by_overlap = assign_by_polygons(zones, invalid, "code", method="overlap")
+    assert by_overlap.loc[[10, 11, 12]].tolist() == ["31", "34", "34"]
+
+
+def test_split_to_files_matches_filter_loop(tmp_path):
+    gdf = gpd.GeoDataFrame(
+        {"ls": ["Nord", "Süd", None, "Nord", "West", "Süd", "Nord"], "n": range(7)},
+        geometry=[box(i, 0, i + 1, 1) for i in range(7)],
+        crs="EPSG:4326",
+    )
+    calls = []
+    results = split_to_files(
+        gdf, "ls", lambda v: str(tmp_path / f"{v}.geojson"), max_workers=2,
+        progress_cb=lambda done, total, value: calls.append((done, total)),
+    )
+
+    assert [r["value"] for r in results] == ["Nord", "Süd", "West"]
+    assert calls == [(1, 3), (2, 3), (3, 3)]
+    for r in results:
+        written = gpd.read_file(r["path"])
+        assert written["n"].tolist() == gdf.loc[gdf["ls"] == r["value"], "n"].tolist()
+        assert r["features"] == len(written)
+
+    # Werte je Zeile statt Spalte, mit Dissolve nach einer Spalte
+    keys = ["a", "a", "b", "a", None, "b", "b"]
+    gdf["grp"] = keys
+    results = split_to_files(gdf, keys, lambda v: str(tmp_path / f"d_{v}.geojson"), dissolve_by="grp")
+    assert [(r["value"], r["features"]) for r in results] == [("a", 1), ("b", 1)]
+
+
+def test_split_to_files_colliding_file_names(tmp_path):
+    gdf = gpd.GeoDataFrame(
+        {"ls": ["A/B", "A B", "A/B", "A B", "A_B"]}, geometry=[box(i, 0, i + 1, 1) for i in range(5)], crs="EPSG:4326"
+    )
+    results = split_to_files(gdf, "ls", lambda v: str(tmp_path / f"x__{v.replace('/', '_').replace(' ', '_')}.geojson"))
+
+    assert [r["value"] for r in results] == ["A/B", "A B", "A_B"]
+    assert len({r["path"] for r in results}) == 3
+    assert results[0]["path"] == str(tmp_path / "x__A_B.geojson")
+    for r in results:
+        assert gpd.read_file(r["path"])["ls"].tolist() == [r["value"]] * r["features"]
+
+
+def test_profile_columns_sampled_exact_and_memoized():
+    n = 20000
+    gdf = gpd.GeoDataFrame(
+        {
+            "id": [f"w{i}" for i in range(n)],
+            "kind": ["a", "b", None, "c"] * (n // 4),
+            "tags": [None] * (n - 1) + ["x,y"],
+        },
+        geometry=[box(0, 0, 1, 1)] * n,
+        crs="EPSG:4326",
+    )
+    exact = profile_columns(gdf, sample_rows=None)
+    assert exact.loc["kind", "unique"] == 3 and exact.loc["kind", "missing"] == n // 4
+    assert exact.loc["id", "unique"] == n and exact.loc["tags", "has_comma"]
+    assert exact.loc["kind", "example"] == "a" and "geometry" not in exact.index
+
+    sampled = profile_columns(gdf, sample_rows=2000)
+    assert sampled.loc["id", "unique_approx"]
+    assert abs(sampled.loc["id", "unique"] - n) / n < 0.2
+    assert sampled.loc["kind", "unique"] == 3
+    assert sampled.loc["tags", "non_null"] == 1  # Zählungen bleiben exakt
+
+    assert profile_columns(gdf, sample_rows=2000) is sampled
+    assert column_stats(gdf["id"])["unique"] == n
+
+
+def test_write_geodataframe_atomic_keeps_target_on_error(tmp_path):
+    gdf = gpd.GeoDataFrame({"name": ["a", "b"]}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs="EPSG:4326")
+    target = tmp_path / "out.geojson"
+    write_geodataframe_atomic(gdf, str(target))
+    assert gpd.read_file(target)["name"].tolist() == ["a", "b"]
+
+    with pytest.raises(Exception):
+        write_geodataframe_atomic(gdf.iloc[:1], str(target), driver="KeinTreiber")
+    assert gpd.read_file(target)["name"].tolist() == ["a", "b"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.geojson"]
@@ -0,0 +1,117 @@
+import json
+import math
+import os
+import sys
+
+import numpy as np
+import shapely
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.line_cleaner import (
+    clean_feature_file,
+    clean_file_chunked,
+    clean_files_parallel,
+    clean_linestring,
+    union_lines_partitioned,
+)
+
+
+def _reference_clean(coords, min_seg_m, keep_ends=True):
+    """Ursprünglicher Punkt-für-Punkt-Filter als Referenz."""
+    def haversine(p1, p2):
+        phi1, phi2 = math.radians(p1[1]), math.radians(p2[1])
+        a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(p2[0] - p1[0]) / 2) ** 2
+        return 2 * 6371000 * math.asin(math.sqrt(a))
+
+    if not coords:
+        return []
+    kept = [coords[0]]
+    for idx, pt in enumerate(coords[1:], start=1):
+        if haversine(kept[-1], pt) >= min_seg_m or (keep_ends and idx == len(coords) - 1):
+            kept.append(pt)
+    return kept if len(kept) >= 2 else [kept[0], kept[-1]]
+
+
+def _random_line(rng, n):
+    steps = rng.choice([0.000001, 0.00001, 0.00003, 0.0002], size=(n, 2)) * rng.choice([-1, 1], size=(n, 2))
+    return (np.array([14.0, 48.0]) + np.cumsum(steps, axis=0)).tolist()
+
+
+def test_clean_linestring_matches_sequential_filter():
+    rng = np.random.default_rng(7)
+    for _ in range(500):
+        coords = _random_line(rng, int(rng.integers(1, 150)))
+        for min_seg_m in (0.0, 2.0, 25.0):
+            for keep_ends in (True, False):
+                cleaned, n_in, n_out = clean_linestring(coords, min_seg_m, keep_ends)
+                assert cleaned == _reference_clean(coords, min_seg_m, keep_ends)
+                assert (n_in, n_out) == (len(coords), len(cleaned))
+
+
+def test_parallel_modes_match_sequential(tmp_path):
+    rng = np.random.default_rng(3)
+    options = dict(min_seg_m=2.0, simplify_m=1.0, keep_ends=True)
+    jobs = []
+    for i in range(3):
+        features = [
+            {"type": "Feature", "properties": {"i": j},
+             "geometry": {"type": "LineString", "coordinates": _random_line(rng, 40)}}
+            for j in range(25)
+        ]
+        src = tmp_path / f"f{i}.geojson"
+        src.write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+        jobs.append((str(src), str(tmp_path / f"f{i}.cleaned.geojson")))
+
+    expected = {}
+    for src, _ in jobs:
+        stats, _, _ = clean_feature_file(src, f"{src}.seq", **options)
+        expected[src] = (stats, json.loads(open(f"{src}.seq", encoding="utf-8").read()))
+
+    results, totals = clean_files_parallel(jobs, max_workers=2, **options)
+    for src, target in jobs:
+        assert results[src]["stats"] == expected[src][0]
+        assert json.loads(open(target, encoding="utf-8").read()) == expected[src][1]
+    assert totals["features_total"] == 75
+    assert totals["points_in_total"] == sum(s["points_in_total"] for s, _ in expected.values())
+
+    src = jobs[0][0]
+    stats, _, _ = clean_file_chunked(src, str(tmp_path / "chunked.geojson"), max_workers=2, chunk_size=4, **options)
+    assert stats == expected[src][0]
+    assert json.loads((tmp_path / "chunked.geojson").read_text(encoding="utf-8")) == expected[src][1]
+
+
+def test_partitioned_union_matches_global_union():
+    rng = np.random.default_rng(11)
+    # Kurze Linien verteilt über die Fläche, dazu lange Gitterlinien über alle Partitionsgrenzen
+    starts = rng.uniform([14.0, 48.0], [14.02, 48.02], size=(80, 2))
+    lines = [shapely.LineString(start + np.cumsum(rng.normal(0, 0.001, size=(8, 2)), axis=0)) for start in starts]
+    lines += [shapely.LineString([(14.0 + 0.004 * i, 47.99), (14.0 + 0.004 * i, 48.03)]) for i in range(6)]
+    lines += [shapely.LineString([(13.99, 48.0 + 0.004 * i), (14.03, 48.0 + 0.004 * i)]) for i in range(6)]
+    lines += lines[:10]  # Duplikate
+
+    calls = []
+    merged = union_lines_partitioned(lines, per_partition=20, max_workers=2, progress_cb=lambda *a: calls.append(a))
+    expected = shapely.union_all(lines)
+
+    assert len(calls) > 2 and calls[-1][2] == "Nahtstellen"
+    assert [c[0] for c in calls] == list(range(1, len(calls) + 1))
+    # Gleiche Zusammenführung wie global (gleiche Teile), Koordinaten bis auf Rundung beim Noding
+    expected = shapely.line_merge(expected)
+    assert len(shapely.get_parts(merged)) == len(shapely.get_parts(expected))
+    assert shapely.normalize(merged).equals_exact(shapely.normalize(expected), 1e-12)
+
+
+def test_partitioned_union_does_not_merge_through_junctions():
+    # Verzweigung bei (20, 20): die beiden Äste nach rechts dürfen nicht zu einer Linie werden
+    lines = [
+        shapely.LineString([(20, 20), (40, 30)]), shapely.LineString([(20, 20), (40, 10)]),
+        shapely.LineString([(20, 20), (5, 20)]), shapely.LineString([(40, 30), (95, 30)]),
+        shapely.LineString([(40, 10), (95, 10)]),
+    ]
+    lines += [shapely.LineString([(100 + 3 * i, 100), (101 + 3 * i, 101)]) for i in range(3)]
+
+    merged = union_lines_partitioned(lines, per_partition=2, max_workers=1)
+    expected = shapely.line_merge(shapely.union_all(lines))
+    assert len(shapely.get_parts(merged)) == len(shapely.get_parts(expected)) == 6
+    assert shapely.normalize(merged).equals_exact(shapely.normalize(expected), 1e-12)